@@ -334,7 +334,7 @@ class AccountWithdrawalView(LoginRequiredMixin, TemplateView):
         future_jobs = JobApplication.objects.filter(
             worker=user,
             status='確定済み',
-            job_posting__work_date__gte=timezone.now().date()
+            job_posting__end_at__gt=timezone.now()
         ).exists()
         if future_jobs:
             reasons.append("予定されているお仕事があります。キャンセルまたは勤務終了までお待ちください。")
@@ -908,7 +908,7 @@ class PastJobsView(LoginRequiredMixin, TemplateView):
         apps = JobApplication.objects.filter(
             worker=self.request.user,
             status='確定済み',
-            job_posting__work_date__lt=date.today()
+            job_posting__end_at__lt=timezone.now()
         ).select_related('job_posting').order_by('-job_posting__work_date')
 
         from collections import defaultdict
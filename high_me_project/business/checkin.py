@@ -0,0 +1,49 @@
+"""
+チェックイン/アウト用QRコードのトークン。
+店舗IDと時間枠 (TOKEN_PERIOD 秒ごとに切り替わる) を SECRET_KEY 由来の鍵で HMAC 署名するので、
+読み取り時はDBを見ずに検証できる。形式: "<店舗ID>.<時間枠>.<署名>"
+"""
+import time
+
+from django.utils.crypto import salted_hmac, constant_time_compare
+
+KEY_SALT = 'business.checkin'
+# トークンが切り替わる間隔 (秒)
+TOKEN_PERIOD = 60
+# 読み取りから送信までの遅れを考慮して、いくつ前の時間枠まで受け付けるか
+GRACE_PERIODS = 1
+
+
+def _window(now=None):
+    return int((now if now is not None else time.time()) // TOKEN_PERIOD)
+
+
+def _sign(store_id, window):
+    return salted_hmac(KEY_SALT, f"{store_id}.{window}", algorithm='sha256').hexdigest()[:32]
+
+
+def make_token(store_id, now=None):
+    """店舗の現在のトークン (now は UNIX 時刻)"""
+    window = _window(now)
+    return f"{store_id}.{window}.{_sign(store_id, window)}"
+
+
+def seconds_until_rotation(now=None):
+    """次にトークンが切り替わるまでの秒数"""
+    now = now if now is not None else time.time()
+    return TOKEN_PERIOD - int(now % TOKEN_PERIOD)
+
+
+def verify_token(token, now=None):
+    """トークンが有効なら店舗IDを返す。改ざん・期限切れなら None"""
+    try:
+        store_id, window, signature = (token or '').split('.')
+        store_id, window = int(store_id), int(window)
+    except ValueError:
+        return None
+    current = _window(now)
+    if not current - GRACE_PERIODS <= window <= current:
+        return None
+    if not constant_time_compare(signature, _sign(store_id, window)):
+        return None
+    return store_id
@@ -0,0 +1,118 @@
+"""
+求人ひな形の写真の派生画像 (一覧カード用サムネイル・詳細用) の生成。
+元画像と同じストレージの derived/ 以下に JPEG と WebP を保存する。
+生成はバックグラウンドのプロセスプールで行い、完了したら JobTemplatePhoto.derivatives_ready を立てる。
+"""
+import os
+import atexit
+import logging
+import threading
+from io import BytesIO
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# 派生画像の種類 -> 長辺の最大ピクセル数
+DERIVATIVE_SIZES = {
+    'card': 480,
+    'detail': 1200,
+}
+# 出力形式 -> (拡張子, Pillow の保存オプション)
+DERIVATIVE_FORMATS = {
+    'jpeg': ('jpg', {'format': 'JPEG', 'quality': 80, 'optimize': True, 'progressive': True}),
+    'webp': ('webp', {'format': 'WEBP', 'quality': 75, 'method': 4}),
+}
+
+
+def derivative_name(image_name, size, fmt):
+    """元画像のファイル名から派生画像のファイル名を作る (例: job_templates/photos/derived/a_card.webp)"""
+    directory, filename = os.path.split(image_name)
+    stem = os.path.splitext(filename)[0]
+    return os.path.join(directory, 'derived', f"{stem}_{size}.{DERIVATIVE_FORMATS[fmt][0]}")
+
+
+def generate_derivatives(image_name, force=False):
+    """
+    派生画像をすべて生成して保存する。既に存在するものは force でなければ作り直さない。
+    DBには触れないので、プロセスプールのワーカーからも呼べる。
+    """
+    targets = [
+        (size, fmt, derivative_name(image_name, size, fmt))
+        for size in DERIVATIVE_SIZES for fmt in DERIVATIVE_FORMATS
+    ]
+    if not force:
+        targets = [t for t in targets if not default_storage.exists(t[2])]
+    if not targets:
+        return image_name
+
+    with default_storage.open(image_name, 'rb') as f:
+        original = Image.open(f)
+        # カメラ画像の向き (EXIF) を反映してから縮小する
+        original = ImageOps.exif_transpose(original).convert('RGB')
+
+    for size, fmt, name in targets:
+        image = original.copy()
+        image.thumbnail((DERIVATIVE_SIZES[size], DERIVATIVE_SIZES[size]), Image.LANCZOS)
+        buffer = BytesIO()
+        image.save(buffer, **DERIVATIVE_FORMATS[fmt][1])
+        if default_storage.exists(name):
+            default_storage.delete(name)
+        default_storage.save(name, ContentFile(buffer.getvalue()))
+    return image_name
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=settings.IMAGE_DERIVATIVE_WORKERS)
+            atexit.register(_executor.shutdown, wait=False)
+        return _executor
+
+
+def _mark_ready(photo_id):
+    from .models import JobTemplatePhoto
+    photo = JobTemplatePhoto.objects.filter(pk=photo_id).first()
+    if photo is not None and not photo.derivatives_ready:
+        photo.derivatives_ready = True
+        photo.save(update_fields=['derivatives_ready'])
+
+
+def schedule_derivatives(photo_id, image_name):
+    """
+    写真1枚の派生画像の生成を依頼する。
+    IMAGE_DERIVATIVE_WORKERS が 0 ならその場で生成する (テスト・開発用)。
+    """
+    if not settings.IMAGE_DERIVATIVE_WORKERS:
+        generate_derivatives(image_name)
+        _mark_ready(photo_id)
+        return
+
+    submitted_by = threading.get_ident()
+
+    def done(future):
+        # プロセスプールのワーカーでの失敗もサーバーのログに残す (derivatives_ready は False のまま)
+        exception = future.exception()
+        if exception is not None:
+            logger.error("Image derivative error (%s)", image_name, exc_info=exception)
+            return
+        try:
+            _mark_ready(photo_id)
+        except Exception:
+            logger.exception("Failed to mark image derivatives ready (photo %s)", photo_id)
+        finally:
+            # 通常はプールの結果受け取りスレッドで呼ばれるので、そのスレッドで開いたDB接続を閉じる
+            if threading.get_ident() != submitted_by:
+                connection.close()
+
+    _get_executor().submit(generate_derivatives, image_name).add_done_callback(done)
@@ -0,0 +1,51 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from business.models import JobTemplatePhoto
+from business.images import generate_derivatives
+
+
+class Command(BaseCommand):
+    help = 'Generate thumbnail / WebP derivatives for job template photos in parallel'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Number of worker processes')
+        parser.add_argument('--force', action='store_true', help='Regenerate derivatives that already exist')
+
+    def handle(self, *args, **options):
+        photos = JobTemplatePhoto.objects.all()
+        if not options['force']:
+            photos = photos.filter(derivatives_ready=False)
+
+        # 同じ画像ファイルを複数の写真が参照していることがあるので、ファイル単位で生成する
+        photo_ids_by_name = {}
+        for pk, name in photos.exclude(image='').values_list('pk', 'image'):
+            photo_ids_by_name.setdefault(name, []).append(pk)
+
+        ready_ids = []
+        failed = 0
+        with ProcessPoolExecutor(max_workers=max(1, options['workers'])) as pool:
+            futures = {
+                pool.submit(generate_derivatives, name, options['force']): name for name in photo_ids_by_name
+            }
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    self.stderr.write(f"{name}: {e}")
+                    failed += 1
+                    continue
+                ready_ids.extend(photo_ids_by_name[name])
+
+        # 1件ずつ保存して、求人カードのキャッシュ破棄などのシグナルも通す
+        for photo in JobTemplatePhoto.objects.filter(pk__in=ready_ids, derivatives_ready=False):
+            photo.derivatives_ready = True
+            photo.save(update_fields=['derivatives_ready'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated derivatives for {len(photo_ids_by_name) - failed} files ({len(ready_ids)} photos)."
+        ))
+        if failed:
+            self.stdout.write(self.style.WARNING(f"{failed} files failed."))
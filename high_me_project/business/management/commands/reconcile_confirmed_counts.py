@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Q, F
+from business.models import JobPosting
+
+
+class Command(BaseCommand):
+    help = 'Recalculate JobPosting.confirmed_count from confirmed applications'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report mismatched postings')
+
+    def handle(self, *args, **options):
+        mismatched = JobPosting.objects.annotate(
+            actual=Count('applications', filter=Q(applications__status='確定済み'))
+        ).exclude(confirmed_count=F('actual')).values_list('pk', 'confirmed_count', 'actual')
+
+        fixed_ids = []
+        for pk, stored, actual in mismatched:
+            self.stdout.write(f"Posting {pk}: {stored} -> {actual}")
+            if not options['dry_run']:
+                JobPosting.objects.filter(pk=pk).update(confirmed_count=actual)
+            fixed_ids.append(pk)
+        fixed = len(fixed_ids)
+
+        if fixed_ids and not options['dry_run']:
+            # 検索インデックスの残り枠も直した確定人数に合わせる
+            from jobs.services import SearchIndexService
+            SearchIndexService.sync_postings(JobPosting.objects.filter(pk__in=fixed_ids))
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f"{fixed} postings out of sync (dry run)."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Reconciled {fixed} postings."))
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:45
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def backfill_confirmed_count(apps, schema_editor):
+    JobPosting = apps.get_model('business', 'JobPosting')
+    postings = JobPosting.objects.annotate(
+        actual=Count('applications', filter=Q(applications__status='確定済み'))
+    ).filter(actual__gt=0).values_list('pk', 'actual')
+    for pk, actual in postings:
+        JobPosting.objects.filter(pk=pk).update(confirmed_count=actual)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('business', '0035_annuallimitreleaserequest'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jobposting',
+            name='confirmed_count',
+            field=models.IntegerField(default=0, verbose_name='確定人数'),
+        ),
+        migrations.RunPython(backfill_confirmed_count, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='jobposting',
+            index=models.Index(fields=['work_date', 'confirmed_count', 'recruitment_count'], name='posting_date_capacity_idx'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:55
+
+from django.db import migrations, models
+
+from business.text import normalize_search_text
+
+
+def backfill_search_columns(apps, schema_editor):
+    for model_name, source, target in (
+        ('Store', 'store_name', 'search_name'),
+        ('JobTemplate', 'work_content', 'search_work_content'),
+        ('JobPosting', 'title', 'search_title'),
+    ):
+        Model = apps.get_model('business', model_name)
+        objects = list(Model.objects.only('pk', source))
+        for obj in objects:
+            setattr(obj, target, normalize_search_text(getattr(obj, source)))
+        Model.objects.bulk_update(objects, [target], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('business', '0036_jobposting_confirmed_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jobposting',
+            name='search_title',
+            field=models.CharField(blank=True, editable=False, max_length=200, verbose_name='求人タイトル (検索用)'),
+        ),
+        migrations.AddField(
+            model_name='jobtemplate',
+            name='search_work_content',
+            field=models.TextField(blank=True, editable=False, verbose_name='業務内容 (検索用)'),
+        ),
+        migrations.AddField(
+            model_name='store',
+            name='search_name',
+            field=models.CharField(blank=True, editable=False, max_length=100, verbose_name='店舗名 (検索用)'),
+        ),
+        migrations.RunPython(backfill_search_columns, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:58
+
+from django.db import migrations, models
+
+TREATMENT_FLAG_FIELDS = (
+    'has_unexperienced_welcome', 'has_bike_car_commute', 'has_clothing_free',
+    'has_coupon_get', 'has_meal', 'has_hair_color_free',
+    'has_bike_bicycle_commute', 'has_bicycle_commute', 'has_transportation_allowance',
+)
+
+
+def backfill_treatment_flags(apps, schema_editor):
+    JobTemplate = apps.get_model('business', 'JobTemplate')
+    templates = list(JobTemplate.objects.only('pk', *TREATMENT_FLAG_FIELDS))
+    for template in templates:
+        template.treatment_flags = sum(
+            1 << i for i, field in enumerate(TREATMENT_FLAG_FIELDS) if getattr(template, field)
+        )
+    JobTemplate.objects.bulk_update(templates, ['treatment_flags'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('business', '0037_search_normalized_columns'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jobtemplate',
+            name='treatment_flags',
+            field=models.IntegerField(db_index=True, default=0, editable=False, verbose_name='待遇ビットマスク'),
+        ),
+        migrations.RunPython(backfill_treatment_flags, migrations.RunPython.noop),
+    ]
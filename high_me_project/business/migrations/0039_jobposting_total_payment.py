@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:10
+
+from django.db import migrations, models
+
+
+def backfill_payment(apps, schema_editor):
+    # JobPosting.compute_payment と同じ計算 (履歴モデルではメソッドを使えないため)
+    JobPosting = apps.get_model('business', 'JobPosting')
+    postings = list(JobPosting.objects.only(
+        'pk', 'start_time', 'end_time', 'break_duration', 'hourly_wage', 'transportation_fee'
+    ))
+    for posting in postings:
+        duration = (posting.end_time.hour * 60 + posting.end_time.minute) - (
+            posting.start_time.hour * 60 + posting.start_time.minute
+        )
+        if duration <= 0:
+            duration += 24 * 60
+        posting.work_minutes = max(0, duration - (posting.break_duration or 0))
+        posting.total_payment = posting.hourly_wage * posting.work_minutes // 60 + posting.transportation_fee
+    JobPosting.objects.bulk_update(postings, ['work_minutes', 'total_payment'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('business', '0038_jobtemplate_treatment_flags'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jobposting',
+            name='total_payment',
+            field=models.IntegerField(db_index=True, default=0, editable=False, verbose_name='報酬合計'),
+        ),
+        migrations.AddField(
+            model_name='jobposting',
+            name='work_minutes',
+            field=models.IntegerField(default=0, editable=False, verbose_name='実働時間(分)'),
+        ),
+        migrations.RunPython(backfill_payment, migrations.RunPython.noop),
+    ]
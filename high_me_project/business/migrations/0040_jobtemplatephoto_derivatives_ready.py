@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('business', '0039_jobposting_total_payment'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jobtemplatephoto',
+            name='derivatives_ready',
+            field=models.BooleanField(default=False, editable=False, verbose_name='派生画像生成済み'),
+        ),
+    ]
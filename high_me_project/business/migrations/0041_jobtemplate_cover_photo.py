@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_cover_photo(apps, schema_editor):
+    JobTemplate = apps.get_model('business', 'JobTemplate')
+    JobTemplatePhoto = apps.get_model('business', 'JobTemplatePhoto')
+    JobTemplate.objects.update(cover_photo=Subquery(
+        JobTemplatePhoto.objects.filter(template=OuterRef('pk')).order_by('order', 'pk').values('pk')[:1]
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('business', '0040_jobtemplatephoto_derivatives_ready'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jobtemplate',
+            name='cover_photo',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='business.jobtemplatephoto'),
+        ),
+        migrations.RunPython(backfill_cover_photo, migrations.RunPython.noop),
+    ]
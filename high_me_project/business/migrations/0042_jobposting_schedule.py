@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:17
+
+import datetime
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def backfill_schedule(apps, schema_editor):
+    # JobPosting.compute_schedule と同じ計算 (履歴モデルではメソッドを使えないため)
+    JobPosting = apps.get_model('business', 'JobPosting')
+    postings = list(JobPosting.objects.only('pk', 'work_date', 'start_time', 'end_time', 'application_deadline'))
+    for posting in postings:
+        posting.start_at = timezone.make_aware(datetime.datetime.combine(posting.work_date, posting.start_time))
+        posting.end_at = timezone.make_aware(datetime.datetime.combine(posting.work_date, posting.end_time))
+        if posting.end_at <= posting.start_at:
+            posting.end_at += datetime.timedelta(days=1)
+        posting.deadline_at = posting.application_deadline or posting.start_at
+    JobPosting.objects.bulk_update(postings, ['start_at', 'end_at', 'deadline_at'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('business', '0041_jobtemplate_cover_photo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jobposting',
+            name='deadline_at',
+            field=models.DateTimeField(editable=False, null=True, verbose_name='締切日時'),
+        ),
+        migrations.AddField(
+            model_name='jobposting',
+            name='end_at',
+            field=models.DateTimeField(editable=False, null=True, verbose_name='終了日時'),
+        ),
+        migrations.AddField(
+            model_name='jobposting',
+            name='start_at',
+            field=models.DateTimeField(editable=False, null=True, verbose_name='開始日時'),
+        ),
+        migrations.RunPython(backfill_schedule, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='jobposting',
+            index=models.Index(fields=['start_at'], name='posting_start_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='jobposting',
+            index=models.Index(fields=['end_at'], name='posting_end_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='jobposting',
+            index=models.Index(fields=['deadline_at'], name='posting_deadline_at_idx'),
+        ),
+    ]
@@ -1,4 +1,5 @@
 # business/models.py
+import datetime
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
@@ -24,6 +25,8 @@ class BusinessProfile(models.Model):
 class Store(models.Model):
     business = models.ForeignKey(BusinessProfile, on_delete=models.CASCADE)
     store_name = models.CharField("店舗名", max_length=100)
+    # 検索用に正規化した店舗名 (business.signals で保存時に更新)
+    search_name = models.CharField("店舗名 (検索用)", max_length=100, blank=True, editable=False)
     industry = models.CharField("業種", max_length=50, blank=True, null=True) # 画像準拠で追加
     post_code = models.CharField("郵便番号", max_length=7)
     prefecture = models.CharField("都道府県", max_length=20)
@@ -142,6 +145,8 @@ class JobTemplate(models.Model):
     industry = models.CharField("業種", max_length=100)
     occupation = models.CharField("職種", max_length=100)
     work_content = models.TextField("業務内容")
+    # 検索用に正規化した業務内容 (business.signals で保存時に更新)
+    search_work_content = models.TextField("業務内容 (検索用)", blank=True, editable=False)
     precautions = models.TextField("注意事項")
     
     # 待遇 (画像2を基に追加)
@@ -155,6 +160,20 @@ class JobTemplate(models.Model):
     has_bicycle_commute = models.BooleanField("自転車通勤可", default=False)
     # 以前のものも残しつつ整理
     has_transportation_allowance = models.BooleanField("交通費支給", default=False)
+
+    # 待遇フラグ (has_*) をまとめたビットマスク。ビット位置は TREATMENT_FLAG_FIELDS の順
+    # business.signals で保存時に更新し、検索インデックス (jobs.JobSearchIndex.treatments) にコピーする
+    TREATMENT_FLAG_FIELDS = (
+        'has_unexperienced_welcome', 'has_bike_car_commute', 'has_clothing_free',
+        'has_coupon_get', 'has_meal', 'has_hair_color_free',
+        'has_bike_bicycle_commute', 'has_bicycle_commute', 'has_transportation_allowance',
+    )
+    treatment_flags = models.IntegerField("待遇ビットマスク", default=0, db_index=True, editable=False)
+
+    # 表示順が先頭の写真 (business.signals で写真の追加・並び替え・削除時に更新。一覧は select_related で取得する)
+    cover_photo = models.ForeignKey(
+        'JobTemplatePhoto', on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name='+'
+    )
     
     belongings = models.TextField("持ち物", blank=True, null=True)
     requirements = models.TextField("働くための条件", blank=True, null=True)
@@ -224,15 +243,52 @@ class JobTemplate(models.Model):
     def __str__(self):
         return self.title
 
+    def compute_treatment_flags(self):
+        """has_* の待遇フラグからビットマスクを計算する"""
+        flags = 0
+        for i, field in enumerate(self.TREATMENT_FLAG_FIELDS):
+            if getattr(self, field):
+                flags |= 1 << i
+        return flags
+
 class JobTemplatePhoto(models.Model):
     """求人ひな形に紐づく写真（最大12枚）"""
     template = models.ForeignKey(JobTemplate, on_delete=models.CASCADE, related_name='photos')
     image = models.ImageField("写真", upload_to='job_templates/photos/')
     order = models.PositiveIntegerField("表示順", default=0)
+    # 派生画像 (サムネイル・WebP) の生成が完了したか (business.images でバックグラウンド生成)
+    derivatives_ready = models.BooleanField("派生画像生成済み", default=False, editable=False)
 
     class Meta:
         ordering = ['order']
 
+    def derivative_url(self, size, fmt='jpeg'):
+        """派生画像のURL。生成前は元画像のURL"""
+        if not self.derivatives_ready:
+            return self.image.url
+        from .images import derivative_name
+        return self.image.storage.url(derivative_name(self.image.name, size, fmt))
+
+    def _srcset(self, fmt):
+        from .images import DERIVATIVE_SIZES
+        return ', '.join(f"{self.derivative_url(size, fmt)} {width}w" for size, width in DERIVATIVE_SIZES.items())
+
+    @property
+    def card_url(self):
+        return self.derivative_url('card')
+
+    @property
+    def detail_url(self):
+        return self.derivative_url('detail')
+
+    @property
+    def srcset(self):
+        return self._srcset('jpeg')
+
+    @property
+    def webp_srcset(self):
+        return self._srcset('webp')
+
 # business/models.py (JobPostingモデルを以下のように調整)
 
 class JobPosting(models.Model):
@@ -241,6 +297,8 @@ class JobPosting(models.Model):
     start_time = models.TimeField("開始時間")
     end_time = models.TimeField("終了時間")
     title = models.CharField("求人タイトル", max_length=200)
+    # 検索用に正規化したタイトル (business.signals で保存時に更新)
+    search_title = models.CharField("求人タイトル (検索用)", max_length=200, blank=True, editable=False)
     
     # ★ ここに work_content を追加
     work_content = models.TextField("業務内容", blank=True, null=True)
@@ -254,11 +312,24 @@ class JobPosting(models.Model):
     
     # 新規追加項目 (詳細表示・マッチング管理用)
     recruitment_count = models.IntegerField("募集人数", default=1)
+    # 確定済みの応募数 (business.signals で応募の作成・状態変更・削除時に増減する)
+    confirmed_count = models.IntegerField("確定人数", default=0)
     break_start = models.TimeField("休憩開始時間", null=True, blank=True)
     break_duration = models.IntegerField("休憩時間(分)", default=0)
+
+    # 実働時間と報酬合計 (business.signals で保存時に計算する。絞り込み・並び替え用)
+    work_minutes = models.IntegerField("実働時間(分)", default=0, editable=False)
+    total_payment = models.IntegerField("報酬合計", default=0, db_index=True, editable=False)
     
     # 応募締切日時 (計算して保存)
     application_deadline = models.DateTimeField("応募締切日時", null=True, blank=True)
+
+    # 勤務の開始・終了日時と実際の締切日時 (business.signals で保存時に計算する。時間帯の絞り込み用)
+    # 終了時間が開始時間以前なら翌日の終了とみなす
+    start_at = models.DateTimeField("開始日時", null=True, editable=False)
+    end_at = models.DateTimeField("終了日時", null=True, editable=False)
+    # 応募締切日時。未設定なら開始日時
+    deadline_at = models.DateTimeField("締切日時", null=True, editable=False)
     
     VISIBILITY_CHOICES = [
         ('public', '一般公開'),
@@ -272,20 +343,29 @@ class JobPosting(models.Model):
     is_published = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # 「募集中のみ」(confirmed_count < recruitment_count) をインデックスだけで判定する
+            models.Index(fields=['work_date', 'confirmed_count', 'recruitment_count'], name='posting_date_capacity_idx'),
+            models.Index(fields=['start_at'], name='posting_start_at_idx'),
+            models.Index(fields=['end_at'], name='posting_end_at_idx'),
+            models.Index(fields=['deadline_at'], name='posting_deadline_at_idx'),
+        ]
+
     @property
     def is_ended(self):
-        from django.utils import timezone
-        now = timezone.now()
-        if self.work_date < now.date():
-            return True
-        if self.work_date == now.date():
-            return self.end_time < now.time()
-        return False
+        """勤務の終了日時を過ぎているか判定"""
+        return self.end_at is not None and self.end_at < timezone.now()
 
     @property
     def matched_count(self):
         """確定済みのマッチング人数を返す"""
-        return self.applications.filter(status="確定済み").count()
+        return self.confirmed_count
+
+    @property
+    def is_full(self):
+        """募集人数に達しているか判定"""
+        return self.confirmed_count >= self.recruitment_count
 
     @property
     def is_old_posting(self):
@@ -294,38 +374,44 @@ class JobPosting(models.Model):
         six_months_ago = now - timezone.timedelta(days=180)
         return self.created_at < six_months_ago
 
-    @property
-    def total_payment(self):
-
-        # 開始時間と終了時間の差分から報酬を計算
-        from datetime import datetime, date, timedelta
-        d = date.today()
-        # TimeFieldはdatetime.combineでdatetimeに変換して計算
-        start_dt = datetime.combine(d, self.start_time)
-        end_dt = datetime.combine(d, self.end_time)
-        
-        if end_dt <= start_dt:
+    def compute_payment(self):
+        """
+        開始・終了時間と休憩時間から (実働分数, 報酬合計) を計算する。
+        終了時間が開始時間以前なら日をまたぐ勤務とみなす。
+        """
+        start = self._meta.get_field('start_time').to_python(self.start_time)
+        end = self._meta.get_field('end_time').to_python(self.end_time)
+        duration = (end.hour * 60 + end.minute) - (start.hour * 60 + start.minute)
+        if duration <= 0:
             # 日をまたぐ場合
-            end_dt += timedelta(days=1)
-            
-        duration_hours = (end_dt - start_dt).total_seconds() / 3600
+            duration += 24 * 60
         # 休憩時間を引く
-        work_hours = max(0, duration_hours - (self.break_duration / 60))
-        
-        return int(self.hourly_wage * work_hours) + self.transportation_fee
+        work_minutes = max(0, duration - (self.break_duration or 0))
+        return work_minutes, self.hourly_wage * work_minutes // 60 + self.transportation_fee
+
+    def compute_schedule(self):
+        """
+        勤務日と開始・終了時間から (開始日時, 終了日時, 締切日時) を計算する。
+        終了時間が開始時間以前なら日をまたぐ勤務とみなす。
+        """
+        work_date = self._meta.get_field('work_date').to_python(self.work_date)
+        start = self._meta.get_field('start_time').to_python(self.start_time)
+        end = self._meta.get_field('end_time').to_python(self.end_time)
+        start_at = timezone.make_aware(datetime.datetime.combine(work_date, start))
+        end_at = timezone.make_aware(datetime.datetime.combine(work_date, end))
+        if end_at <= start_at:
+            # 日をまたぐ場合
+            end_at += datetime.timedelta(days=1)
+        deadline_at = self.application_deadline or start_at
+        return start_at, end_at, deadline_at
 
     def __str__(self):
         return self.title
     
     @property
     def is_expired(self):
-        """現在時刻が開始時刻（締切）を過ぎているか判定"""
-        now = timezone.now()
-        # 日付と時間を結合して比較
-        job_deadline = timezone.make_aware(
-            timezone.datetime.combine(self.work_date, self.start_time)
-        )
-        return now > job_deadline
+        """現在時刻が締切日時（未設定なら開始時刻）を過ぎているか判定"""
+        return self.deadline_at is not None and timezone.now() > self.deadline_at
     
 class JobApplication(models.Model):
     """ワーカーからの申し込みを管理するモデル"""
@@ -388,6 +474,10 @@ class JobApplication(models.Model):
     class Meta:
         # 同じ人が同じ求人に二重に申し込めないように設定
         unique_together = ('job_posting', 'worker')
+        indexes = [
+            # ワーカーの予定・完了一覧 (状態で絞り込む)
+            models.Index(fields=['worker', 'status'], name='application_worker_status_idx'),
+        ]
 
     def __str__(self):
         return f"{self.worker.last_name} - {self.job_posting.title}"
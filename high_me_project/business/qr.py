@@ -0,0 +1,260 @@
+"""
+QRコードの生成 (SVG)。
+チェックイン用トークンを外部のQRコード生成サービスに送らないよう、サーバー内で描画する。
+バイトモード・誤り訂正レベルM・バージョン1〜10 (最大213バイト) のみ対応する。
+"""
+
+# 誤り訂正レベルM: バージョン -> (1ブロックの誤り訂正コード語数, [(ブロック数, 1ブロックのデータコード語数), ...])
+EC_BLOCKS_M = {
+    1: (10, [(1, 16)]),
+    2: (16, [(1, 28)]),
+    3: (26, [(1, 44)]),
+    4: (18, [(2, 32)]),
+    5: (24, [(2, 43)]),
+    6: (16, [(4, 27)]),
+    7: (18, [(4, 31)]),
+    8: (22, [(2, 38), (2, 39)]),
+    9: (22, [(3, 36), (2, 37)]),
+    10: (26, [(4, 43), (1, 44)]),
+}
+# バージョン -> 位置合わせパターンの中心座標
+ALIGNMENT_POSITIONS = {
+    1: [], 2: [6, 18], 3: [6, 22], 4: [6, 26], 5: [6, 30],
+    6: [6, 34], 7: [6, 22, 38], 8: [6, 24, 42], 9: [6, 26, 46], 10: [6, 28, 50],
+}
+# 形式情報の誤り訂正レベルMのビット
+FORMAT_BITS_M = 0
+# 周囲の余白 (モジュール数)
+QUIET_ZONE = 4
+
+MASKS = [
+    lambda x, y: (x + y) % 2 == 0,
+    lambda x, y: y % 2 == 0,
+    lambda x, y: x % 3 == 0,
+    lambda x, y: (x + y) % 3 == 0,
+    lambda x, y: (x // 3 + y // 2) % 2 == 0,
+    lambda x, y: x * y % 2 + x * y % 3 == 0,
+    lambda x, y: (x * y % 2 + x * y % 3) % 2 == 0,
+    lambda x, y: ((x + y) % 2 + x * y % 3) % 2 == 0,
+]
+
+
+def _gf_tables():
+    exp, log = [0] * 512, [0] * 256
+    value = 1
+    for i in range(255):
+        exp[i] = value
+        log[value] = i
+        value <<= 1
+        if value & 0x100:
+            value ^= 0x11D
+    for i in range(255, 512):
+        exp[i] = exp[i - 255]
+    return exp, log
+
+
+GF_EXP, GF_LOG = _gf_tables()
+
+
+def _rs_remainder(data, degree):
+    """リード・ソロモン符号の誤り訂正コード語"""
+    generator = [1]
+    for i in range(degree):
+        generator = [
+            (generator[j] if j < len(generator) else 0)
+            ^ (GF_EXP[GF_LOG[generator[j - 1]] + i] if 0 < j and generator[j - 1] else 0)
+            for j in range(len(generator) + 1)
+        ]
+    remainder = [0] * degree
+    for byte in data:
+        factor = byte ^ remainder.pop(0)
+        remainder.append(0)
+        if factor:
+            for j in range(degree):
+                if generator[j + 1]:
+                    remainder[j] ^= GF_EXP[GF_LOG[generator[j + 1]] + GF_LOG[factor]]
+    return remainder
+
+
+def _codewords(data):
+    """(バージョン, インターリーブ済みのコード語)"""
+    for version, (ec_len, groups) in EC_BLOCKS_M.items():
+        capacity = sum(count * size for count, size in groups)
+        count_bits = 8 if version < 10 else 16
+        if 4 + count_bits + len(data) * 8 <= capacity * 8:
+            break
+    else:
+        raise ValueError('QRコードに収まらない長さです')
+
+    bits = [0, 1, 0, 0] + [(len(data) >> i) & 1 for i in reversed(range(count_bits))]
+    for byte in data:
+        bits += [(byte >> i) & 1 for i in reversed(range(8))]
+    bits += [0] * min(4, capacity * 8 - len(bits))
+    bits += [0] * (-len(bits) % 8)
+    payload = [int(''.join(map(str, bits[i:i + 8])), 2) for i in range(0, len(bits), 8)]
+    payload += [0xEC, 0x11] * ((capacity - len(payload)) // 2) + [0xEC] * ((capacity - len(payload)) % 2)
+
+    blocks, offset = [], 0
+    for count, size in groups:
+        for _ in range(count):
+            blocks.append(payload[offset:offset + size])
+            offset += size
+    result = []
+    for i in range(max(len(block) for block in blocks)):
+        result += [block[i] for block in blocks if i < len(block)]
+    ec_blocks = [_rs_remainder(block, ec_len) for block in blocks]
+    for i in range(ec_len):
+        result += [block[i] for block in ec_blocks]
+    return version, result
+
+
+class _Matrix:
+
+    def __init__(self, version):
+        self.version = version
+        self.size = version * 4 + 17
+        self.modules = [[False] * self.size for _ in range(self.size)]
+        self.is_function = [[False] * self.size for _ in range(self.size)]
+
+    def set_function(self, x, y, dark):
+        self.modules[y][x] = dark
+        self.is_function[y][x] = True
+
+    def draw_function_patterns(self):
+        size = self.size
+        for i in range(size):
+            self.set_function(6, i, i % 2 == 0)
+            self.set_function(i, 6, i % 2 == 0)
+        for cx, cy in ((3, 3), (size - 4, 3), (3, size - 4)):
+            for dy in range(-4, 5):
+                for dx in range(-4, 5):
+                    if 0 <= cx + dx < size and 0 <= cy + dy < size:
+                        self.set_function(cx + dx, cy + dy, max(abs(dx), abs(dy)) not in (2, 4))
+        positions = ALIGNMENT_POSITIONS[self.version]
+        last = len(positions) - 1
+        for i, cx in enumerate(positions):
+            for j, cy in enumerate(positions):
+                if (i, j) in ((0, 0), (0, last), (last, 0)):
+                    continue
+                for dy in range(-2, 3):
+                    for dx in range(-2, 3):
+                        self.set_function(cx + dx, cy + dy, max(abs(dx), abs(dy)) != 1)
+        # 形式情報の場所を確保してから埋める
+        self.draw_format(0)
+        if self.version >= 7:
+            remainder = self.version
+            for _ in range(12):
+                remainder = (remainder << 1) ^ ((remainder >> 11) * 0x1F25)
+            bits = self.version << 12 | remainder
+            for i in range(18):
+                dark = ((bits >> i) & 1) == 1
+                a, b = size - 11 + i % 3, i // 3
+                self.set_function(a, b, dark)
+                self.set_function(b, a, dark)
+
+    def draw_format(self, mask):
+        size = self.size
+        data = FORMAT_BITS_M << 3 | mask
+        remainder = data
+        for _ in range(10):
+            remainder = (remainder << 1) ^ ((remainder >> 9) * 0x537)
+        bits = (data << 10 | remainder) ^ 0x5412
+
+        def bit(i):
+            return ((bits >> i) & 1) == 1
+
+        for i in range(6):
+            self.set_function(8, i, bit(i))
+        self.set_function(8, 7, bit(6))
+        self.set_function(8, 8, bit(7))
+        self.set_function(7, 8, bit(8))
+        for i in range(9, 15):
+            self.set_function(14 - i, 8, bit(i))
+        for i in range(8):
+            self.set_function(size - 1 - i, 8, bit(i))
+        for i in range(8, 15):
+            self.set_function(8, size - 15 + i, bit(i))
+        self.set_function(8, size - 8, True)
+
+    def draw_codewords(self, codewords):
+        size = self.size
+        i, total = 0, len(codewords) * 8
+        right = size - 1
+        while right >= 1:
+            if right == 6:
+                right = 5
+            upward = ((right + 1) & 2) == 0
+            for vert in range(size):
+                y = size - 1 - vert if upward else vert
+                for x in (right, right - 1):
+                    if not self.is_function[y][x] and i < total:
+                        self.modules[y][x] = ((codewords[i >> 3] >> (7 - (i & 7))) & 1) == 1
+                        i += 1
+            right -= 2
+
+    def apply_mask(self, mask):
+        condition = MASKS[mask]
+        for y in range(self.size):
+            for x in range(self.size):
+                if not self.is_function[y][x] and condition(x, y):
+                    self.modules[y][x] = not self.modules[y][x]
+
+    def penalty(self):
+        """マスクの選択に使う評価値 (小さいほど読み取りやすい)"""
+        rows = self.modules
+        columns = [list(column) for column in zip(*rows)]
+        score = 0
+        for line in rows + columns:
+            run = 1
+            for a, b in zip(line, line[1:]):
+                if a == b:
+                    run += 1
+                else:
+                    score += run - 2 if run >= 5 else 0
+                    run = 1
+            score += run - 2 if run >= 5 else 0
+            text = ''.join('1' if dark else '0' for dark in line)
+            score += 40 * (text.count('10111010000') + text.count('00001011101'))
+        for y in range(self.size - 1):
+            for x in range(self.size - 1):
+                if rows[y][x] == rows[y][x + 1] == rows[y + 1][x] == rows[y + 1][x + 1]:
+                    score += 3
+        dark = sum(map(sum, rows))
+        total = self.size * self.size
+        score += 10 * (abs(dark * 20 - total * 10) // total)
+        return score
+
+
+def make_matrix(text):
+    """QRコードのモジュール (True が黒) の2次元リスト"""
+    version, codewords = _codewords(text.encode('utf-8'))
+    matrix = _Matrix(version)
+    matrix.draw_function_patterns()
+    matrix.draw_codewords(codewords)
+
+    best = None
+    for mask in range(len(MASKS)):
+        matrix.apply_mask(mask)
+        matrix.draw_format(mask)
+        score = matrix.penalty()
+        if best is None or score < best[0]:
+            best = (score, mask)
+        matrix.apply_mask(mask)
+    matrix.apply_mask(best[1])
+    matrix.draw_format(best[1])
+    return matrix.modules
+
+
+def make_svg(text, size=200):
+    """QRコードのSVG (幅・高さ size ピクセル)"""
+    modules = make_matrix(text)
+    width = len(modules) + QUIET_ZONE * 2
+    path = ''.join(
+        f'M{x + QUIET_ZONE},{y + QUIET_ZONE}h1v1h-1z'
+        for y, row in enumerate(modules) for x, dark in enumerate(row) if dark
+    )
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {width} {width}" width="{size}" height="{size}" '
+        f'shape-rendering="crispEdges"><rect width="100%" height="100%" fill="#fff"/>'
+        f'<path d="{path}" fill="#000"/></svg>'
+    )
@@ -1,6 +1,11 @@
-from django.db.models.signals import pre_save
+from django.db.models import F
+from django.db import transaction
+from django.db.models import Subquery, OuterRef
+from django.db.models.signals import pre_save, post_init, post_save, pre_delete, post_delete
 from django.dispatch import receiver
-from .models import Store
+from .models import Store, JobTemplate, JobTemplatePhoto, JobPosting, JobApplication
+from .images import schedule_derivatives
+from .text import normalize_search_text
 import requests
 
 @receiver(pre_save, sender=Store)
@@ -42,3 +47,93 @@ def geocode_store_address(sender, instance, **kwargs):
     except Exception as e:
         # エラー時は更新しない (ログ出力などを検討)
         print(f"Geocoding error: {e}")
+
+
+# --- 検索用の正規化カラム (店舗名・業務内容・タイトル・待遇ビットマスク) ---
+
+@receiver(pre_save, sender=Store)
+def normalize_store_search_name(sender, instance, **kwargs):
+    instance.search_name = normalize_search_text(instance.store_name)
+
+@receiver(pre_save, sender=JobTemplate)
+def normalize_template_search_text(sender, instance, **kwargs):
+    instance.search_work_content = normalize_search_text(instance.work_content)
+    instance.treatment_flags = instance.compute_treatment_flags()
+
+@receiver(pre_save, sender=JobPosting)
+def normalize_posting_search_title(sender, instance, **kwargs):
+    instance.search_title = normalize_search_text(instance.title)
+
+@receiver(pre_save, sender=JobPosting)
+def compute_posting_payment(sender, instance, **kwargs):
+    instance.work_minutes, instance.total_payment = instance.compute_payment()
+
+@receiver(pre_save, sender=JobPosting)
+def compute_posting_schedule(sender, instance, **kwargs):
+    instance.start_at, instance.end_at, instance.deadline_at = instance.compute_schedule()
+
+
+# --- 確定人数 (JobPosting.confirmed_count) の維持 ---
+
+def _adjust_confirmed_count(posting_id, delta):
+    JobPosting.objects.filter(pk=posting_id).update(confirmed_count=F('confirmed_count') + delta)
+
+@receiver(post_init, sender=JobApplication)
+def remember_application_status(sender, instance, **kwargs):
+    # DBから読み込んだ時点の状態を保持しておき、保存時の差分判定に使う
+    # (status が遅延読み込みの場合に余計なクエリを発行しないよう __dict__ を参照)
+    instance._original_status = instance.__dict__.get('status') if instance.pk else None
+
+@receiver(post_save, sender=JobApplication)
+def update_confirmed_count_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    # 申し込み時に ApplicationService が枠を確保済み (確定人数を増やし済み) なら二重に数えない
+    slot_reserved = instance.__dict__.pop('_slot_reserved', False)
+    was_confirmed = instance._original_status == "確定済み"
+    is_confirmed = instance.status == "確定済み"
+    if was_confirmed != is_confirmed and not (slot_reserved and is_confirmed):
+        _adjust_confirmed_count(instance.job_posting_id, 1 if is_confirmed else -1)
+    instance._original_status = instance.status
+
+@receiver(pre_delete, sender=JobApplication)
+def update_confirmed_count_on_delete(sender, instance, **kwargs):
+    if instance._original_status == "確定済み":
+        _adjust_confirmed_count(instance.job_posting_id, -1)
+
+
+# --- 写真の派生画像 (サムネイル・WebP) ---
+
+@receiver(post_init, sender=JobTemplatePhoto)
+def remember_photo_image(sender, instance, **kwargs):
+    # DBから読み込んだ時点のファイル名 (遅延読み込みなら None)
+    image = instance.__dict__.get('image')
+    instance._original_image_name = getattr(image, 'name', image)
+
+@receiver(pre_save, sender=JobTemplatePhoto)
+def reset_photo_derivatives(sender, instance, **kwargs):
+    # 画像が差し替えられたら派生画像を作り直す
+    if instance.image.name != instance._original_image_name:
+        instance.derivatives_ready = False
+
+@receiver(post_save, sender=JobTemplatePhoto)
+def generate_photo_derivatives(sender, instance, raw=False, **kwargs):
+    if raw or instance.derivatives_ready or not instance.image:
+        return
+    instance._original_image_name = instance.image.name
+    # 保存が確定してからバックグラウンドで生成する
+    photo_id, image_name = instance.pk, instance.image.name
+    transaction.on_commit(lambda: schedule_derivatives(photo_id, image_name))
+
+
+# --- 表紙写真 (JobTemplate.cover_photo) の維持 ---
+
+@receiver(post_save, sender=JobTemplatePhoto)
+@receiver(post_delete, sender=JobTemplatePhoto)
+def update_template_cover_photo(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    # 表示順 -> ID で先頭の写真 (photos.first() と同じ)。JobTemplate の保存シグナルは通さない
+    JobTemplate.objects.filter(pk=instance.template_id).update(cover_photo=Subquery(
+        JobTemplatePhoto.objects.filter(template=OuterRef('pk')).order_by('order', 'pk').values('pk')[:1]
+    ))
@@ -30,6 +30,6 @@ def get_unreviewed_worker_count(store):
     now = timezone.now()
     return JobApplication.objects.filter(
         job_posting__template__store=store,
-        job_posting__end_time__lt=now,
+        job_posting__end_at__lt=now,
         worker_review__isnull=True
     ).count()
@@ -1,3 +1,197 @@
-from django.test import TestCase
+import shutil
+import datetime
+import tempfile
+from io import BytesIO, StringIO
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from . import checkin, qr
+from .models import BusinessProfile, Store, JobTemplate, JobTemplatePhoto, JobPosting, JobApplication
+from .images import derivative_name, schedule_derivatives
+
+
+def jpeg_file(width=2000, height=1500):
+    buffer = BytesIO()
+    Image.new('RGB', (width, height), (200, 120, 40)).save(buffer, format='JPEG')
+    return ContentFile(buffer.getvalue(), name='camera.JPG')
+
+
+class PhotoDerivativesTest(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root, IMAGE_DERIVATIVE_WORKERS=0)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        owner = User.objects.create_user(username='owner')
+        biz = BusinessProfile.objects.create(user=owner, company_name='Test Biz', business_type='法人')
+        with mock.patch('business.signals.requests.get', side_effect=Exception('offline')):
+            store = Store.objects.create(
+                business=biz, store_name='テスト店', post_code='1000001',
+                prefecture='東京都', city='千代田区', address_line='1-1',
+            )
+        self.template = JobTemplate.objects.create(
+            store=store, title='ホールスタッフ', industry='飲食', occupation='飲食',
+            work_content='配膳', precautions='なし', address='東京都千代田区1-1', contact_number='0300000000',
+        )
+
+    def test_derivatives_are_generated_on_upload(self):
+        """アップロード時にサムネイル・詳細用の JPEG / WebP が作られ、srcset が派生画像を指すこと"""
+        with self.captureOnCommitCallbacks(execute=True):
+            photo = JobTemplatePhoto.objects.create(template=self.template, image=jpeg_file())
+        photo.refresh_from_db()
+        self.assertTrue(photo.derivatives_ready)
+
+        card = derivative_name(photo.image.name, 'card', 'webp')
+        with default_storage.open(card) as f:
+            self.assertEqual(Image.open(f).size, (480, 360))
+        self.assertIn(f"{default_storage.url(card)} 480w", photo.webp_srcset)
+        self.assertTrue(photo.card_url.endswith('_card.jpg'))
+
+        # 画像を差し替えると作り直す
+        with self.captureOnCommitCallbacks(execute=True):
+            photo.image = jpeg_file(300, 600)
+            photo.save()
+        photo.refresh_from_db()
+        self.assertTrue(photo.derivatives_ready)
+        with default_storage.open(derivative_name(photo.image.name, 'detail', 'jpeg')) as f:
+            self.assertEqual(Image.open(f).size, (300, 600))
+
+    def test_background_failure_is_logged(self):
+        """プールでの生成失敗がログに残り、derivatives_ready が False のままであること"""
+        photo = JobTemplatePhoto.objects.create(template=self.template, image=jpeg_file())
+        executor = ThreadPoolExecutor(max_workers=1)
+        with override_settings(IMAGE_DERIVATIVE_WORKERS=1), \
+                mock.patch('business.images._get_executor', return_value=executor), \
+                self.assertLogs('business.images', 'ERROR') as logs:
+            schedule_derivatives(photo.pk, 'missing/image.jpg')
+            executor.shutdown(wait=True)
+        self.assertIn('missing/image.jpg', logs.output[0])
+        photo.refresh_from_db()
+        self.assertFalse(photo.derivatives_ready)
+
+    def test_backfill_command(self):
+        photo = JobTemplatePhoto.objects.create(template=self.template, image=jpeg_file())
+        self.assertFalse(photo.derivatives_ready)
+        self.assertEqual(photo.card_url, photo.image.url)
+
+        call_command('generate_photo_derivatives', workers=2, stdout=StringIO())
+        photo.refresh_from_db()
+        self.assertTrue(photo.derivatives_ready)
+        self.assertTrue(default_storage.exists(derivative_name(photo.image.name, 'detail', 'webp')))
+
+    def test_cover_photo_follows_add_reorder_and_delete(self):
+        """表紙写真が写真の追加・並び替え・削除に追従すること"""
+        first = JobTemplatePhoto.objects.create(template=self.template, image=jpeg_file(), order=1)
+        second = JobTemplatePhoto.objects.create(template=self.template, image=jpeg_file(), order=2)
+        self.template.refresh_from_db()
+        self.assertEqual(self.template.cover_photo, first)
+
+        second.order = 0
+        second.save()
+        self.template.refresh_from_db()
+        self.assertEqual(self.template.cover_photo, second)
+
+        second.delete()
+        self.template.refresh_from_db()
+        self.assertEqual(self.template.cover_photo, first)
+        self.template.photos.all().delete()
+        self.template.refresh_from_db()
+        self.assertIsNone(self.template.cover_photo)
+
+
+class CheckinTokenTest(TestCase):
+
+    def setUp(self):
+        self.owner = User.objects.create_user(username='owner')
+        biz = BusinessProfile.objects.create(user=self.owner, company_name='Test Biz', business_type='法人')
+        with mock.patch('business.signals.requests.get', side_effect=Exception('offline')):
+            self.store, self.other_store = [Store.objects.create(
+                business=biz, store_name=name, post_code='1000001',
+                prefecture='東京都', city='千代田区', address_line='1-1',
+            ) for name in ('テスト店', '別の店')]
+        template = JobTemplate.objects.create(
+            store=self.store, title='ホールスタッフ', industry='飲食', occupation='飲食',
+            work_content='配膳', precautions='なし', address='東京都千代田区1-1', contact_number='0300000000',
+        )
+        posting = JobPosting.objects.create(
+            template=template, title='ホールスタッフ募集', work_date=timezone.localdate(),
+            start_time=datetime.time(10, 0), end_time=datetime.time(18, 0), break_duration=60,
+        )
+        self.worker = User.objects.create_user(username='worker')
+        self.application = JobApplication.objects.create(job_posting=posting, worker=self.worker)
+
+    def test_token_rotates_and_rejects_tampering(self):
+        now = 1_800_000_000
+        token = checkin.make_token(self.store.id, now)
+        self.assertEqual(checkin.verify_token(token, now), self.store.id)
+        # 1つ前の時間枠までは受け付け、それより古いものは期限切れ
+        self.assertEqual(checkin.verify_token(token, now + checkin.TOKEN_PERIOD), self.store.id)
+        self.assertIsNone(checkin.verify_token(token, now + checkin.TOKEN_PERIOD * 2))
+        self.assertNotEqual(checkin.make_token(self.store.id, now + checkin.TOKEN_PERIOD), token)
+
+        store_id, window, signature = token.split('.')
+        self.assertIsNone(checkin.verify_token(f'{self.other_store.id}.{window}.{signature}', now))
+        for bad in ('', 'abc', f'{store_id}.{window}', f'{store_id}.{window}.{"0" * 32}'):
+            self.assertIsNone(checkin.verify_token(bad, now))
+
+    def test_scan_checks_in_then_out(self):
+        url = reverse('job_qr_scan', args=[self.application.job_posting_id])
+        self.client.force_login(self.worker)
+
+        response = self.client.post(url, {'token': 'expired.0.x'})
+        self.assertEqual(response.status_code, 400)
+        # 別の店舗のQRコードでは打刻しない
+        response = self.client.post(url, {'token': checkin.make_token(self.other_store.id)})
+        self.assertEqual(response.status_code, 404)
+
+        response = self.client.post(url, {'token': checkin.make_token(self.store.id)})
+        self.assertTrue(response.context['is_checkin'])
+        self.application.refresh_from_db()
+        self.assertIsNotNone(self.application.attendance_at)
+        self.assertIsNone(self.application.leaving_at)
+
+        JobApplication.objects.filter(pk=self.application.pk).update(
+            attendance_at=self.application.attendance_at - datetime.timedelta(hours=8)
+        )
+        response = self.client.post(url, {'token': checkin.make_token(self.store.id)})
+        self.assertRedirects(response, reverse('attendance_step1', args=[self.application.pk]), fetch_redirect_response=False)
+        self.application.refresh_from_db()
+        self.assertIsNotNone(self.application.leaving_at)
+        self.assertEqual(self.application.actual_break_duration, 60)
+
+    def test_management_page_serves_current_token(self):
+        self.client.force_login(self.owner)
+        url = reverse('biz_checkin_management', args=[self.store.id])
+        response = self.client.get(url)
+        self.assertEqual(checkin.verify_token(response.context['checkin_token']), self.store.id)
+        data = self.client.get(url, {'ajax': '1'}).json()
+        self.assertEqual(checkin.verify_token(data['checkin_token']), self.store.id)
+        self.assertLessEqual(data['rotate_in'], checkin.TOKEN_PERIOD)
+        # QRコードはサーバー内で描画し、トークンを外部サービスに送らない
+        self.assertNotContains(response, 'qrserver')
+        self.assertContains(response, '<svg')
+        self.assertTrue(data['checkin_qr_svg'].startswith('<svg'))
+
+    def test_qr_matrix_has_finder_patterns(self):
+        modules = qr.make_matrix(checkin.make_token(self.store.id))
+        size = len(modules)
+        self.assertEqual((size - 17) % 4, 0)
+        self.assertTrue(all(len(row) == size for row in modules))
+        finder = [[max(abs(x - 3), abs(y - 3)) != 2 for x in range(7)] for y in range(7)]
+        self.assertEqual([row[:7] for row in modules[:7]], finder)
+        self.assertEqual([row[-7:] for row in modules[:7]], finder)
+        self.assertEqual([row[:7] for row in modules[-7:]], finder)
+        with self.assertRaises(ValueError):
+            qr.make_matrix('x' * 300)
@@ -0,0 +1,16 @@
+import unicodedata
+
+# ひらがな (ぁ〜ゖ, ゝゞ) -> カタカナ
+HIRAGANA_TO_KATAKANA = {code: code + 0x60 for code in [*range(0x3041, 0x3097), 0x309D, 0x309E]}
+
+
+def normalize_search_text(value):
+    """
+    検索用の正規化。
+    NFKC (全角英数・半角カナの統一) -> ひらがなをカタカナに寄せる -> 大文字小文字の統一
+    保存時の検索用カラムとキーワードの両方に同じ処理をかける。
+    """
+    if not value:
+        return ''
+    text = unicodedata.normalize('NFKC', value)
+    return text.translate(HIRAGANA_TO_KATAKANA).casefold()
@@ -20,6 +20,8 @@ from .models import (
 )
 from accounts.models import WorkerProfile, WorkerBadge, WalletTransaction # WalletTransactionを追加
 from .mixins import BusinessLoginRequiredMixin
+from .checkin import make_token as make_checkin_token, seconds_until_rotation
+from .qr import make_svg as make_qr_svg
 
 from .forms import (
     SignupForm, AccountRegisterForm, BusinessRegisterForm, StoreSetupForm,
@@ -484,7 +486,7 @@ class TemplateListView(BusinessLoginRequiredMixin, ListView):
         biz_profile = get_object_or_404(BusinessProfile, user=self.request.user)
         self.store = get_object_or_404(Store, id=self.kwargs['store_id'], business=biz_profile)
         
-        queryset = JobTemplate.objects.filter(store=self.store)
+        queryset = JobTemplate.objects.filter(store=self.store).select_related('cover_photo')
         
         sort_order = self.request.GET.get('sort', 'template_newest')
         if sort_order == 'job_newest':
@@ -1186,14 +1188,14 @@ class BizWorkerReviewJobListView(BusinessLoginRequiredMixin, ListView):
         queryset = JobPosting.objects.filter(
             template__store=self.store
         ).filter(
-            Q(end_time__lt=now) | Q(applications__leaving_at__isnull=False)
+            Q(end_at__lt=now) | Q(applications__leaving_at__isnull=False)
         ).distinct().annotate(
             unreviewed_count=Count('applications', filter=Q(
                 applications__worker_review__isnull=True,
                 # レビュー対象: (時間が過ぎている OR チェックアウト済み)
                 # Countのfilter内でOR条件を書く
-            ) & (Q(applications__job_posting__end_time__lt=now) | Q(applications__leaving_at__isnull=False)))
-        ).filter(unreviewed_count__gt=0).order_by('-end_time')
+            ) & (Q(end_at__lt=now) | Q(applications__leaving_at__isnull=False)))
+        ).filter(unreviewed_count__gt=0).order_by('-end_at')
         
         return queryset
 
@@ -1253,7 +1255,7 @@ class BizWorkerReviewListView(BusinessLoginRequiredMixin, ListView):
             job_posting=self.job,
             worker_review__isnull=True
         ).filter(
-            Q(job_posting__end_time__lt=now) | Q(leaving_at__isnull=False)
+            Q(job_posting__end_at__lt=now) | Q(leaving_at__isnull=False)
         ).select_related('worker__workerprofile', 'job_posting')
         
         return queryset
@@ -1626,8 +1628,25 @@ class BizCheckinManagementView(BusinessLoginRequiredMixin, TemplateView):
         store_id = self.kwargs.get('store_id')
         biz_profile = get_object_or_404(BusinessProfile, user=self.request.user)
         context['store'] = get_object_or_404(Store, id=store_id, business=biz_profile)
+        context.update(self.get_token_data(context['store']))
         return context
 
+    @staticmethod
+    def get_token_data(store):
+        # QRコードの中身 (一定時間ごとに切り替わる署名付きトークン)・その画像 (SVG)・切り替わるまでの秒数。
+        # トークンは有効な打刻の鍵なので、外部のQRコード生成サービスには送らずサーバー内で描画する
+        token = make_checkin_token(store.id)
+        return {'checkin_token': token, 'checkin_qr_svg': make_qr_svg(token), 'rotate_in': seconds_until_rotation()}
+
+    def get(self, request, *args, **kwargs):
+        # 画面を開いたまま切り替わったトークンを取得する
+        if request.GET.get('ajax') == '1':
+            from django.http import JsonResponse
+            biz_profile = get_object_or_404(BusinessProfile, user=request.user)
+            store = get_object_or_404(Store, id=self.kwargs.get('store_id'), business=biz_profile)
+            return JsonResponse({'status': 'success', **self.get_token_data(store)})
+        return super().get(request, *args, **kwargs)
+
 # -----------------------------
 # 勤怠修正依頼 (店舗側)
 # -----------------------------
@@ -87,9 +87,37 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # 申し込みが集中しても書き込みがロック待ちで失敗しにくいように
+            # (WAL で読み込みと書き込みを並行させ、トランザクションは開始時に書き込みロックを取る)
+            'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;',
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
 }
 
+# 検索結果・閲覧可否などのキャッシュ (プロセス内メモリ、上限を超えたら古いものから削除)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'high-me',
+        'OPTIONS': {
+            'MAX_ENTRIES': 5000,
+        },
+    },
+    # 全プロセスで共有する値 (検索・求人カードのバージョン番号、閲覧可否)。
+    # 番号を上げたことが他のワーカープロセスにも伝わるよう、プロセス内メモリではなくDBに置く
+    # (テーブルは jobs のマイグレーションで作成する)
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'high_me_shared_cache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+        },
+    },
+}
+
 
 
 AUTHENTICATION_BACKENDS = [
@@ -141,6 +169,9 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# 写真の派生画像 (サムネイル・WebP) を生成するプロセス数 (0 なら保存時にその場で生成)
+IMAGE_DERIVATIVE_WORKERS = 2
+
 # Login/Logout Settings
 LOGIN_URL = 'gate'
 LOGIN_REDIRECT_URL = 'index'
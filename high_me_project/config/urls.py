@@ -50,6 +50,7 @@ urlpatterns = [
 
     # jobsアプリ関連
     path('home/', job_views.IndexView.as_view(), name='index'), 
+    path('home/jobs/', job_views.IndexJobsApiView.as_view(), name='index_jobs_api'),
 
     # 場所フロー
     path('home/location/', job_views.LocationHomeView.as_view(), name='location_home'),
@@ -57,6 +58,7 @@ urlpatterns = [
     path('home/location/map/', job_views.MapView.as_view(), name='map_view'),
     # 絞り込みフロー
     path('home/refine/', job_views.RefineHomeView.as_view(), name='refine_home'),
+    path('home/refine/facets/', job_views.FacetCountsView.as_view(), name='facet_counts'),
     path('home/refine/occupation/', job_views.OccupationSelectView.as_view(), name='occupation_select'),
     path('home/refine/reward/', job_views.RewardSelectView.as_view(), name='reward_select'),
 
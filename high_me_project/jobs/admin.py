@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import FavoriteJob, FavoriteStore
+from .models import FavoriteJob, FavoriteStore, JobSearchIndex
 
 @admin.register(FavoriteJob)
 class FavoriteJobAdmin(admin.ModelAdmin):
@@ -8,3 +8,8 @@ class FavoriteJobAdmin(admin.ModelAdmin):
 @admin.register(FavoriteStore)
 class FavoriteStoreAdmin(admin.ModelAdmin):
     list_display = ('user', 'store', 'created_at')
+
+@admin.register(JobSearchIndex)
+class JobSearchIndexAdmin(admin.ModelAdmin):
+    list_display = ('posting', 'prefecture', 'occupation', 'work_date', 'start_time', 'remaining_slots')
+    list_filter = ('prefecture',)
@@ -0,0 +1,117 @@
+"""
+求人の全文検索。
+SQLite では FTS5 (trigram) の仮想テーブル、PostgreSQL では keyword_text の pg_trgm (GINインデックス) を使い、
+どちらも同じインターフェース (get_backend()) で扱う。
+日本語は空白で単語に分かれないので、どちらも単語単位ではなく部分一致 (3文字ずつの組) で検索する。
+"""
+from django.db import connection
+from django.db.models import Q, Value, FloatField
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce
+
+FTS_TABLE = 'jobs_jobsearchfts'
+# 全文検索の対象 (タイトル, 業務内容, 職種, 店舗名)
+FTS_COLUMNS = ('title', 'work_content', 'occupation', 'store_name')
+# 関連度の重み (FTS_COLUMNS の順)
+FTS_WEIGHTS = (10.0, 1.0, 3.0, 3.0)
+
+
+class FullTextBackend:
+    """全文検索インデックスを持たないDB用。keyword_text の部分一致で代用する"""
+
+    def upsert(self, documents):
+        """documents: (求人ID, タイトル, 業務内容, 職種, 店舗名) のリスト"""
+
+    def delete(self, posting_ids):
+        pass
+
+    def clear(self):
+        pass
+
+    def match_q(self, term):
+        """キーワード1語に一致する JobSearchIndex の条件"""
+        return Q(keyword_text__icontains=term)
+
+    def rank_expression(self, terms):
+        """関連度 (大きいほど関連が高い)"""
+        return Value(0.0, output_field=FloatField())
+
+
+class SQLiteFTS5Backend(FullTextBackend):
+    """SQLite FTS5 (trigram トークナイザ) の仮想テーブル。rowid = 求人ID"""
+
+    # trigram は3文字未満の語をインデックスで検索できないため、短い語は部分一致で代用する
+    MIN_TERM_LENGTH = 3
+
+    def upsert(self, documents):
+        if not documents:
+            return
+        self.delete([doc[0] for doc in documents])
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {FTS_TABLE} (rowid, {', '.join(FTS_COLUMNS)}) VALUES (%s, %s, %s, %s, %s)",
+                documents,
+            )
+
+    def delete(self, posting_ids):
+        posting_ids = list(posting_ids)
+        with connection.cursor() as cursor:
+            for i in range(0, len(posting_ids), 500):
+                chunk = posting_ids[i:i + 500]
+                cursor.execute(
+                    f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({', '.join(['%s'] * len(chunk))})", chunk
+                )
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+
+    @staticmethod
+    def _phrase(term):
+        return '"' + term.replace('"', '""') + '"'
+
+    def match_q(self, term):
+        if len(term) < self.MIN_TERM_LENGTH:
+            return super().match_q(term)
+        return Q(posting_id__in=RawSQL(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [self._phrase(term)]
+        ))
+
+    def rank_expression(self, terms):
+        terms = [t for t in terms if len(t) >= self.MIN_TERM_LENGTH]
+        if not terms:
+            return super().rank_expression(terms)
+        weights = ', '.join(str(w) for w in FTS_WEIGHTS)
+        # bm25 は小さいほど関連が高いので符号を反転する
+        return Coalesce(RawSQL(
+            f"(SELECT -bm25({FTS_TABLE}, {weights}) FROM {FTS_TABLE} "
+            f"WHERE {FTS_TABLE} MATCH %s AND rowid = jobs_jobsearchindex.posting_id)",
+            [' OR '.join(self._phrase(t) for t in terms)],
+            output_field=FloatField(),
+        ), Value(0.0), output_field=FloatField())
+
+
+class PostgresFullTextBackend(FullTextBackend):
+    """
+    PostgreSQL の pg_trgm。keyword_text への GIN (gin_trgm_ops) インデックスを使うので同期処理は不要。
+    keyword_text も検索語も normalize_search_text 済みなので、大文字小文字を区別しない ILIKE ではなく LIKE で足りる
+    """
+
+    def match_q(self, term):
+        return Q(keyword_text__contains=term)
+
+    def rank_expression(self, terms):
+        if not terms:
+            return super().rank_expression(terms)
+        return RawSQL(
+            ' + '.join(['word_similarity(%s, keyword_text)'] * len(terms)), terms,
+            output_field=FloatField(),
+        )
+
+
+def get_backend():
+    if connection.vendor == 'sqlite':
+        return SQLiteFTS5Backend()
+    if connection.vendor == 'postgresql':
+        return PostgresFullTextBackend()
+    return FullTextBackend()
@@ -0,0 +1,104 @@
+import math
+
+# 求人インデックスに保存するジオハッシュの桁数 (約5m四方)
+GEOHASH_PRECISION = 9
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def geohash_encode(lat, lng, precision=GEOHASH_PRECISION):
+    """緯度経度をジオハッシュ文字列にする"""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True  # 偶数ビットは経度
+    while len(chars) < precision:
+        rng, v = (lng_range, lng) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        value <<= 1
+        if v >= mid:
+            value |= 1
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits = 0
+            value = 0
+    return ''.join(chars)
+
+
+def geohash_cell_size(precision):
+    """指定桁数のジオハッシュ1セルの (緯度幅, 経度幅)"""
+    total_bits = precision * 5
+    lng_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lng_bits)
+
+
+def covering_prefixes(south, north, west, east, max_cells=32):
+    """
+    範囲 (south, north, west, east) を覆うジオハッシュの接頭辞リストを返す。
+    セル数が max_cells 以下になる最も細かい桁数を選ぶ。
+    日付変更線をまたぐ範囲や広すぎる範囲は None (接頭辞で絞れない)。
+    """
+    if south > north or west > east:
+        return None
+
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        lat_size, lng_size = geohash_cell_size(precision)
+        lat_start = math.floor((south + 90) / lat_size)
+        lat_end = math.floor((min(north, 89.999999) + 90) / lat_size)
+        lng_start = math.floor((west + 180) / lng_size)
+        lng_end = math.floor((min(east, 179.999999) + 180) / lng_size)
+        if (lat_end - lat_start + 1) * (lng_end - lng_start + 1) > max_cells:
+            continue
+
+        prefixes = set()
+        for i in range(lat_start, lat_end + 1):
+            for j in range(lng_start, lng_end + 1):
+                # セルの中心点をエンコードすれば、そのセルの接頭辞になる
+                prefixes.add(geohash_encode((i + 0.5) * lat_size - 90, (j + 0.5) * lng_size - 180, precision))
+        return sorted(prefixes)
+    return None
+
+
+def _next_prefix(prefix):
+    """ジオハッシュ順で prefix の直後に来る接頭辞 (範囲の上限, 含まない)"""
+    while prefix:
+        index = BASE32.index(prefix[-1])
+        if index < len(BASE32) - 1:
+            return prefix[:-1] + BASE32[index + 1]
+        prefix = prefix[:-1]
+    return '~'  # BASE32 のどの文字よりも大きい
+
+
+def covering_ranges(south, north, west, east, max_cells=32):
+    """covering_prefixes を連続する接頭辞ごとにまとめた [下限, 上限) の範囲リスト"""
+    prefixes = covering_prefixes(south, north, west, east, max_cells)
+    if prefixes is None:
+        return None
+
+    ranges = []
+    for prefix in prefixes:
+        low, high = prefix, _next_prefix(prefix)
+        # 'xn77' と 'xn770' の間には9桁のジオハッシュが存在しないので連続とみなす
+        if ranges and ranges[-1][1] == low.rstrip('0'):
+            ranges[-1] = (ranges[-1][0], high)
+        else:
+            ranges.append((low, high))
+    return ranges
+
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def bbox_around(lat, lng, radius_km):
+    """中心から半径 radius_km の円を含む範囲 (south, north, west, east)"""
+    dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    dlng = math.degrees(radius_km / (EARTH_RADIUS_KM * max(math.cos(math.radians(lat)), 0.01)))
+    return lat - dlat, lat + dlat, lng - dlng, lng + dlng
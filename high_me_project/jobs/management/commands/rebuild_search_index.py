@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from jobs.services import SearchIndexService
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the denormalized job search index (JobSearchIndex) from published postings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows per bulk upsert')
+
+    def handle(self, *args, **options):
+        count = SearchIndexService.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} postings."))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from jobs.services import AvailabilityCountService
+
+
+class Command(BaseCommand):
+    help = 'Refresh per-(prefecture, date) open job counts. Run periodically so that jobs past their application deadline drop out of the counts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Recount every (prefecture, date) from the search index')
+
+    def handle(self, *args, **options):
+        if options['full']:
+            AvailabilityCountService.rebuild()
+            self.stdout.write(self.style.SUCCESS("Rebuilt availability counts."))
+        else:
+            AvailabilityCountService.expire()
+            self.stdout.write(self.style.SUCCESS("Refreshed availability counts for expired jobs."))
@@ -0,0 +1,96 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:44
+
+from datetime import datetime, timedelta
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q
+from django.utils import timezone
+
+# 待遇フラグのビット位置 (JobTemplate.TREATMENT_FLAG_FIELDS の順)
+TREATMENT_FLAG_FIELDS = (
+    'has_unexperienced_welcome', 'has_bike_car_commute', 'has_clothing_free',
+    'has_coupon_get', 'has_meal', 'has_hair_color_free',
+    'has_bike_bicycle_commute', 'has_bicycle_commute', 'has_transportation_allowance',
+)
+
+
+def fill_search_index(apps, schema_editor):
+    """既存の公開中の求人からインデックス行を作る (SearchIndexService.build_row と同じ内容)"""
+    JobPosting = apps.get_model('business', 'JobPosting')
+    JobSearchIndex = apps.get_model('jobs', 'JobSearchIndex')
+    postings = JobPosting.objects.filter(is_published=True).select_related('template__store').annotate(
+        confirmed=Count('applications', filter=Q(applications__status='確定済み'))
+    ).order_by('pk')
+
+    rows = []
+    for posting in postings.iterator(chunk_size=500):
+        template = posting.template
+        store = template.store
+        start_at = timezone.make_aware(datetime.combine(posting.work_date, posting.start_time))
+        end_at = timezone.make_aware(datetime.combine(posting.work_date, posting.end_time))
+        if end_at <= start_at:
+            # 日をまたぐ場合
+            end_at += timedelta(days=1)
+        work_hours = max(0, (end_at - start_at).total_seconds() / 3600 - posting.break_duration / 60)
+        has_template_pin = template.latitude is not None and template.longitude is not None
+        rows.append(JobSearchIndex(
+            posting_id=posting.pk,
+            store_id=store.pk,
+            prefecture=store.prefecture,
+            occupation=template.occupation,
+            treatments=sum(1 << i for i, field in enumerate(TREATMENT_FLAG_FIELDS) if getattr(template, field)),
+            visibility=posting.visibility,
+            requires_qualification=template.requires_qualification,
+            latitude=template.latitude if has_template_pin else store.latitude,
+            longitude=template.longitude if has_template_pin else store.longitude,
+            work_date=posting.work_date,
+            start_time=posting.start_time,
+            start_at=start_at,
+            end_at=end_at,
+            hourly_wage=posting.hourly_wage,
+            total_payment=int(posting.hourly_wage * work_hours) + posting.transportation_fee,
+            recruitment_count=posting.recruitment_count,
+            remaining_slots=max(0, posting.recruitment_count - posting.confirmed),
+            keyword_text=f"{posting.title}\n{template.work_content}",
+        ))
+    JobSearchIndex.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('business', '0035_annuallimitreleaserequest'),
+        ('jobs', '0002_favoritejob_favoritestore'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobSearchIndex',
+            fields=[
+                ('posting', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_index', serialize=False, to='business.jobposting')),
+                ('prefecture', models.CharField(max_length=20, verbose_name='都道府県')),
+                ('occupation', models.CharField(max_length=100, verbose_name='職種')),
+                ('treatments', models.IntegerField(default=0, verbose_name='待遇ビットマスク')),
+                ('visibility', models.CharField(default='public', max_length=20, verbose_name='公開範囲')),
+                ('requires_qualification', models.BooleanField(default=False, verbose_name='資格必須')),
+                ('latitude', models.FloatField(blank=True, null=True, verbose_name='緯度')),
+                ('longitude', models.FloatField(blank=True, null=True, verbose_name='経度')),
+                ('work_date', models.DateField(verbose_name='勤務日')),
+                ('start_time', models.TimeField(verbose_name='開始時間')),
+                ('start_at', models.DateTimeField(verbose_name='開始日時')),
+                ('end_at', models.DateTimeField(verbose_name='終了日時')),
+                ('hourly_wage', models.IntegerField(verbose_name='時給')),
+                ('total_payment', models.IntegerField(verbose_name='報酬合計')),
+                ('recruitment_count', models.IntegerField(verbose_name='募集人数')),
+                ('remaining_slots', models.IntegerField(verbose_name='残り枠')),
+                ('keyword_text', models.TextField(blank=True, verbose_name='検索用テキスト')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('store', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='business.store')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['prefecture', 'work_date', 'start_time'], name='jobsearch_pref_date_idx'), models.Index(fields=['work_date', 'start_time', 'posting'], name='jobsearch_date_time_idx'), models.Index(fields=['latitude', 'longitude'], name='jobsearch_location_idx')],
+            },
+        ),
+        migrations.RunPython(fill_search_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:48
+
+import zlib
+
+from django.db import migrations, models
+
+
+def fill_sample_key(apps, schema_editor):
+    JobSearchIndex = apps.get_model('jobs', 'JobSearchIndex')
+    rows = list(JobSearchIndex.objects.only('pk'))
+    for row in rows:
+        row.sample_key = zlib.crc32(str(row.pk).encode())
+    JobSearchIndex.objects.bulk_update(rows, ['sample_key'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0003_jobsearchindex'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jobsearchindex',
+            name='sample_key',
+            field=models.BigIntegerField(default=0, verbose_name='抽選キー'),
+        ),
+        migrations.RunPython(fill_sample_key, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='jobsearchindex',
+            index=models.Index(fields=['work_date', 'sample_key'], name='jobsearch_date_sample_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:50
+
+from django.db import migrations, models
+
+from jobs.geo import geohash_encode
+
+
+def fill_geohash(apps, schema_editor):
+    JobSearchIndex = apps.get_model('jobs', 'JobSearchIndex')
+    rows = list(JobSearchIndex.objects.filter(latitude__isnull=False, longitude__isnull=False))
+    for row in rows:
+        row.geohash = geohash_encode(row.latitude, row.longitude)
+    JobSearchIndex.objects.bulk_update(rows, ['geohash'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0004_jobsearchindex_sample_key'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='jobsearchindex',
+            name='jobsearch_location_idx',
+        ),
+        migrations.AddField(
+            model_name='jobsearchindex',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, max_length=12, verbose_name='ジオハッシュ'),
+        ),
+        migrations.RunPython(fill_geohash, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,54 @@
+from django.db import migrations
+
+FTS_TABLE = 'jobs_jobsearchfts'
+
+
+def create_fulltext_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+            "title, work_content, occupation, store_name, tokenize='trigram')"
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            "CREATE INDEX jobsearch_keyword_tsv_idx ON jobs_jobsearchindex "
+            "USING GIN (to_tsvector('simple', keyword_text))"
+        )
+
+    # keyword_text に職種・店舗名を加え、全文検索インデックスを埋める
+    JobSearchIndex = apps.get_model('jobs', 'JobSearchIndex')
+    rows = list(JobSearchIndex.objects.select_related('posting__template__store'))
+    documents = []
+    for row in rows:
+        posting = row.posting
+        template = posting.template
+        row.keyword_text = "\n".join([posting.title, template.work_content, template.occupation, template.store.store_name])
+        documents.append((posting.pk, posting.title, template.work_content, template.occupation, template.store.store_name))
+    JobSearchIndex.objects.bulk_update(rows, ['keyword_text'], batch_size=500)
+
+    if vendor == 'sqlite' and documents:
+        with schema_editor.connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {FTS_TABLE} (rowid, title, work_content, occupation, store_name) VALUES (%s, %s, %s, %s, %s)",
+                documents,
+            )
+
+
+def drop_fulltext_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+    elif vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS jobsearch_keyword_tsv_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0005_jobsearchindex_geohash'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fulltext_index, drop_fulltext_index),
+    ]
@@ -0,0 +1,42 @@
+from django.db import migrations
+
+from business.text import normalize_search_text
+
+FTS_TABLE = 'jobs_jobsearchfts'
+
+
+def renormalize_keyword_index(apps, schema_editor):
+    # keyword_text と全文検索インデックスを正規化済みのカラムから作り直す
+    JobSearchIndex = apps.get_model('jobs', 'JobSearchIndex')
+    rows = list(JobSearchIndex.objects.select_related('posting__template__store'))
+    documents = []
+    for row in rows:
+        posting = row.posting
+        template = posting.template
+        document = (
+            posting.pk, posting.search_title, template.search_work_content,
+            normalize_search_text(template.occupation), template.store.search_name,
+        )
+        row.keyword_text = "\n".join(document[1:])
+        documents.append(document)
+    JobSearchIndex.objects.bulk_update(rows, ['keyword_text'], batch_size=500)
+
+    if schema_editor.connection.vendor == 'sqlite':
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+            cursor.executemany(
+                f"INSERT INTO {FTS_TABLE} (rowid, title, work_content, occupation, store_name) VALUES (%s, %s, %s, %s, %s)",
+                documents,
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('business', '0037_search_normalized_columns'),
+        ('jobs', '0006_jobsearchfts'),
+    ]
+
+    operations = [
+        migrations.RunPython(renormalize_keyword_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:59
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.utils import timezone
+
+
+def fill_availability_counts(apps, schema_editor):
+    JobSearchIndex = apps.get_model('jobs', 'JobSearchIndex')
+    JobAvailabilityCount = apps.get_model('jobs', 'JobAvailabilityCount')
+    rows = JobSearchIndex.objects.filter(
+        visibility='public', remaining_slots__gt=0, work_date__gte=timezone.localdate(),
+    ).values('prefecture', 'work_date').annotate(n=Count('posting_id')).order_by()
+    JobAvailabilityCount.objects.bulk_create([
+        JobAvailabilityCount(prefecture=row['prefecture'], work_date=row['work_date'], open_count=row['n'])
+        for row in rows
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0007_normalize_keyword_text'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobAvailabilityCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('prefecture', models.CharField(max_length=20, verbose_name='都道府県')),
+                ('work_date', models.DateField(verbose_name='勤務日')),
+                ('open_count', models.IntegerField(default=0, verbose_name='募集中の求人数')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['work_date', 'prefecture'], name='availability_date_pref_idx')],
+                'constraints': [models.UniqueConstraint(fields=('prefecture', 'work_date'), name='unique_availability_pref_date')],
+            },
+        ),
+        migrations.RunPython(fill_availability_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:10
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_total_payment(apps, schema_editor):
+    # インデックスの報酬合計を JobPosting に保存した値に揃える
+    JobSearchIndex = apps.get_model('jobs', 'JobSearchIndex')
+    JobPosting = apps.get_model('business', 'JobPosting')
+    JobSearchIndex.objects.update(total_payment=Subquery(
+        JobPosting.objects.filter(pk=OuterRef('posting_id')).values('total_payment')[:1]
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('business', '0039_jobposting_total_payment'),
+        ('jobs', '0008_jobavailabilitycount'),
+    ]
+
+    operations = [
+        migrations.RunPython(copy_total_payment, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='jobsearchindex',
+            index=models.Index(fields=['work_date', '-total_payment', 'posting'], name='jobsearch_date_pay_idx'),
+        ),
+    ]
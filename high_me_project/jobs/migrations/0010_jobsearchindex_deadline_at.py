@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:17
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.utils import timezone
+
+
+def copy_schedule(apps, schema_editor):
+    # インデックスの開始・終了・締切日時を JobPosting に保存した値に揃える
+    JobSearchIndex = apps.get_model('jobs', 'JobSearchIndex')
+    JobPosting = apps.get_model('business', 'JobPosting')
+    postings = JobPosting.objects.filter(pk=OuterRef('posting_id'))
+    JobSearchIndex.objects.update(
+        start_at=Subquery(postings.values('start_at')[:1]),
+        end_at=Subquery(postings.values('end_at')[:1]),
+        deadline_at=Subquery(postings.values('deadline_at')[:1]),
+    )
+
+
+def recount_availability(apps, schema_editor):
+    # 募集中の件数を検索 (only_recruiting) と同じ条件 = 公開・残り枠あり・締切前で数え直す
+    JobSearchIndex = apps.get_model('jobs', 'JobSearchIndex')
+    JobAvailabilityCount = apps.get_model('jobs', 'JobAvailabilityCount')
+    rows = JobSearchIndex.objects.filter(
+        visibility='public', remaining_slots__gt=0, deadline_at__gt=timezone.now(),
+    ).values('prefecture', 'work_date').annotate(n=Count('posting_id')).order_by()
+    JobAvailabilityCount.objects.all().delete()
+    JobAvailabilityCount.objects.bulk_create([
+        JobAvailabilityCount(prefecture=row['prefecture'], work_date=row['work_date'], open_count=row['n'])
+        for row in rows
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('business', '0042_jobposting_schedule'),
+        ('jobs', '0009_jobsearchindex_pay_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jobsearchindex',
+            name='deadline_at',
+            field=models.DateTimeField(null=True, verbose_name='締切日時'),
+        ),
+        migrations.RunPython(copy_schedule, migrations.RunPython.noop),
+        migrations.RunPython(recount_availability, migrations.RunPython.noop),
+    ]
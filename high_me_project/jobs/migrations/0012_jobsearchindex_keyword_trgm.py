@@ -0,0 +1,34 @@
+from django.db import migrations
+
+
+def create_trigram_index(apps, schema_editor):
+    # tsvector は日本語を単語に分けられないので、pg_trgm の部分一致インデックスに置き換える
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    schema_editor.execute("DROP INDEX IF EXISTS jobsearch_keyword_tsv_idx")
+    schema_editor.execute(
+        "CREATE INDEX jobsearch_keyword_trgm_idx ON jobs_jobsearchindex "
+        "USING GIN (keyword_text gin_trgm_ops)"
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS jobsearch_keyword_trgm_idx")
+    schema_editor.execute(
+        "CREATE INDEX jobsearch_keyword_tsv_idx ON jobs_jobsearchindex "
+        "USING GIN (to_tsvector('simple', keyword_text))"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0011_shared_cache_table'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
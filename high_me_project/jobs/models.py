@@ -32,4 +32,79 @@ class FavoriteStore(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
-        unique_together = ('user', 'store')
\ No newline at end of file
+        unique_together = ('user', 'store')
+
+class JobSearchIndex(models.Model):
+    """
+    さがす画面用の非正規化インデックス (公開中の求人1件につき1行)
+    JobPosting / JobTemplate / Store / JobApplication の更新時に jobs.signals から同期する
+    """
+    posting = models.OneToOneField(JobPosting, on_delete=models.CASCADE, primary_key=True, related_name='search_index')
+    store = models.ForeignKey(Store, on_delete=models.CASCADE, related_name='+')
+
+    prefecture = models.CharField("都道府県", max_length=20)
+    occupation = models.CharField("職種", max_length=100)
+    treatments = models.IntegerField("待遇ビットマスク", default=0)
+    visibility = models.CharField("公開範囲", max_length=20, default='public')
+    requires_qualification = models.BooleanField("資格必須", default=False)
+
+    # 緯度経度: テンプレートの手動ピンを優先し、なければ店舗
+    latitude = models.FloatField("緯度", null=True, blank=True)
+    longitude = models.FloatField("経度", null=True, blank=True)
+    # 範囲検索用 (緯度経度のジオハッシュ。接頭辞の範囲で絞り込む)
+    geohash = models.CharField("ジオハッシュ", max_length=12, blank=True, db_index=True)
+
+    work_date = models.DateField("勤務日")
+    start_time = models.TimeField("開始時間")
+    start_at = models.DateTimeField("開始日時")
+    end_at = models.DateTimeField("終了日時")
+    # 応募締切日時 (JobPosting.deadline_at)。「募集中のみ」の判定に使う
+    deadline_at = models.DateTimeField("締切日時", null=True)
+
+    hourly_wage = models.IntegerField("時給")
+    total_payment = models.IntegerField("報酬合計")
+    recruitment_count = models.IntegerField("募集人数")
+    remaining_slots = models.IntegerField("残り枠")
+
+    # キーワード検索用 (タイトル + 業務内容 + 職種 + 店舗名, business.text で正規化済み)
+    # SQLite では jobs_jobsearchfts (FTS5)、PostgreSQL ではこの列の pg_trgm インデックスで全文検索する (jobs.fulltext)
+    keyword_text = models.TextField("検索用テキスト", blank=True)
+
+    # マップの日別サンプリング用。求人IDから決まる固定の乱数キー
+    sample_key = models.BigIntegerField("抽選キー", default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['prefecture', 'work_date', 'start_time'], name='jobsearch_pref_date_idx'),
+            models.Index(fields=['work_date', 'start_time', 'posting'], name='jobsearch_date_time_idx'),
+            models.Index(fields=['work_date', 'sample_key'], name='jobsearch_date_sample_idx'),
+            # 報酬が高い順 (勤務日ごと)
+            models.Index(fields=['work_date', '-total_payment', 'posting'], name='jobsearch_date_pay_idx'),
+        ]
+
+    def __str__(self):
+        return f"SearchIndex for {self.posting_id}"
+
+
+class JobAvailabilityCount(models.Model):
+    """
+    都道府県 × 勤務日ごとの募集中の求人数 (公開中・残り枠あり・開始前)
+    JobSearchIndex の同期時に該当する (都道府県, 勤務日) だけを数え直す
+    """
+    prefecture = models.CharField("都道府県", max_length=20)
+    work_date = models.DateField("勤務日")
+    open_count = models.IntegerField("募集中の求人数", default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['prefecture', 'work_date'], name='unique_availability_pref_date'),
+        ]
+        indexes = [
+            models.Index(fields=['work_date', 'prefecture'], name='availability_date_pref_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.prefecture} {self.work_date}: {self.open_count}"
@@ -0,0 +1,975 @@
+import re
+import copy
+import math
+import zlib
+import base64
+import hashlib
+from datetime import date, time, timedelta, datetime, timezone as dt_timezone
+from functools import lru_cache
+
+from django.db.models import Q, Count, F, Sum, Window, Avg, Min, Max, Value, FloatField
+from django.db.models.functions import RowNumber, Floor, Least, Greatest, Radians, Sin, Cos, ASin, Sqrt, Power
+from django.db.models.lookups import Exact
+from django.core.cache import cache, caches
+from django.db import transaction, IntegrityError
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+from accounts.models import WorkerBadge
+from business.models import (
+    JobPosting, JobTemplate, Store, StoreWorkerGroup, StoreMute, JobApplication, ChatRoom,
+)
+from business.text import normalize_search_text
+from .models import JobSearchIndex, JobAvailabilityCount
+from .constants import OCCUPATIONS, REWARDS
+from .fulltext import get_backend as get_fulltext_backend
+from .geo import EARTH_RADIUS_KM, geohash_encode, covering_ranges, bbox_around
+
+# 全プロセスで共有するキャッシュ (バージョン番号・閲覧可否)。検索結果や断片はプロセス内の cache に置く
+shared_cache = caches['shared']
+
+# 絞り込み画面の表示名 -> JobTemplate のフィールド名
+TREATMENT_FIELDS = {
+    "未経験者歓迎": "has_unexperienced_welcome",
+    "バイク/車通勤可": "has_bike_car_commute",
+    "服装自由": "has_clothing_free",
+    "クーポンGET": "has_coupon_get",
+    "まかないあり": "has_meal",
+    "髪型/カラー自由": "has_hair_color_free",
+    "交通費支給": "has_transportation_allowance",
+}
+
+# 待遇フラグのビット位置 (JobTemplate.treatment_flags と同じ)
+TREATMENT_FLAG_FIELDS = JobTemplate.TREATMENT_FLAG_FIELDS
+TREATMENT_BITS = {field: 1 << i for i, field in enumerate(TREATMENT_FLAG_FIELDS)}
+
+# 時間帯の表示名 -> 開始時刻の範囲 (深夜帯は日付をまたぐ)
+TIME_RANGE_BANDS = {
+    "朝 (4:00〜10:00)": ("04:00", "10:00"),
+    "昼 (10:00〜16:00)": ("10:00", "16:00"),
+    "夕方 (16:00〜22:00)": ("16:00", "22:00"),
+    "深夜 (22:00〜4:00)": ("22:00", "04:00"),
+}
+
+# マップでこのズームレベル未満はクラスタ (グリッド集計) で返す
+MAP_CLUSTER_MAX_ZOOM = 13
+# 地図タイルのズームレベルの範囲
+MAP_MIN_ZOOM, MAP_MAX_ZOOM = 0, 22
+# クラスタのグリッド1マスの大きさ (地図タイル256pxに対するピクセル数)
+MAP_CLUSTER_CELL_PIXELS = 64
+
+# 距離順: この半径 (km) の範囲から順に候補を探し、足りなければ広げる (None は全国)
+DISTANCE_SEARCH_RADII = (5, 20, 80, 300, None)
+
+# 報酬の選択肢の値 ("3000" / "3,000円以上" など) の金額部分
+REWARD_PATTERN = re.compile(r'(\d[\d,]*)')
+
+
+def _split_values(values):
+    """カンマ区切りや空文字を含むリストを平坦化して重複なくソートする"""
+    result = set()
+    for value in values or []:
+        for v in str(value).split(','):
+            v = v.strip()
+            if v:
+                result.add(v)
+    return tuple(sorted(result))
+
+
+def _split_keywords(values):
+    """キーワードを正規化して語に分ける (全角スペース区切りも NFKC で半角になる)"""
+    result = set()
+    for value in values or []:
+        result.update(normalize_search_text(value).split())
+    return tuple(sorted(result))
+
+
+def _parse_min_payment(rewards):
+    """報酬の選択肢 ("3,000円以上" など) から報酬合計の最小値を取り出す"""
+    min_payment = 0
+    for r in rewards or []:
+        match = REWARD_PATTERN.search(str(r))
+        if match:
+            val = int(match.group(1).replace(',', ''))
+            if min_payment == 0 or val < min_payment:
+                min_payment = val
+    return min_payment
+
+
+def sample_key(posting_id):
+    """求人IDから決まる固定の乱数キー (マップの日別サンプリング順)"""
+    return zlib.crc32(str(posting_id).encode())
+
+
+def pin_offset(posting_id, spread=0.0012):
+    """ピンの重なり防止用に、求人IDから決まる (緯度, 経度) のずらし量を返す"""
+    h = zlib.crc32(f"pin:{posting_id}".encode())
+    lat_ratio = (h & 0xFFFF) / 0xFFFF
+    lng_ratio = (h >> 16) / 0xFFFF
+    return (lat_ratio * 2 - 1) * spread, (lng_ratio * 2 - 1) * spread
+
+
+def bbox_q(south, north, west, east):
+    """範囲 (south, north, west, east) の絞り込み条件。ジオハッシュの範囲で候補を絞ってから緯度経度で正確に判定する"""
+    q = Q(latitude__gte=south, latitude__lte=north, longitude__gte=west, longitude__lte=east)
+    ranges = covering_ranges(south, north, west, east)
+    if ranges:
+        geo_q = Q()
+        for low, high in ranges:
+            geo_q |= Q(geohash__gte=low, geohash__lt=high)
+        q &= geo_q
+    return q
+
+
+def encode_cursor(*values):
+    """キーセットページング用のカーソル (並び順のキーの値) を文字列にする"""
+    raw = ','.join(str(v) for v in values)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def _decode_cursor_parts(cursor, *types):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        parts = base64.urlsafe_b64decode(padded).decode().split(',')
+        if len(parts) != len(types):
+            raise ValueError(parts)
+        return tuple(t(part) for t, part in zip(types, parts))
+    except (TypeError, UnicodeDecodeError, ValueError) as e:
+        raise ValueError(f"invalid cursor: {cursor!r}") from e
+
+
+def decode_cursor(cursor):
+    """締切順のカーソルを (勤務日, 開始時間, 求人ID) に戻す。不正な値は ValueError"""
+    return _decode_cursor_parts(cursor, date.fromisoformat, time.fromisoformat, int)
+
+
+def decode_distance_cursor(cursor):
+    """距離順・関連度順のカーソルを (距離km or 関連度, 求人ID) に戻す。不正な値は ValueError"""
+    return _decode_cursor_parts(cursor, float, int)
+
+
+def distance_expression(lat, lng):
+    """(lat, lng) から JobSearchIndex の緯度経度までの距離 (km, haversine)"""
+    dlat = Radians(F('latitude') - Value(lat))
+    dlng = Radians(F('longitude') - Value(lng))
+    a = Power(Sin(dlat / 2), 2) + Value(math.cos(math.radians(lat))) * Cos(Radians(F('latitude'))) * Power(Sin(dlng / 2), 2)
+    # 浮動小数点の誤差で1を超えると ASin が定義域外になるため丸める
+    return Value(2 * EARTH_RADIUS_KM) * ASin(Least(Sqrt(a), Value(1.0), output_field=FloatField()))
+
+
+def approximate_location(prefecture, city=None):
+    """登録住所 (都道府県・市区町村) のおおよその緯度経度。同じ地域の店舗の重心を使う"""
+    if not prefecture:
+        return None
+    stores = Store.objects.filter(prefecture=prefecture, latitude__isnull=False, longitude__isnull=False)
+    for queryset in ([stores.filter(city=city)] if city else []) + [stores]:
+        center = queryset.aggregate(lat=Avg('latitude'), lng=Avg('longitude'))
+        if center['lat'] is not None:
+            return center['lat'], center['lng']
+    return None
+
+
+class WorkerEligibility:
+    """
+    ワーカーが閲覧できる限定公開求人の判定材料と、検索から除外する店舗。
+    所属グループのある店舗・バッジの有無・勤務経験のある店舗・ミュート/ブロックされた店舗を集合で持ち、
+    1つのQにまとめて検索に使う。
+    """
+
+    def __init__(self, group_store_ids=(), has_badge=False, worked_store_ids=(), excluded_store_ids=()):
+        self.group_store_ids = frozenset(group_store_ids)
+        self.has_badge = bool(has_badge)
+        self.worked_store_ids = frozenset(worked_store_ids)
+        self.excluded_store_ids = frozenset(excluded_store_ids)
+
+    @property
+    def signature(self):
+        """キャッシュのキーとして使う"""
+        return (
+            tuple(sorted(self.group_store_ids)), self.has_badge,
+            tuple(sorted(self.worked_store_ids)), tuple(sorted(self.excluded_store_ids)),
+        )
+
+    def visibility_q(self):
+        """閲覧できる求人 (JobSearchIndex に対するQ)。URL限定公開は検索結果に出さない"""
+        q = Q(visibility='public')
+        if self.group_store_ids:
+            q |= Q(visibility='group', store_id__in=sorted(self.group_store_ids))
+        if self.has_badge:
+            q |= Q(visibility='badge')
+        first_time_q = Q(visibility='first_time')
+        if self.worked_store_ids:
+            first_time_q &= ~Q(store_id__in=sorted(self.worked_store_ids))
+        return q | first_time_q
+
+    def q(self):
+        """閲覧できて、ミュート/ブロックされていない店舗の求人 (NOT IN 1つで除外する)"""
+        q = self.visibility_q()
+        if self.excluded_store_ids:
+            q &= ~Q(store_id__in=sorted(self.excluded_store_ids))
+        return q
+
+
+class EligibilityService:
+    """ワーカーごとの WorkerEligibility の計算とキャッシュ"""
+
+    CACHE_SECONDS = 60 * 60
+    # 初回ワーカー限定: 一度でも勤務経験 (確定・完了) のある店舗は対象外
+    WORKED_STATUSES = ('確定済み', '完了')
+
+    @staticmethod
+    def cache_key(user_id):
+        return f'job_eligibility:{user_id}'
+
+    @staticmethod
+    def compute(user):
+        group_store_ids = StoreWorkerGroup.objects.filter(worker__user=user).exclude(
+            group_type='blocked'
+        ).values_list('store_id', flat=True)
+        has_badge = WorkerBadge.objects.filter(worker__user=user, is_obtained=True).exists()
+        worked_store_ids = JobApplication.objects.filter(
+            worker=user, status__in=EligibilityService.WORKED_STATUSES,
+        ).values_list('job_posting__template__store_id', flat=True)
+        # ワーカーがミュートした店舗と、ワーカーをブロックしている店舗
+        excluded_store_ids = set(StoreMute.objects.filter(worker__user=user).values_list('store_id', flat=True))
+        excluded_store_ids.update(StoreWorkerGroup.objects.filter(
+            worker__user=user, group_type='blocked'
+        ).values_list('store_id', flat=True))
+        return WorkerEligibility(group_store_ids, has_badge, worked_store_ids, excluded_store_ids)
+
+    @staticmethod
+    def for_user(user):
+        """ログインしていなければ一般公開と初回ワーカー限定のみ"""
+        if user is None or not user.is_authenticated:
+            return WorkerEligibility()
+        return shared_cache.get_or_set(
+            EligibilityService.cache_key(user.pk),
+            lambda: EligibilityService.compute(user),
+            EligibilityService.CACHE_SECONDS,
+        )
+
+    @staticmethod
+    def invalidate(user_id):
+        shared_cache.delete(EligibilityService.cache_key(user_id))
+
+
+class JobSearchQuery:
+    """
+    さがす画面 (一覧 / マップ) 共通の絞り込み条件。
+    セッションやGETパラメータの値を正規化して保持し、
+    正規化済みの条件 (signature) ごとにコンパイルしたQオブジェクトを使い回す。
+    """
+
+    def __init__(self, prefectures=(), occupations=(), min_payment=0, treatments=(),
+                 time_ranges=(), keywords=(), exclude_keywords=(), only_recruiting=True,
+                 qualification_only=False, public_only=False, require_location=False, eligibility=None):
+        self.prefectures = _split_values(prefectures)
+        self.occupations = _split_values(occupations)
+        self.min_payment = int(min_payment or 0)
+        self.treatments = tuple(sorted(t for t in set(treatments or []) if t in TREATMENT_FIELDS))
+        self.time_ranges = tuple(sorted(t for t in set(time_ranges or []) if t in TIME_RANGE_BANDS))
+        self.keywords = _split_keywords(keywords)
+        self.exclude_keywords = _split_keywords(exclude_keywords)
+        self.only_recruiting = bool(only_recruiting)
+        self.qualification_only = bool(qualification_only)
+        self.public_only = bool(public_only)
+        self.require_location = bool(require_location)
+        # ワーカーごとの閲覧可否・除外店舗 (None なら絞り込まない)。signature には含めない
+        self.eligibility = eligibility
+
+    @classmethod
+    def from_request(cls, request, prefectures=(), **kwargs):
+        """セッションの絞り込み条件 (job_filters) とGETパラメータから生成する"""
+        filters = request.session.get('job_filters', {})
+
+        # 募集中のみ: GETパラメータがあれば優先、なければセッション (デフォルトTrue)
+        only_recruiting = filters.get('only_recruiting', True)
+        only_recruiting_param = request.GET.get('only_recruiting')
+        if only_recruiting_param is not None:
+            only_recruiting = only_recruiting_param == '1'
+
+        return cls(
+            prefectures=prefectures,
+            occupations=filters.get('occupations', []),
+            min_payment=_parse_min_payment(filters.get('rewards', [])),
+            treatments=filters.get('treatments', []),
+            time_ranges=filters.get('time_ranges', []),
+            keywords=[filters.get('keyword') or ''],
+            exclude_keywords=[filters.get('exclude_keyword') or ''],
+            only_recruiting=only_recruiting,
+            qualification_only=filters.get('qualification_only', False),
+            eligibility=kwargs.pop('eligibility', None) or EligibilityService.for_user(getattr(request, 'user', None)),
+            **kwargs
+        )
+
+    @property
+    def signature(self):
+        """正規化済みの条件。キャッシュのキーとして使う"""
+        return (
+            self.prefectures, self.occupations, self.min_payment, self.treatments,
+            self.time_ranges, self.keywords, self.exclude_keywords, self.only_recruiting,
+            self.qualification_only, self.public_only, self.require_location,
+        )
+
+    @property
+    def cache_signature(self):
+        """検索結果のキャッシュ用 (ワーカーごとの閲覧可否を含む)。閲覧可否が同じワーカー同士は結果を共有できる"""
+        return self.signature, self.eligibility.signature if self.eligibility is not None else None
+
+    def compile(self):
+        return _compile_plan(self.signature)
+
+    def search(self, now=None, bbox=None, **filters):
+        """
+        条件に一致する JobSearchIndex のクエリセットを返す。
+        bbox は (south, north, west, east)、filters は追加の絞り込み。
+        """
+        queryset = JobSearchIndex.objects.filter(self.compile(), **filters)
+        if self.eligibility is not None:
+            queryset = queryset.filter(self.eligibility.q())
+        if bbox:
+            queryset = queryset.filter(bbox_q(*bbox))
+
+        if self.only_recruiting:
+            # 締切日時を過ぎていない & 募集人数に達していない
+            queryset = queryset.filter(deadline_at__gt=now or timezone.now(), remaining_slots__gt=0)
+        return queryset
+
+    def postings(self, now=None, **filters):
+        """条件に一致する JobPosting のクエリセットを返す"""
+        return JobPosting.objects.filter(pk__in=self.search(now, **filters).values('posting_id'))
+
+    def sample_per_day(self, per_day, now=None, **filters):
+        """勤務日ごとに最大 per_day 件を抽選キー順に選ぶ (1クエリ)"""
+        return self.search(now, **filters).annotate(
+            day_rank=Window(RowNumber(), partition_by=F('work_date'), order_by=[F('sample_key'), F('posting_id')])
+        ).filter(day_rank__lte=per_day).order_by('work_date', 'sample_key', 'posting_id')
+
+    def page_by_relevance(self, cursor=None, limit=20, now=None, **filters):
+        """
+        キーワードとの関連度が高い順 (関連度, 求人ID) のキーセットページング。
+        求人IDのリストと次ページのカーソルを返す (不正なカーソルは ValueError)。
+        """
+        queryset = self.search(now, **filters).annotate(
+            relevance=get_fulltext_backend().rank_expression(self.keywords)
+        )
+        if cursor:
+            relevance, posting_id = decode_distance_cursor(cursor)
+            queryset = queryset.filter(Q(relevance__lt=relevance) | Q(relevance=relevance, posting_id__gt=posting_id))
+        rows = list(queryset.order_by('-relevance', 'posting_id').values_list('posting_id', 'relevance')[:limit + 1])
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1][1], rows[-1][0])
+        return [pk for pk, _ in rows], next_cursor
+
+    def page_by_payment(self, cursor=None, limit=20, now=None, **filters):
+        """
+        報酬合計が高い順 (報酬合計, 求人ID) のキーセットページング。
+        求人IDのリストと次ページのカーソルを返す (不正なカーソルは ValueError)。
+        """
+        queryset = self.search(now, **filters)
+        if cursor:
+            total_payment, posting_id = _decode_cursor_parts(cursor, int, int)
+            queryset = queryset.filter(
+                Q(total_payment__lt=total_payment) | Q(total_payment=total_payment, posting_id__gt=posting_id)
+            )
+        rows = list(queryset.order_by('-total_payment', 'posting_id').values_list('posting_id', 'total_payment')[:limit + 1])
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1][1], rows[-1][0])
+        return [pk for pk, _ in rows], next_cursor
+
+    def clusters(self, zoom, now=None, **filters):
+        """
+        勤務日ごとに、ズームレベルに応じたグリッドで求人を集計する。
+        各マスの件数・重心・時給の最小/最大を返す。
+        """
+        cell = 360.0 / (2 ** zoom) * MAP_CLUSTER_CELL_PIXELS / 256
+        rows = self.search(now, **filters).annotate(
+            cell_y=Floor(F('latitude') / cell),
+            cell_x=Floor(F('longitude') / cell),
+        ).values('work_date', 'cell_y', 'cell_x').annotate(
+            count=Count('posting_id'),
+            lat=Avg('latitude'),
+            lng=Avg('longitude'),
+            min_wage=Min('hourly_wage'),
+            max_wage=Max('hourly_wage'),
+        ).order_by('work_date', 'cell_y', 'cell_x')
+        return [
+            {key: row[key] for key in ('work_date', 'count', 'lat', 'lng', 'min_wage', 'max_wage')}
+            for row in rows
+        ]
+
+    def facets(self, now=None, **filters):
+        """
+        絞り込み画面用に、職種・待遇・時間帯・報酬の選択肢ごとの件数を1回の集計で返す。
+        各件数は「その選択肢を選んだ場合に何件になるか」(他の項目の選択は適用したまま)。
+        """
+        base = copy.copy(self)
+        base.occupations, base.min_payment, base.treatments, base.time_ranges = (), 0, (), ()
+
+        occupation_q = _occupation_q(self.occupations)
+        payment_q = _payment_q(self.min_payment)
+        treatment_q = _treatment_q(self.treatments)
+        time_q = _time_q(self.time_ranges)
+
+        conditions = {'total': occupation_q & payment_q & treatment_q & time_q}
+        for i, occupation in enumerate(OCCUPATIONS):
+            conditions[f'occupation_{i}'] = Q(occupation=occupation) & payment_q & treatment_q & time_q
+        for i, label in enumerate(TREATMENT_FIELDS):
+            conditions[f'treatment_{i}'] = _treatment_q({*self.treatments, label}) & occupation_q & payment_q & time_q
+        for i, label in enumerate(TIME_RANGE_BANDS):
+            conditions[f'time_{i}'] = _time_q([label]) & occupation_q & payment_q & treatment_q
+        for i, reward in enumerate(REWARDS):
+            conditions[f'reward_{i}'] = _payment_q(reward) & occupation_q & treatment_q & time_q
+
+        counts = base.search(now, **filters).aggregate(**{
+            key: Count('posting_id', filter=condition) for key, condition in conditions.items()
+        })
+        return {
+            'total': counts['total'],
+            'occupations': {o: counts[f'occupation_{i}'] for i, o in enumerate(OCCUPATIONS)},
+            'treatments': {t: counts[f'treatment_{i}'] for i, t in enumerate(TREATMENT_FIELDS)},
+            'time_ranges': {t: counts[f'time_{i}'] for i, t in enumerate(TIME_RANGE_BANDS)},
+            'rewards': {str(r): counts[f'reward_{i}'] for i, r in enumerate(REWARDS)},
+        }
+
+    def page(self, cursor=None, limit=20, now=None, **filters):
+        """
+        (勤務日, 開始時間, 求人ID) 順のキーセットページング。
+        cursor より後ろの求人IDを最大 limit 件と、次ページのカーソルを返す (不正なカーソルは ValueError)。
+        """
+        queryset = self.search(now, **filters)
+        if cursor:
+            work_date, start_time, posting_id = decode_cursor(cursor)
+            queryset = queryset.filter(
+                Q(work_date__gt=work_date)
+                | Q(work_date=work_date, start_time__gt=start_time)
+                | Q(work_date=work_date, start_time=start_time, posting_id__gt=posting_id)
+            )
+        rows = list(
+            queryset.order_by('work_date', 'start_time', 'posting_id')
+            .values_list('work_date', 'start_time', 'posting_id')[:limit + 1]
+        )
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(*rows[-1])
+        return [row[2] for row in rows], next_cursor
+
+    def page_by_distance(self, origin, cursor=None, limit=20, now=None, **filters):
+        """
+        origin (緯度, 経度) から近い順 (距離, 求人ID) のキーセットページング。
+        近い範囲から候補を探して足りなければ範囲を広げる。
+        (求人ID, 距離km) のリストと次ページのカーソルを返す (不正なカーソルは ValueError)。
+        """
+        lat, lng = origin
+        after = decode_distance_cursor(cursor) if cursor else None
+        queryset = self.search(now, **filters).annotate(distance=distance_expression(lat, lng))
+        if after:
+            queryset = queryset.filter(Q(distance__gt=after[0]) | Q(distance=after[0], posting_id__gt=after[1]))
+
+        for radius in DISTANCE_SEARCH_RADII:
+            if radius is None:
+                candidates = queryset.filter(latitude__isnull=False, longitude__isnull=False)
+            else:
+                # 範囲 (ジオハッシュ) で候補を絞り、円の内側だけを採用すれば並び順は正確になる
+                candidates = queryset.filter(bbox_q(*bbox_around(lat, lng, radius)), distance__lte=radius)
+            rows = list(
+                candidates.order_by('distance', 'posting_id').values_list('posting_id', 'distance')[:limit + 1]
+            )
+            if len(rows) > limit:
+                break
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1][1], rows[-1][0])
+        return rows, next_cursor
+
+
+def _occupation_q(occupations):
+    return Q(occupation__in=occupations) if occupations else Q()
+
+
+def _payment_q(min_payment):
+    """報酬合計 (交通費込み) が min_payment 円以上"""
+    return Q(total_payment__gte=min_payment) if min_payment > 0 else Q()
+
+
+def _treatment_q(treatments):
+    """選択した待遇をすべて満たす (ビットマスクのAND)"""
+    if not treatments:
+        return Q()
+    mask = 0
+    for t in treatments:
+        mask |= TREATMENT_BITS[TREATMENT_FIELDS[t]]
+    return Q(Exact(F('treatments').bitand(mask), mask))
+
+
+def _time_q(time_ranges):
+    """選択した時間帯のいずれかに開始時刻が入る"""
+    time_q = Q()
+    for tr in time_ranges:
+        start, end = TIME_RANGE_BANDS[tr]
+        if start < end:
+            time_q |= Q(start_time__gte=start, start_time__lt=end)
+        else:
+            time_q |= Q(start_time__gte=start) | Q(start_time__lt=end)
+    return time_q
+
+
+@lru_cache(maxsize=256)
+def _compile_plan(signature):
+    """signature から日時に依存しない絞り込み条件 (JobSearchIndex に対するQ) を組み立てる"""
+    (prefectures, occupations, min_payment, treatments, time_ranges, keywords, exclude_keywords,
+     only_recruiting, qualification_only, public_only, require_location) = signature
+
+    q = Q()
+    if public_only:
+        q &= Q(visibility='public')
+    if prefectures:
+        q &= Q(prefecture__in=prefectures)
+    if require_location:
+        q &= Q(latitude__isnull=False, longitude__isnull=False)
+    q &= _occupation_q(occupations) & _payment_q(min_payment) & _treatment_q(treatments) & _time_q(time_ranges)
+    fulltext = get_fulltext_backend()
+    for k in keywords:
+        q &= fulltext.match_q(k)
+    if exclude_keywords:
+        keyword_q = Q()
+        for k in exclude_keywords:
+            keyword_q |= fulltext.match_q(k)
+        q &= ~keyword_q
+    if qualification_only:
+        q &= Q(requires_qualification=True)
+    return q
+
+
+class SearchIndexService:
+    """JobSearchIndex を JobPosting / JobTemplate / Store / JobApplication と同期する"""
+
+    UPDATE_FIELDS = [
+        'store', 'prefecture', 'occupation', 'treatments', 'visibility', 'requires_qualification',
+        'latitude', 'longitude', 'geohash', 'work_date', 'start_time', 'start_at', 'end_at',
+        'deadline_at', 'hourly_wage', 'total_payment', 'recruitment_count', 'remaining_slots', 'keyword_text',
+        'sample_key', 'updated_at',
+    ]
+
+    @staticmethod
+    def build_row(posting):
+        """JobPosting (template__store を取得済み、remaining を付与済み) からインデックス行を作る"""
+        template = posting.template
+        store = template.store
+
+        has_template_pin = template.latitude is not None and template.longitude is not None
+        latitude = template.latitude if has_template_pin else store.latitude
+        longitude = template.longitude if has_template_pin else store.longitude
+        has_location = latitude is not None and longitude is not None
+        return JobSearchIndex(
+            posting=posting,
+            store=store,
+            prefecture=store.prefecture,
+            occupation=template.occupation,
+            treatments=template.treatment_flags,
+            visibility=posting.visibility,
+            requires_qualification=template.requires_qualification,
+            latitude=latitude,
+            longitude=longitude,
+            geohash=geohash_encode(latitude, longitude) if has_location else '',
+            work_date=posting.work_date,
+            start_time=posting.start_time,
+            start_at=posting.start_at,
+            end_at=posting.end_at,
+            deadline_at=posting.deadline_at,
+            hourly_wage=posting.hourly_wage,
+            total_payment=posting.total_payment,
+            recruitment_count=posting.recruitment_count,
+            remaining_slots=max(0, posting.remaining),
+            keyword_text="\n".join(SearchIndexService.build_document(posting)[1:]),
+            sample_key=sample_key(posting.pk),
+        )
+
+    @staticmethod
+    def build_document(posting):
+        """全文検索インデックス用の (求人ID, タイトル, 業務内容, 職種, 店舗名)。いずれも正規化済みの値"""
+        template = posting.template
+        return (
+            posting.pk, posting.search_title, template.search_work_content,
+            normalize_search_text(template.occupation), template.store.search_name,
+        )
+
+    @staticmethod
+    def sync_postings(queryset, batch_size=500):
+        """指定した求人のインデックス行を作り直す (非公開の求人は削除)"""
+        # 残り枠は JobPosting.confirmed_count から計算する (応募テーブルは結合しない)
+        queryset = queryset.select_related('template__store').annotate(
+            remaining=F('recruitment_count') - F('confirmed_count')
+        ).order_by('pk')
+
+        rows = []
+        documents = []
+        unpublished_ids = []
+        for posting in queryset.iterator(chunk_size=batch_size):
+            if not posting.is_published:
+                unpublished_ids.append(posting.pk)
+                continue
+            rows.append(SearchIndexService.build_row(posting))
+            documents.append(SearchIndexService.build_document(posting))
+            if len(rows) >= batch_size:
+                SearchIndexService._upsert(rows, documents)
+                rows, documents = [], []
+        if rows:
+            SearchIndexService._upsert(rows, documents)
+        if unpublished_ids:
+            SearchIndexService.remove_postings(unpublished_ids)
+
+    @staticmethod
+    def sync_posting(posting_id):
+        """求人1件分を同期する。求人が削除済みならインデックス行も消す"""
+        queryset = JobPosting.objects.filter(pk=posting_id)
+        if not queryset.exists():
+            SearchIndexService.remove_postings([posting_id])
+            return
+        SearchIndexService.sync_postings(queryset)
+
+    @staticmethod
+    def update_remaining_slots(posting_id):
+        """
+        応募の増減で変わる残り枠だけを1回の UPDATE で更新する。
+        満員になった・空きが出たとき (0 をまたいだとき) だけ募集中件数を数え直す。
+        """
+        row = JobSearchIndex.objects.filter(posting_id=posting_id).values(
+            'prefecture', 'work_date', 'remaining_slots'
+        ).first()
+        if row is None:
+            return
+        remaining = JobPosting.objects.filter(pk=posting_id).values_list(
+            Greatest(F('recruitment_count') - F('confirmed_count'), Value(0)), flat=True
+        ).first()
+        if remaining is None or remaining == row['remaining_slots']:
+            return
+        JobSearchIndex.objects.filter(posting_id=posting_id).update(remaining_slots=remaining)
+        if (remaining > 0) != (row['remaining_slots'] > 0):
+            AvailabilityCountService.refresh({(row['prefecture'], row['work_date'])})
+            SearchCacheService.bump()
+
+    @staticmethod
+    def remove_postings(posting_ids):
+        """インデックス行と全文検索インデックスから求人を取り除く"""
+        rows = JobSearchIndex.objects.filter(posting_id__in=posting_ids)
+        old_keys = set(rows.values_list('prefecture', 'work_date'))
+        rows.delete()
+        get_fulltext_backend().delete(posting_ids)
+        AvailabilityCountService.refresh(old_keys)
+        if old_keys:
+            # 非公開・削除で検索結果から消える
+            SearchCacheService.bump()
+
+    @staticmethod
+    def rebuild(batch_size=500):
+        """インデックスを全件作り直し、作成した行数を返す"""
+        JobSearchIndex.objects.all().delete()
+        get_fulltext_backend().clear()
+        SearchIndexService.sync_postings(JobPosting.objects.filter(is_published=True), batch_size=batch_size)
+        AvailabilityCountService.rebuild()
+        return JobSearchIndex.objects.count()
+
+    # 絞り込み・並び替え・表示に使う列 (更新日時以外)。どれかが変わったら検索キャッシュを無効にする。
+    # 残り枠は件数そのものを表示しないので、満員/空きの切り替わりだけを見る
+    STATE_FIELDS = tuple(
+        'store_id' if f == 'store' else f
+        for f in UPDATE_FIELDS if f not in ('updated_at', 'remaining_slots')
+    )
+
+    @staticmethod
+    def _row_state(row):
+        fields = SearchIndexService.STATE_FIELDS
+        if isinstance(row, dict):
+            return tuple(row[f] for f in fields) + (row['remaining_slots'] > 0,)
+        return tuple(getattr(row, f) for f in fields) + (row.remaining_slots > 0,)
+
+    @staticmethod
+    def _upsert(rows, documents):
+        old_rows = list(JobSearchIndex.objects.filter(posting_id__in=[row.posting_id for row in rows]).values(
+            'posting_id', 'remaining_slots', *SearchIndexService.STATE_FIELDS
+        ))
+        old_states = {old['posting_id']: SearchIndexService._row_state(old) for old in old_rows}
+        old_keys = {(old['prefecture'], old['work_date']) for old in old_rows}
+        JobSearchIndex.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=['posting'],
+            update_fields=SearchIndexService.UPDATE_FIELDS,
+        )
+        get_fulltext_backend().upsert(documents)
+        # 変更前後の (都道府県, 勤務日) の募集中件数を数え直す
+        AvailabilityCountService.refresh(old_keys | {(row.prefecture, row.work_date) for row in rows})
+        # 検索結果・ピン・カードに出る値が変わったときだけ検索キャッシュを無効にする (保存しただけでは変えない)
+        if any(old_states.get(row.posting_id) != SearchIndexService._row_state(row) for row in rows):
+            SearchCacheService.bump()
+
+
+class AvailabilityCountService:
+    """都道府県 × 勤務日の募集中の求人数 (JobAvailabilityCount) の更新と参照"""
+
+    @staticmethod
+    def _count(now=None, **filters):
+        # 募集中 = 公開中・残り枠あり・締切前 (JobSearchQuery の only_recruiting と同じ条件)
+        rows = JobSearchQuery(public_only=True).search(now, **filters).values(
+            'prefecture', 'work_date'
+        ).annotate(n=Count('posting_id')).order_by()
+        return {(row['prefecture'], row['work_date']): row['n'] for row in rows}
+
+    @staticmethod
+    def refresh(keys, now=None):
+        """指定した (都道府県, 勤務日) の件数を数え直す"""
+        keys = set(keys)
+        if not keys:
+            return
+        counts = AvailabilityCountService._count(
+            now,
+            prefecture__in={pref for pref, _ in keys},
+            work_date__in={work_date for _, work_date in keys},
+        )
+        JobAvailabilityCount.objects.bulk_create(
+            [JobAvailabilityCount(prefecture=pref, work_date=work_date, open_count=counts.get((pref, work_date), 0))
+             for pref, work_date in keys],
+            update_conflicts=True,
+            unique_fields=['prefecture', 'work_date'],
+            update_fields=['open_count', 'updated_at'],
+        )
+
+    @staticmethod
+    def expire(now=None):
+        """
+        締切日時を過ぎた求人を件数から外し、過去日の行を削除する (定期実行用)。
+        応募締切は勤務日より前のこともあるので、今日に限らず締切を過ぎた求人のある (都道府県, 勤務日) を数え直す
+        """
+        now = now or timezone.now()
+        today = timezone.localdate(now)
+        JobAvailabilityCount.objects.filter(work_date__lt=today).delete()
+        AvailabilityCountService.refresh(
+            JobSearchIndex.objects.filter(work_date__gte=today, deadline_at__lte=now).values_list(
+                'prefecture', 'work_date'
+            ).distinct(),
+            now,
+        )
+        # 締切を過ぎた求人が検索結果から消える
+        SearchCacheService.bump()
+
+    @staticmethod
+    def rebuild(now=None):
+        """全件数えて作り直す"""
+        JobAvailabilityCount.objects.all().delete()
+        JobAvailabilityCount.objects.bulk_create(
+            [JobAvailabilityCount(prefecture=pref, work_date=work_date, open_count=n)
+             for (pref, work_date), n in AvailabilityCountService._count(now).items()],
+            batch_size=500,
+        )
+        SearchCacheService.bump()
+
+    @staticmethod
+    def date_counts(prefectures, dates):
+        """{勤務日: 件数} (prefectures が空なら全国)"""
+        queryset = JobAvailabilityCount.objects.filter(work_date__in=dates)
+        if prefectures:
+            queryset = queryset.filter(prefecture__in=prefectures)
+        rows = queryset.values('work_date').annotate(total=Sum('open_count')).order_by()
+        return {row['work_date']: row['total'] for row in rows}
+
+    @staticmethod
+    def prefecture_counts(dates):
+        """{都道府県: 件数}"""
+        rows = JobAvailabilityCount.objects.filter(work_date__in=dates).values('prefecture').annotate(
+            total=Sum('open_count')
+        ).order_by()
+        return {row['prefecture']: row['total'] for row in rows}
+
+
+class SearchCacheService:
+    """
+    検索結果のキャッシュ。
+    キーに求人全体のバージョン番号を含め、求人の公開・満員・締切のたびに番号を上げて一括で無効にする。
+    """
+
+    VERSION_KEY = 'job_postings_version'
+    CACHE_SECONDS = 5 * 60
+
+    @staticmethod
+    def version():
+        """(バージョン番号, 更新日時)"""
+        current = shared_cache.get(SearchCacheService.VERSION_KEY)
+        if current is None:
+            current = SearchCacheService.bump()
+        return current
+
+    @staticmethod
+    def bump():
+        # 番号は更新日時から作るので、キャッシュが消えても過去の番号と重ならない
+        now = timezone.now()
+        current = (int(now.timestamp() * 1000000), now)
+        shared_cache.set(SearchCacheService.VERSION_KEY, current, None)
+        return current
+
+    @staticmethod
+    def key(*parts):
+        """(キャッシュキー, 更新日時)。parts は正規化済みの条件"""
+        version, updated_at = SearchCacheService.version()
+        digest = hashlib.md5(repr((version, parts)).encode()).hexdigest()
+        return f'job_search:{digest}', updated_at
+
+    @staticmethod
+    def get_or_set(key, default):
+        return cache.get_or_set(key, default, SearchCacheService.CACHE_SECONDS)
+
+
+class JobCardCacheService:
+    """
+    求人カードのテンプレート断片キャッシュ ({% cache %}) のバージョン管理。
+    求人ごと・ひな形ごとにバージョン番号を持ち、保存のたびに番号を変えて古い断片を使われなくする。
+    """
+
+    # 断片キャッシュの有効期間 (テンプレートの {% cache %} と同じ値)
+    FRAGMENT_SECONDS = 60 * 60 * 24
+
+    @staticmethod
+    def version_key(kind, pk):
+        return f'job_card_version:{kind}:{pk}'
+
+    @staticmethod
+    def _new_version():
+        # 更新日時から作るので、番号のキャッシュが消えても過去の番号と重ならない
+        return int(timezone.now().timestamp() * 1000000)
+
+    @staticmethod
+    def version_datetime(card_version):
+        """card_version ("求人の番号.ひな形の番号") のうち新しいほうの更新日時"""
+        micros = max(int(part) for part in card_version.split('.'))
+        return datetime.fromtimestamp(micros / 1000000, tz=dt_timezone.utc)
+
+    @staticmethod
+    def bump(kind, pks):
+        version = JobCardCacheService._new_version()
+        shared_cache.set_many({JobCardCacheService.version_key(kind, pk): version for pk in pks}, None)
+
+    @staticmethod
+    def bump_postings(posting_ids):
+        JobCardCacheService.bump('posting', posting_ids)
+
+    @staticmethod
+    def bump_templates(template_ids):
+        JobCardCacheService.bump('template', template_ids)
+
+    @staticmethod
+    def attach_versions(jobs):
+        """
+        求人 (JobPosting) のリストに card_version (断片キャッシュのキー) を付ける。
+        求人とひな形の番号はまとめて1回で取得する。
+        """
+        keys = {}
+        for job in jobs:
+            keys[job.pk, job.template_id] = (
+                JobCardCacheService.version_key('posting', job.pk),
+                JobCardCacheService.version_key('template', job.template_id),
+            )
+        versions = shared_cache.get_many([key for pair in keys.values() for key in pair])
+
+        missing = {key: JobCardCacheService._new_version()
+                   for pair in keys.values() for key in pair if key not in versions}
+        if missing:
+            shared_cache.set_many(missing, None)
+            versions.update(missing)
+
+        for job in jobs:
+            posting_key, template_key = keys[job.pk, job.template_id]
+            job.card_version = f'{versions[posting_key]}.{versions[template_key]}'
+        return jobs
+
+
+class ApplicationService:
+    """
+    求人への申し込み。
+    募集枠の確保 (確定人数の条件付き UPDATE)・応募の作成・チャットルームの作成を1トランザクションで行うので、
+    同時に申し込まれても募集人数を超えて確定しない。
+    """
+
+    # apply() の結果
+    APPLIED = 'applied'
+    ALREADY_APPLIED = 'already_applied'
+    FULL = 'full'
+    CLOSED = 'closed'
+    OVERLAP = 'overlap'
+
+    # 1回の勤務の最大の長さ (日をまたいでも24時間未満)。重複チェックで見る開始日時の範囲
+    MAX_SHIFT = timedelta(days=1)
+
+    @staticmethod
+    def find_overlap(job, worker):
+        """勤務時間が重なる確定済みの応募 (なければ None)"""
+        return JobApplication.objects.filter(
+            worker=worker,
+            status='確定済み',
+            # 開始日時のインデックスを前後 MAX_SHIFT の範囲だけ見る
+            job_posting__start_at__gt=job.start_at - ApplicationService.MAX_SHIFT,
+            job_posting__start_at__lt=job.end_at,
+            job_posting__end_at__gt=job.start_at,
+        ).exclude(job_posting=job).select_related('job_posting').first()
+
+    @staticmethod
+    def _open_slots(posting_id, now):
+        """締切前で枠が残っている求人"""
+        return JobPosting.objects.filter(
+            pk=posting_id, deadline_at__gt=now, confirmed_count__lt=F('recruitment_count'),
+        )
+
+    @staticmethod
+    def reserve_slot(posting_id, now=None):
+        """確定人数を1つ増やす。締切後・満員なら何もせず False を返す"""
+        return ApplicationService._open_slots(posting_id, now or timezone.now()).update(
+            confirmed_count=F('confirmed_count') + 1
+        ) == 1
+
+    @staticmethod
+    def apply(job, worker, now=None):
+        """
+        申し込む。(結果, JobApplication または None) を返す。
+        OVERLAP のときは勤務時間が重なる確定済みの応募を返す。
+        """
+        now = now or timezone.now()
+        existing = JobApplication.objects.filter(job_posting=job, worker=worker).first()
+        if existing is not None:
+            return ApplicationService.ALREADY_APPLIED, existing
+        if job.deadline_at is None or job.deadline_at <= now:
+            return ApplicationService.CLOSED, None
+        # 満員の求人への申し込みは書き込みロックを取らずに断る
+        if not ApplicationService._open_slots(job.pk, now).exists():
+            return ApplicationService.FULL, None
+
+        try:
+            with transaction.atomic():
+                # 同じワーカーの申し込みを直列にして、重複チェックと確定をまとめて行う
+                # (SQLite はトランザクション開始時に書き込みロックを取るので不要)
+                get_user_model().objects.select_for_update().filter(pk=worker.pk).exists()
+                overlap = ApplicationService.find_overlap(job, worker)
+                if overlap is not None:
+                    return ApplicationService.OVERLAP, overlap
+                if not ApplicationService.reserve_slot(job.pk, now):
+                    return ApplicationService.FULL, None
+                application = JobApplication(job_posting=job, worker=worker, status='確定済み')
+                # 確定人数は reserve_slot で増やしたので、保存時のシグナルでは数えない
+                application._slot_reserved = True
+                application.save()
+                # マッチングした時点で店舗とワーカーのチャットルームを作成する
+                ChatRoom.objects.get_or_create(store_id=job.template.store_id, worker=worker)
+        except IntegrityError:
+            # 同じワーカーの二重送信 (確保した枠はロールバックで戻る)
+            return ApplicationService.ALREADY_APPLIED, JobApplication.objects.get(job_posting=job, worker=worker)
+
+        job.confirmed_count += 1
+        return ApplicationService.APPLIED, application
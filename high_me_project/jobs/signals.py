@@ -0,0 +1,95 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from accounts.models import WorkerBadge, WorkerProfile
+from business.models import (
+    JobPosting, JobTemplate, JobTemplatePhoto, Store, JobApplication, StoreWorkerGroup, StoreMute,
+)
+from .services import SearchIndexService, EligibilityService, JobCardCacheService
+
+
+# --- 検索インデックス (JobSearchIndex) の同期 ---
+
+@receiver(post_save, sender=JobPosting)
+def sync_search_index_for_posting(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    SearchIndexService.sync_posting(instance.pk)
+
+@receiver(post_delete, sender=JobPosting)
+def remove_search_index_for_posting(sender, instance, **kwargs):
+    SearchIndexService.remove_postings([instance.pk])
+
+@receiver(post_save, sender=JobTemplate)
+def sync_search_index_for_template(sender, instance, raw=False, created=False, **kwargs):
+    if raw or created:
+        return
+    SearchIndexService.sync_postings(JobPosting.objects.filter(template=instance))
+
+@receiver(post_save, sender=Store)
+def sync_search_index_for_store(sender, instance, raw=False, created=False, **kwargs):
+    if raw or created:
+        return
+    SearchIndexService.sync_postings(JobPosting.objects.filter(template__store=instance))
+
+@receiver(post_save, sender=JobApplication)
+@receiver(post_delete, sender=JobApplication)
+def sync_search_index_for_application(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    # 確定人数が変わると残り枠が変わる
+    # 確定人数は business.signals が更新するので、その後 (コミット後) に残り枠だけを更新する。
+    # 申し込みのトランザクション (書き込みロック) の中ではインデックスに触れない
+    posting_id = instance.job_posting_id
+    transaction.on_commit(lambda: SearchIndexService.update_remaining_slots(posting_id))
+
+
+# --- 限定公開求人の閲覧可否・除外店舗 (EligibilityService のキャッシュ) の破棄 ---
+
+@receiver(post_save, sender=StoreWorkerGroup)
+@receiver(post_delete, sender=StoreWorkerGroup)
+@receiver(post_save, sender=StoreMute)
+@receiver(post_delete, sender=StoreMute)
+@receiver(post_save, sender=WorkerBadge)
+@receiver(post_delete, sender=WorkerBadge)
+def invalidate_eligibility_for_worker(sender, instance, **kwargs):
+    # worker は WorkerProfile (ワーカー削除の連鎖削除中は既に存在しない)
+    for user_id in WorkerProfile.objects.filter(pk=instance.worker_id).values_list('user_id', flat=True):
+        EligibilityService.invalidate(user_id)
+
+@receiver(post_save, sender=JobApplication)
+@receiver(post_delete, sender=JobApplication)
+def invalidate_eligibility_for_application(sender, instance, **kwargs):
+    # 勤務経験のある店舗 (初回ワーカー限定) が変わる
+    EligibilityService.invalidate(instance.worker_id)
+
+
+# --- 求人カードの断片キャッシュの破棄 (バージョン番号を変える) ---
+
+@receiver(post_save, sender=JobPosting)
+def invalidate_job_card_for_posting(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    JobCardCacheService.bump_postings([instance.pk])
+
+@receiver(post_save, sender=JobTemplate)
+def invalidate_job_cards_for_template(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    JobCardCacheService.bump_templates([instance.pk])
+
+@receiver(post_save, sender=JobTemplatePhoto)
+@receiver(post_delete, sender=JobTemplatePhoto)
+def invalidate_job_cards_for_photo(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    # カードにはひな形の1枚目の写真を表示する
+    JobCardCacheService.bump_templates([instance.template_id])
+
+@receiver(post_save, sender=Store)
+def invalidate_job_cards_for_store(sender, instance, raw=False, created=False, **kwargs):
+    if raw or created:
+        return
+    # カードには店舗の市区町村を表示する
+    JobCardCacheService.bump_templates(JobTemplate.objects.filter(store=instance).values_list('pk', flat=True))
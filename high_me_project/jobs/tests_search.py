@@ -0,0 +1,875 @@
+from io import StringIO
+from unittest import mock
+from datetime import datetime, time, timedelta
+
+from django.test import TestCase, RequestFactory
+from django.urls import reverse
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from business.models import BusinessProfile, Store, JobTemplate, JobPosting, JobApplication, ChatRoom
+from business.text import normalize_search_text
+from jobs.models import JobSearchIndex
+from jobs.services import (
+    JobSearchQuery, SearchIndexService, AvailabilityCountService, EligibilityService, ApplicationService,
+    SearchCacheService, JobCardCacheService,
+)
+
+
+class JobSearchTestBase(TestCase):
+    """検索系テスト用の店舗・ひな形・求人を作成する"""
+
+    def setUp(self):
+        # 閲覧可否や件数のキャッシュを前のテストから持ち越さない
+        cache.clear()
+        owner = User.objects.create_user(username='owner')
+        self.biz = BusinessProfile.objects.create(user=owner, company_name='Test Biz', business_type='法人')
+        self.store = self.create_store('東京都', 35.68, 139.76)
+        self.template = self.create_template(self.store, occupation='飲食', has_meal=True)
+        self.tomorrow = timezone.localdate() + timedelta(days=1)
+
+    def create_store(self, prefecture, lat=None, lng=None):
+        with mock.patch('business.signals.requests.get', side_effect=Exception('offline')):
+            return Store.objects.create(
+                business=self.biz, store_name=f'{prefecture}店', post_code='1000001',
+                prefecture=prefecture, city='千代田区', address_line='1-1',
+                latitude=lat, longitude=lng,
+            )
+
+    def create_template(self, store, **kwargs):
+        fields = dict(
+            store=store, title='ホールスタッフ', industry='飲食', occupation='飲食',
+            work_content='配膳と片付け', precautions='なし', address='東京都千代田区1-1',
+            contact_number='0300000000',
+        )
+        fields.update(kwargs)
+        return JobTemplate.objects.create(**fields)
+
+    def create_posting(self, template=None, **kwargs):
+        fields = dict(
+            template=template or self.template, title='ホールスタッフ募集', work_date=self.tomorrow,
+            start_time=time(10, 0), end_time=time(18, 0), hourly_wage=1200, recruitment_count=1,
+        )
+        fields.update(kwargs)
+        return JobPosting.objects.create(**fields)
+
+    def build_request(self, filters=None, params=None):
+        request = RequestFactory().get('/home/', params or {})
+        request.session = SessionStore()
+        if filters is not None:
+            request.session['job_filters'] = filters
+        return request
+
+
+class JobSearchQueryTest(JobSearchTestBase):
+
+    def search(self, query):
+        return set(query.postings())
+
+    def test_signature_is_normalized(self):
+        """順序やカンマ区切りの違いがあっても同じsignatureになること"""
+        a = JobSearchQuery(prefectures=['東京都,神奈川県'], occupations=['飲食', '販売'])
+        b = JobSearchQuery(prefectures=['神奈川県', '東京都', ''], occupations=['販売', '飲食', '飲食'])
+        self.assertEqual(a.signature, b.signature)
+        self.assertIs(a.compile(), b.compile())
+
+    def test_session_filters(self):
+        """職種・待遇・除外キーワード・報酬 (報酬合計) がまとめて適用されること"""
+        match = self.create_posting()
+        other_template = self.create_template(self.store, occupation='販売')
+        self.create_posting(template=other_template)
+        self.create_posting(title='洗い場スタッフ')
+        self.create_posting(hourly_wage=1000)
+
+        request = self.build_request({
+            'occupations': ['飲食'],
+            'treatments': ['まかないあり'],
+            'exclude_keyword': '洗い場　倉庫',
+            'rewards': ['10000'],
+        })
+        query = JobSearchQuery.from_request(request, prefectures=['東京都'])
+        self.assertEqual(self.search(query), {match})
+
+    def test_only_recruiting_excludes_full_and_started(self):
+        """募集中のみの場合、満員の求人と開始済みの求人が除外されること"""
+        open_job = self.create_posting()
+        full_job = self.create_posting(title='満員')
+        worker = User.objects.create_user(username='worker')
+        with self.captureOnCommitCallbacks(execute=True):
+            JobApplication.objects.create(job_posting=full_job, worker=worker, status='確定済み')
+        started_job = self.create_posting(work_date=timezone.localdate() - timedelta(days=1))
+
+        self.assertEqual(self.search(JobSearchQuery()), {open_job})
+        self.assertEqual(
+            self.search(JobSearchQuery(only_recruiting=False)), {open_job, full_job, started_job}
+        )
+
+    def test_sample_per_day(self):
+        """日別に上限件数まで、毎回同じ求人が選ばれること"""
+        day_after = self.tomorrow + timedelta(days=1)
+        for _ in range(4):
+            self.create_posting()
+        self.create_posting(work_date=day_after)
+
+        rows = list(JobSearchQuery().sample_per_day(2).values_list('work_date', 'posting_id'))
+        self.assertEqual([d for d, _ in rows], [self.tomorrow, self.tomorrow, day_after])
+        self.assertEqual(rows, list(JobSearchQuery().sample_per_day(2).values_list('work_date', 'posting_id')))
+
+    def test_bbox_uses_geohash_ranges(self):
+        """範囲の端にある求人も含め、範囲内の求人だけが返ること"""
+        inside = self.create_posting()
+        edge = self.create_posting(template=self.create_template(self.create_store('東京都', 35.7499, 139.6001)))
+        self.create_posting(template=self.create_template(self.create_store('大阪府', 34.69, 135.50)))
+
+        bbox = (35.6, 35.75, 139.6, 139.9)
+        self.assertEqual(set(JobSearchQuery().postings(bbox=bbox)), {inside, edge})
+        self.assertEqual(JobSearchIndex.objects.get(posting=inside).geohash[:4], 'xn76')
+
+    def test_treatment_flags_and_facets(self):
+        """ひな形保存時にビットマスクが更新され、待遇ごとの件数が集計できること"""
+        both = self.create_template(self.store, has_meal=True, has_transportation_allowance=True)
+        self.assertEqual(both.treatment_flags, both.compute_treatment_flags())
+        self.create_posting()
+        self.create_posting(template=both)
+
+        query = JobSearchQuery(treatments=['まかないあり', '交通費支給'])
+        self.assertEqual(query.postings().count(), 1)
+        facets = JobSearchQuery().facets()['treatments']
+        self.assertEqual((facets['まかないあり'], facets['交通費支給'], facets['服装自由']), (2, 1, 0))
+
+    def test_night_time_band(self):
+        """深夜帯は日付をまたいだ開始時刻にマッチすること"""
+        night = self.create_posting(start_time=time(23, 0), end_time=time(5, 0))
+        early = self.create_posting(start_time=time(3, 0), end_time=time(8, 0))
+        self.create_posting(start_time=time(12, 0))
+        query = JobSearchQuery(time_ranges=['深夜 (22:00〜4:00)'])
+        self.assertEqual(self.search(query), {night, early})
+
+
+class FullTextSearchTest(JobSearchTestBase):
+
+    def test_keyword_match_and_exclusion(self):
+        """タイトル・業務内容・店舗名に一致し、短い語 (3文字未満) も検索できること"""
+        cafe = self.create_posting(title='カフェスタッフ')
+        kitchen = self.create_posting(title='調理補助', template=self.create_template(self.store, work_content='キッチンで調理'))
+        self.create_posting(title='倉庫内軽作業', template=self.create_template(self.store, work_content='ピッキング'))
+
+        self.assertEqual(set(JobSearchQuery(keywords=['スタッフ']).postings()), {cafe})
+        self.assertEqual(set(JobSearchQuery(keywords=['調理']).postings()), {kitchen})
+        self.assertEqual(set(JobSearchQuery(keywords=['東京都店']).postings()), {cafe, kitchen, JobPosting.objects.get(title='倉庫内軽作業')})
+        self.assertEqual(set(JobSearchQuery(exclude_keywords=['倉庫', 'キッチン']).postings()), {cafe})
+
+        with mock.patch('business.signals.requests.get', side_effect=Exception('offline')):
+            self.store.store_name = '渋谷駅前店'
+            self.store.save()
+        self.assertEqual(JobSearchQuery(keywords=['渋谷駅前']).postings().count(), 3)
+
+    def test_normalized_matching(self):
+        """半角カナ・全角英数・ひらがな・大文字小文字の違いを吸収して一致すること"""
+        cafe = self.create_posting(title='ｶﾌｪのＨＡＬＬスタッフ')
+        self.assertEqual(JobPosting.objects.get(pk=cafe.pk).search_title, 'カフェノhallスタッフ')
+
+        for keyword in ['かふぇ', 'Hall', 'ｽﾀｯﾌ　かふぇ']:
+            request = self.build_request({'keyword': keyword})
+            self.assertEqual(set(JobSearchQuery.from_request(request).postings()), {cafe}, keyword)
+        request = self.build_request({'exclude_keyword': 'ＨＡＬＬ'})
+        self.assertFalse(JobSearchQuery.from_request(request).postings().exists())
+
+    def test_relevance_ranks_title_matches_first(self):
+        in_content = self.create_posting(title='販売', template=self.create_template(self.store, work_content='レジ打ちと品出し'))
+        in_title = self.create_posting(title='レジ打ち')
+        self.create_posting(title='清掃')
+
+        ids, _ = JobSearchQuery(keywords=['レジ打ち']).page_by_relevance()
+        self.assertEqual(ids, [in_title.pk, in_content.pk])
+
+
+    def test_backends_return_same_hits(self):
+        """FTS5 (SQLite) と pg_trgm (PostgreSQL) の条件が同じ部分一致の結果になること"""
+        from jobs.fulltext import FullTextBackend, SQLiteFTS5Backend, PostgresFullTextBackend
+        self.create_posting(title='カフェのホールスタッフ')
+        self.create_posting(title='東京駅の倉庫内軽作業', template=self.create_template(self.store, work_content='ピッキングと梱包'))
+        self.create_posting(title='調理補助', template=self.create_template(self.store, occupation='調理', work_content='キッチンで仕込み'))
+
+        backends = [FullTextBackend(), SQLiteFTS5Backend(), PostgresFullTextBackend()]
+        for term in ['スタッフ', 'ホールスタ', '倉庫', '東京駅', '梱包', 'キッチンで仕込', '調理', '東京都店', 'レジ']:
+            term = normalize_search_text(term)
+            hits = [set(JobSearchIndex.objects.filter(backend.match_q(term)).values_list('posting_id', flat=True))
+                    for backend in backends]
+            self.assertEqual(hits[0], hits[1], term)
+            self.assertEqual(hits[0], hits[2], term)
+
+class FacetCountsTest(JobSearchTestBase):
+
+    def test_facets_exclude_own_dimension(self):
+        """各項目の件数は自分の項目の選択を外し、他の項目の選択を適用して数えること"""
+        self.create_posting(end_time=time(16, 0))  # 報酬合計 7,700円
+        self.create_posting(start_time=time(23, 0), end_time=time(5, 0))
+        self.create_posting(template=self.create_template(self.store, occupation='販売'), hourly_wage=5000)
+
+        facets = JobSearchQuery(occupations=['飲食'], time_ranges=['昼 (10:00〜16:00)']).facets()
+        self.assertEqual(facets['total'], 1)
+        self.assertEqual((facets['occupations']['飲食'], facets['occupations']['販売']), (1, 1))
+        self.assertEqual((facets['time_ranges']['昼 (10:00〜16:00)'], facets['time_ranges']['深夜 (22:00〜4:00)']), (1, 1))
+        self.assertEqual((facets['treatments']['まかないあり'], facets['treatments']['服装自由']), (1, 0))
+        self.assertEqual((facets['rewards']['5000'], facets['rewards']['8000']), (1, 0))
+
+    def test_facet_counts_view(self):
+        self.create_posting()
+        data = self.client.get(reverse('facet_counts'), {'pref': '東京都'}).json()
+        self.assertEqual((data['total'], data['occupations']['飲食']), (1, 1))
+        data = self.client.get(reverse('facet_counts'), {'pref': '大阪府'}).json()
+        self.assertEqual(data['total'], 0)
+
+    def test_refine_pages_count_with_listing_date_and_prefecture(self):
+        """絞り込み画面の件数は、直前に見ていた一覧の日付・都道府県で数えること"""
+        self.create_posting()
+        self.create_posting(work_date=self.tomorrow + timedelta(days=1))
+        self.create_posting(template=self.create_template(self.create_store('大阪府', 34.69, 135.50)))
+
+        self.client.get(reverse('index'), {'date': self.tomorrow.isoformat(), 'pref': '東京都'})
+        self.assertEqual(self.client.session['search_scope'], {'date': self.tomorrow.isoformat(), 'pref': ['東京都']})
+        page = self.client.get(reverse('occupation_select')).content.decode()
+        self.assertIn("facetParams.set('date',", page)
+        self.assertIn("facetParams.append('pref', '東京都')", page)
+        data = self.client.get(reverse('facet_counts'), {'date': self.tomorrow.isoformat(), 'pref': '東京都'}).json()
+        self.assertEqual(data['total'], 1)
+
+        # マップから開いた場合は既定の条件 (14日間・全都道府県)
+        self.client.get(reverse('map_view'))
+        page = self.client.get(reverse('occupation_select')).content.decode()
+        self.assertNotIn('facetParams.set(', page)
+        self.assertEqual(self.client.get(reverse('facet_counts')).json()['total'], 3)
+
+
+class JobListPaginationTest(JobSearchTestBase):
+
+    def test_cursor_pages_cover_all_postings(self):
+        """カーソルをたどると同時刻の求人も含めて重複・欠落なく全件取得できること"""
+        postings = [self.create_posting(start_time=time(10 + i % 3, 0)) for i in range(7)]
+        expected = [p.pk for p in sorted(postings, key=lambda p: (p.start_time, p.pk))]
+
+        query = JobSearchQuery()
+        seen, cursor = [], None
+        while True:
+            ids, next_cursor = query.page(cursor, limit=3)
+            seen.extend(ids)
+            if not next_cursor:
+                break
+            cursor = next_cursor
+        self.assertEqual(seen, expected)
+
+    def test_index_renders_first_page_and_api_returns_next(self):
+        for _ in range(3):
+            self.create_posting()
+        params = {'date': self.tomorrow.isoformat(), 'pref': '東京都'}
+        with mock.patch('jobs.views.IndexView.page_size', 2):
+            response = self.client.get(reverse('index'), params)
+            self.assertEqual(len(response.context['main_jobs']), 2)
+
+            data = self.client.get(
+                reverse('index_jobs_api'), {**params, 'cursor': response.context['next_cursor']}
+            ).json()
+        self.assertEqual(data['html'].count('job-card-grid'), 1)
+        self.assertIsNone(data['next_cursor'])
+
+        response = self.client.get(reverse('index_jobs_api'), {**params, 'cursor': 'broken'})
+        self.assertEqual(response.status_code, 400)
+
+
+class DistanceSortTest(JobSearchTestBase):
+
+    def test_page_by_distance_widens_radius(self):
+        """近い順に並び、遠方 (全国範囲) の求人までカーソルで重複なくたどれること"""
+        near = self.create_posting()
+        middle = self.create_posting(template=self.create_template(self.create_store('神奈川県', 35.44, 139.64)))
+        far = self.create_posting(template=self.create_template(self.create_store('北海道', 43.06, 141.35)))
+        self.create_posting(template=self.create_template(self.create_store('沖縄県')))  # 座標なし
+
+        seen, cursor = [], None
+        while True:
+            rows, cursor = JobSearchQuery().page_by_distance((35.69, 139.70), cursor, limit=1)
+            seen.extend(rows)
+            if not cursor:
+                break
+        self.assertEqual([pk for pk, _ in seen], [near.pk, middle.pk, far.pk])
+        self.assertAlmostEqual(seen[1][1], 28.3, delta=1)
+
+    def test_index_falls_back_to_saved_address(self):
+        from accounts.models import WorkerProfile
+        near = self.create_posting()
+        osaka = self.create_posting(template=self.create_template(self.create_store('大阪府', 34.69, 135.50)))
+        worker = User.objects.create_user(username='worker', password='pass')
+        WorkerProfile.objects.create(user=worker, prefecture='大阪府', city='千代田区')
+        self.client.force_login(worker)
+
+        response = self.client.get(reverse('index'), {'date': self.tomorrow.isoformat(), 'sort': 'current_location'})
+        self.assertEqual(response.context['main_jobs'], [osaka, near])
+        response = self.client.get(reverse('index'), {
+            'date': self.tomorrow.isoformat(), 'sort': 'specified_location', 'lat': 35.68, 'lng': 139.76,
+        })
+        self.assertEqual(response.context['main_jobs'], [near, osaka])
+
+
+class MapClusterTest(JobSearchTestBase):
+
+    def test_clusters_aggregate_by_grid(self):
+        """近接する求人は1つのクラスタにまとまり、件数・時給の範囲が集計されること"""
+        self.create_posting(hourly_wage=1100)
+        self.create_posting(template=self.create_template(self.store, latitude=35.681, longitude=139.761), hourly_wage=1500)
+        self.create_posting(template=self.create_template(self.create_store('大阪府', 34.69, 135.50)))
+
+        clusters = JobSearchQuery().clusters(8)
+        self.assertEqual(sorted(c['count'] for c in clusters), [1, 2])
+        tokyo = next(c for c in clusters if c['count'] == 2)
+        self.assertEqual((tokyo['min_wage'], tokyo['max_wage']), (1100, 1500))
+        self.assertAlmostEqual(tokyo['lat'], 35.6805)
+
+    def test_map_view_switches_mode_by_zoom(self):
+        self.create_posting()
+        params = {'ajax': '1', 'south': 35, 'north': 36, 'west': 139, 'east': 140}
+        data = self.client.get(reverse('map_view'), {**params, 'zoom': 8}).json()
+        self.assertEqual((data['mode'], data['clusters'][0]['count']), ('cluster', 1))
+        data = self.client.get(reverse('map_view'), {**params, 'zoom': 15}).json()
+        self.assertEqual((data['mode'], len(data['jobs_data'])), ('jobs', 1))
+
+    def test_map_view_clamps_out_of_range_zoom(self):
+        """負・範囲外・数値でないズームでもエラーにならないこと"""
+        self.create_posting()
+        params = {'ajax': '1', 'south': 35, 'north': 36, 'west': 139, 'east': 140}
+        data = self.client.get(reverse('map_view'), {**params, 'zoom': -3}).json()
+        self.assertEqual((data['mode'], data['clusters'][0]['count']), ('cluster', 1))
+        for zoom in ['99', 'abc', 'nan', 'inf', '14.5']:
+            data = self.client.get(reverse('map_view'), {**params, 'zoom': zoom}).json()
+            self.assertEqual((data['mode'], len(data['jobs_data'])), ('jobs', 1), zoom)
+
+
+class VisibilityEligibilityTest(JobSearchTestBase):
+
+    def setUp(self):
+        super().setUp()
+        from accounts.models import WorkerProfile
+        self.worker = User.objects.create_user(username='worker', password='pass')
+        self.profile = WorkerProfile.objects.create(user=self.worker)
+        self.other_store = self.create_store('東京都', 35.69, 139.70)
+        self.public = self.create_posting()
+        self.group = self.create_posting(visibility='group')
+        self.badge = self.create_posting(visibility='badge')
+        self.first_time = self.create_posting(visibility='first_time')
+        self.url = self.create_posting(visibility='url')
+
+    def visible(self, user):
+        query = JobSearchQuery(eligibility=EligibilityService.for_user(user))
+        return set(query.postings(work_date=self.tomorrow))
+
+    def test_restricted_postings_follow_worker_sets(self):
+        """グループ・バッジ・勤務経験に応じて限定公開の求人が出し分けられ、URL限定は出ないこと"""
+        from accounts.models import Badge, WorkerBadge
+        from business.models import StoreWorkerGroup
+        from django.contrib.auth.models import AnonymousUser
+        self.assertEqual(self.visible(AnonymousUser()), {self.public, self.first_time})
+        self.assertEqual(self.visible(self.worker), {self.public, self.first_time})
+
+        # グループ (ブロックは除く) とバッジの変更はキャッシュを破棄して反映される
+        StoreWorkerGroup.objects.create(store=self.create_store('大阪府'), worker=self.profile, group_type='blocked')
+        self.assertEqual(EligibilityService.for_user(self.worker).group_store_ids, frozenset())
+        StoreWorkerGroup.objects.create(store=self.store, worker=self.profile, group_type='favorite')
+        WorkerBadge.objects.create(worker=self.profile, badge=Badge.objects.create(name='接客'), is_obtained=True)
+        self.assertEqual(self.visible(self.worker), {self.public, self.group, self.badge, self.first_time})
+
+        # この店舗で勤務したことがあれば (何年前でも) 初回ワーカー限定は対象外になる
+        worked = self.create_posting(work_date=timezone.localdate() - timedelta(days=365 * 3))
+        JobApplication.objects.create(job_posting=worked, worker=self.worker, status='完了')
+        self.assertEqual(self.visible(self.worker), {self.public, self.group, self.badge})
+
+        other_first_time = self.create_posting(
+            template=self.create_template(self.other_store), visibility='first_time'
+        )
+        self.assertIn(other_first_time, self.visible(self.worker))
+
+    def test_muted_and_blocking_stores_are_excluded(self):
+        """ミュートした店舗・ブロックされた店舗の求人が除外され、解除すると戻ること"""
+        from business.models import StoreMute, StoreWorkerGroup
+        other = self.create_posting(template=self.create_template(self.other_store))
+        mute = StoreMute.objects.create(worker=self.profile, store=self.store)
+        self.assertEqual(self.visible(self.worker), {other})
+        mute.delete()
+        StoreWorkerGroup.objects.create(store=self.other_store, worker=self.profile, group_type='blocked')
+        self.assertEqual(self.visible(self.worker), {self.public, self.first_time})
+        StoreWorkerGroup.objects.filter(worker=self.profile).delete()
+        self.assertEqual(self.visible(self.worker), {self.public, self.first_time, other})
+
+    def test_index_applies_eligibility(self):
+        self.client.force_login(self.worker)
+        response = self.client.get(reverse('index'), {'date': self.tomorrow.isoformat()})
+        self.assertEqual(set(response.context['main_jobs']), {self.public, self.first_time})
+
+
+class SearchResponseCacheTest(JobSearchTestBase):
+
+    def test_map_json_revalidates_with_etag(self):
+        """同じ条件なら304、求人が公開されるとETagが変わり新しい結果を返すこと"""
+        self.create_posting()
+        params = {'ajax': '1', 'south': 35, 'north': 36, 'west': 139, 'east': 140, 'zoom': 15}
+        response = self.client.get(reverse('map_view'), params)
+        self.assertEqual(len(response.json()['jobs_data']), 1)
+        self.assertIn('Last-Modified', response)
+        etag = response['ETag']
+
+        self.assertEqual(self.client.get(reverse('map_view'), params, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.create_posting()
+        response = self.client.get(reverse('map_view'), params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(len(response.json()['jobs_data']), 2)
+
+    def test_map_json_changes_when_wage_is_edited(self):
+        """時給の変更でETagが変わり、新しい時給を返すこと"""
+        posting = self.create_posting()
+        params = {'ajax': '1', 'south': 35, 'north': 36, 'west': 139, 'east': 140, 'zoom': 15}
+        response = self.client.get(reverse('map_view'), params)
+        etag = response['ETag']
+
+        posting.hourly_wage = 3000
+        posting.save()
+        response = self.client.get(reverse('map_view'), params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['jobs_data'][0]['hourly_wage'], 3000)
+
+    def test_index_page_is_shared_until_postings_change(self):
+        first = self.create_posting()
+        params = {'date': self.tomorrow.isoformat()}
+        self.assertEqual(self.client.get(reverse('index'), params).context['main_jobs'], [first])
+        # 2回目はキャッシュから返り、検索しない
+        with mock.patch.object(JobSearchQuery, 'page', side_effect=AssertionError('cache miss')):
+            self.assertEqual(self.client.get(reverse('index'), params).context['main_jobs'], [first])
+        second = self.create_posting(start_time=time(9, 0))
+        self.assertEqual(self.client.get(reverse('index'), params).context['main_jobs'], [second, first])
+
+    def test_versions_are_shared_across_processes(self):
+        """バージョン番号と閲覧可否はプロセス内メモリではなく共有キャッシュ (DB) に置かれること"""
+        posting = self.create_posting()
+        version = SearchCacheService.version()
+        JobCardCacheService.attach_versions([posting])
+        # 別のプロセス = プロセス内メモリのキャッシュを持っていない
+        cache.clear()
+        self.assertEqual(SearchCacheService.version(), version)
+        card_version = posting.card_version
+        self.assertEqual(JobCardCacheService.attach_versions([posting])[0].card_version, card_version)
+
+    def test_version_changes_only_when_index_row_changes(self):
+        """表示・絞り込みに使う値・満員/空き・公開状態が変わったときだけ検索キャッシュのバージョンが変わること"""
+        posting = self.create_posting(recruitment_count=1)
+        version = SearchCacheService.version()
+
+        posting.save()
+        AvailabilityCountService.refresh({('東京都', self.tomorrow)})
+        self.assertEqual(SearchCacheService.version(), version)
+
+        posting.title = 'タイトル変更'
+        posting.save()
+        self.assertNotEqual(SearchCacheService.version(), version)
+
+        version = SearchCacheService.version()
+
+        worker = User.objects.create_user(username='worker')
+        with self.captureOnCommitCallbacks(execute=True):
+            application = JobApplication.objects.create(job_posting=posting, worker=worker, status='確定済み')
+        self.assertNotEqual(SearchCacheService.version(), version)
+
+        version = SearchCacheService.version()
+        with self.captureOnCommitCallbacks(execute=True):
+            application.delete()
+        self.assertNotEqual(SearchCacheService.version(), version)
+
+        version = SearchCacheService.version()
+        posting.is_published = False
+        posting.save()
+        self.assertNotEqual(SearchCacheService.version(), version)
+
+
+class PaymentSortTest(JobSearchTestBase):
+
+    def test_payment_is_stored_with_overnight_and_break(self):
+        """日をまたぐ勤務・休憩を考慮した実働時間と報酬合計が保存されること"""
+        posting = self.create_posting(
+            start_time=time(22, 0), end_time=time(6, 30), break_duration=60, hourly_wage=1500, transportation_fee=300,
+        )
+        posting.refresh_from_db()
+        self.assertEqual((posting.work_minutes, posting.total_payment), (450, 1500 * 450 // 60 + 300))
+        self.assertEqual(JobSearchIndex.objects.get(posting=posting).total_payment, posting.total_payment)
+
+        posting.end_time = time(23, 0)
+        posting.save()
+        self.assertEqual(JobPosting.objects.get(pk=posting.pk).work_minutes, 0)
+
+    def test_page_by_payment(self):
+        low = self.create_posting(hourly_wage=1000)
+        high = self.create_posting(hourly_wage=1500)
+        ties = [self.create_posting(hourly_wage=1200) for _ in range(2)]
+
+        seen, cursor = [], None
+        while True:
+            ids, cursor = JobSearchQuery().page_by_payment(cursor, 3)
+            seen.extend(ids)
+            if not cursor:
+                break
+        self.assertEqual(seen, [high.pk, ties[0].pk, ties[1].pk, low.pk])
+
+        response = self.client.get(reverse('index'), {'date': self.tomorrow.isoformat(), 'sort': 'payment'})
+        self.assertEqual(response.context['main_jobs'][0], high)
+
+
+class JobCardCacheTest(JobSearchTestBase):
+
+    def test_card_fragments_follow_saves_and_heart_is_per_user(self):
+        """カードの断片は保存で描き直され、お気に入りのハートはユーザーごとに描画されること"""
+        from jobs.models import FavoriteJob
+        posting = self.create_posting(title='初期タイトル')
+        worker = User.objects.create_user(username='worker', password='pass')
+        FavoriteJob.objects.create(user=worker, job_posting=posting)
+        params = {'date': self.tomorrow.isoformat()}
+
+        self.assertContains(self.client.get(reverse('index'), params), '初期タイトル')
+        self.client.force_login(worker)
+        response = self.client.get(reverse('index'), params)
+        self.assertContains(response, 'btn-fav-circle active')
+
+        # 断片はキャッシュされ、求人・ひな形の保存で新しいバージョンになる
+        JobPosting.objects.filter(pk=posting.pk).update(title='保存なしの変更')
+        self.assertContains(self.client.get(reverse('index'), params), '初期タイトル')
+        posting.refresh_from_db()
+        posting.title = '変更後タイトル'
+        posting.save()
+        self.assertContains(self.client.get(reverse('index'), params), '変更後タイトル')
+        self.template.has_unexperienced_welcome = True
+        self.template.save()
+        self.assertContains(self.client.get(reverse('index'), params), '未経験歓迎')
+
+
+    def test_countdown_is_rendered_outside_card_fragments(self):
+        """カウントダウンは断片キャッシュに含めず、カードのHTMLも断片ごとに閉じていること"""
+        posting = self.create_posting(title='初期タイトル')
+        params = {'date': self.tomorrow.isoformat()}
+        self.client.get(reverse('index'), params)
+
+        # カウントダウンは応募締切 (deadline_at) まで
+        deadline = timezone.make_aware(datetime.combine(timezone.localdate(), time(23, 30)))
+        JobPosting.objects.filter(pk=posting.pk).update(title='保存なしの変更', deadline_at=deadline)
+        response = self.client.get(reverse('index'), params)
+        self.assertContains(response, '初期タイトル')
+        self.assertContains(response, f'data-deadline="{deadline.isoformat()}"')
+        html = response.content.decode()
+        self.assertEqual(html.count('<div'), html.count('</div>'))
+
+    def test_infinite_scroll_etag_changes_with_card_version(self):
+        """写真の派生画像などでひな形のカードだけが変わった場合も304にならないこと"""
+        self.create_posting()
+        params = {'date': self.tomorrow.isoformat()}
+        response = self.client.get(reverse('index_jobs_api'), params)
+        etag = response['ETag']
+        self.assertEqual(self.client.get(reverse('index_jobs_api'), params, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        version = SearchCacheService.version()
+        JobCardCacheService.bump_templates([self.template.pk])
+        self.assertEqual(SearchCacheService.version(), version)
+        response = self.client.get(reverse('index_jobs_api'), params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+class SearchIndexSyncTest(JobSearchTestBase):
+
+    def test_posting_template_store_changes_are_synced(self):
+        """求人・ひな形・店舗の変更がインデックスに反映されること"""
+        posting = self.create_posting()
+        row = JobSearchIndex.objects.get(posting=posting)
+        self.assertEqual((row.prefecture, row.occupation), ('東京都', '飲食'))
+        self.assertEqual((row.latitude, row.longitude), (35.68, 139.76))
+
+        self.template.occupation = '販売'
+        self.template.latitude, self.template.longitude = 35.0, 139.0
+        self.template.save()
+        with mock.patch('business.signals.requests.get', side_effect=Exception('offline')):
+            self.store.prefecture = '神奈川県'
+            self.store.save()
+        row.refresh_from_db()
+        self.assertEqual((row.prefecture, row.occupation), ('神奈川県', '販売'))
+        self.assertEqual((row.latitude, row.longitude), (35.0, 139.0))
+
+        posting.is_published = False
+        posting.save()
+        self.assertFalse(JobSearchIndex.objects.filter(posting=posting).exists())
+
+    def test_overnight_shift_and_remaining_slots(self):
+        """日をまたぐ勤務の終了日時と、確定人数による残り枠が計算されること"""
+        posting = self.create_posting(start_time=time(22, 0), end_time=time(6, 0), recruitment_count=2)
+        worker = User.objects.create_user(username='worker')
+        with self.captureOnCommitCallbacks(execute=True):
+            application = JobApplication.objects.create(job_posting=posting, worker=worker, status='確定済み')
+        row = JobSearchIndex.objects.get(posting=posting)
+        self.assertEqual(row.end_at - row.start_at, timedelta(hours=8))
+        self.assertEqual(row.remaining_slots, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            application.delete()
+        row.refresh_from_db()
+        self.assertEqual(row.remaining_slots, 2)
+
+    def test_rebuild(self):
+        self.create_posting()
+        self.create_posting(is_published=False)
+        JobSearchIndex.objects.all().delete()
+        self.assertEqual(SearchIndexService.rebuild(), 1)
+
+
+class AvailabilityCountTest(JobSearchTestBase):
+
+    def counts(self):
+        return AvailabilityCountService.date_counts(['東京都'], [self.tomorrow]).get(self.tomorrow, 0)
+
+    def test_counts_follow_publish_fill_and_expire(self):
+        """公開・満員・非公開・開始時刻の経過に合わせて件数が変わること"""
+        posting = self.create_posting()
+        self.create_posting(start_time=time(9, 0))
+        self.assertEqual(self.counts(), 2)
+
+        worker = User.objects.create_user(username='worker')
+        with self.captureOnCommitCallbacks(execute=True):
+            JobApplication.objects.create(job_posting=posting, worker=worker, status='確定済み')
+        self.assertEqual(self.counts(), 1)
+
+        JobPosting.objects.filter(pk=posting.pk).update(recruitment_count=2)
+        posting.refresh_from_db()
+        posting.save()
+        self.assertEqual(self.counts(), 2)
+        posting.is_published = False
+        posting.save()
+        self.assertEqual(self.counts(), 1)
+
+        # 翌日の9:30 には 9:00 開始の求人は募集終了
+        now = timezone.make_aware(datetime.combine(self.tomorrow, time(9, 30)))
+        AvailabilityCountService.expire(now)
+        self.assertEqual(self.counts(), 0)
+
+    def test_expire_drops_future_posting_past_its_deadline(self):
+        """勤務日が先でも応募締切を過ぎた求人は件数から外れ、検索結果と一致すること"""
+        work_date = self.tomorrow + timedelta(days=1)
+        deadline = timezone.now() + timedelta(minutes=1)
+        self.create_posting(work_date=work_date, application_deadline=deadline)
+        self.assertEqual(AvailabilityCountService.date_counts(['東京都'], [work_date]), {work_date: 1})
+
+        now = timezone.now() + timedelta(minutes=5)
+        AvailabilityCountService.expire(now)
+        self.assertEqual(AvailabilityCountService.date_counts(['東京都'], [work_date]), {work_date: 0})
+        self.assertFalse(JobSearchQuery().search(now, work_date=work_date).exists())
+
+    def test_counts_use_same_predicate_as_recruiting_search(self):
+        """件数の数え直しは検索の募集中 (締切前・残り枠あり) と同じ条件で数えること"""
+        work_date = self.tomorrow + timedelta(days=1)
+        self.create_posting(work_date=work_date)
+        self.create_posting(work_date=work_date, application_deadline=timezone.now() - timedelta(minutes=1))
+        AvailabilityCountService.rebuild()
+        self.assertEqual(AvailabilityCountService.date_counts([], [work_date]), {work_date: 1})
+        self.assertEqual(JobSearchQuery(public_only=True).search(work_date=work_date).count(), 1)
+
+    def test_date_strip_and_pref_select_show_counts(self):
+        self.create_posting()
+        response = self.client.get(reverse('index'), {'date': self.tomorrow.isoformat(), 'pref': '東京都'})
+        self.assertEqual(response.context['date_counts'], {self.tomorrow: 1})
+        response = self.client.get(reverse('pref_select'))
+        self.assertEqual(response.context['pref_counts'], {'東京都': 1})
+
+
+class ConfirmedCountTest(JobSearchTestBase):
+
+    def test_counter_follows_application_status(self):
+        """応募の作成・状態変更・削除に合わせて確定人数が増減すること"""
+        posting = self.create_posting(recruitment_count=3)
+        worker1 = User.objects.create_user(username='worker1')
+        worker2 = User.objects.create_user(username='worker2')
+
+        app1 = JobApplication.objects.create(job_posting=posting, worker=worker1)
+        JobApplication.objects.create(job_posting=posting, worker=worker2, status='確定済み')
+        posting.refresh_from_db()
+        self.assertEqual(posting.matched_count, 2)
+
+        app1 = JobApplication.objects.get(pk=app1.pk)
+        app1.status = '辞退'
+        app1.save()
+        app1.save()
+        posting.refresh_from_db()
+        self.assertEqual(posting.confirmed_count, 1)
+
+        JobApplication.objects.filter(worker=worker2).delete()
+        posting.refresh_from_db()
+        self.assertEqual(posting.confirmed_count, 0)
+
+    def test_reconcile_fixes_drifted_counter_and_index(self):
+        """ずれた確定人数を直し、検索インデックスの残り枠も合わせること"""
+        posting = self.create_posting(recruitment_count=2)
+        JobPosting.objects.filter(pk=posting.pk).update(confirmed_count=2)
+        SearchIndexService.sync_posting(posting.pk)
+        self.assertEqual(JobSearchIndex.objects.get(posting=posting).remaining_slots, 0)
+
+        call_command('reconcile_confirmed_counts', stdout=StringIO())
+        self.assertEqual(JobPosting.objects.get(pk=posting.pk).confirmed_count, 0)
+        self.assertEqual(JobSearchIndex.objects.get(posting=posting).remaining_slots, 2)
+
+
+class ScheduleWindowTest(JobSearchTestBase):
+
+    def test_schedule_columns_roll_over_midnight(self):
+        """開始・終了・締切日時が保存時に計算され、日をまたぐ勤務は翌日終了になること"""
+        posting = self.create_posting(start_time=time(22, 0), end_time=time(5, 0))
+        start_at = timezone.make_aware(datetime.combine(self.tomorrow, time(22, 0)))
+        self.assertEqual(posting.start_at, start_at)
+        self.assertEqual(posting.end_at, start_at + timedelta(hours=7))
+        self.assertEqual(posting.deadline_at, start_at)
+        self.assertEqual(JobSearchIndex.objects.get(posting=posting).end_at, posting.end_at)
+
+        # 日付をまたいだ翌朝の時点ではまだ終了していない
+        with mock.patch('business.models.timezone.now', return_value=start_at + timedelta(hours=3)):
+            self.assertTrue(posting.is_expired)
+            self.assertFalse(posting.is_ended)
+
+        deadline = start_at - timedelta(hours=1)
+        posting.application_deadline = deadline
+        posting.save()
+        self.assertEqual(JobSearchIndex.objects.get(posting=posting).deadline_at, deadline)
+        # 締切後は「募集中のみ」の検索から外れる
+        self.assertTrue(JobSearchQuery().search(now=deadline - timedelta(minutes=1)).exists())
+        self.assertFalse(JobSearchQuery().search(now=deadline).exists())
+
+    def test_work_schedule_tabs_split_on_end_at(self):
+        worker = User.objects.create_user(username='worker')
+        upcoming = self.create_posting()
+        ended = self.create_posting(work_date=self.tomorrow - timedelta(days=3))
+        cancelled = self.create_posting()
+        JobApplication.objects.create(job_posting=upcoming, worker=worker, status='確定済み')
+        JobApplication.objects.create(job_posting=ended, worker=worker, status='確定済み')
+        JobApplication.objects.create(job_posting=cancelled, worker=worker, status='キャンセル')
+        self.client.force_login(worker)
+
+        def postings(url, key):
+            grouped = self.client.get(reverse(url)).context[key]
+            return [app.job_posting for _, _, apps in grouped for app in apps]
+
+        self.assertEqual(postings('work_schedule', 'upcoming_grouped'), [upcoming])
+        self.assertEqual(postings('work_completed', 'completed_grouped'), [ended])
+
+    def test_completed_tab_pages_by_month_and_upcoming_is_bounded(self):
+        worker = User.objects.create_user(username='worker')
+        this_month = timezone.localdate().replace(day=1)
+        last_month = (this_month - timedelta(days=1)).replace(day=1)
+        old = self.create_posting(work_date=last_month - timedelta(days=40))
+        recent = self.create_posting(work_date=last_month)
+        for posting in (old, recent):
+            JobApplication.objects.create(job_posting=posting, worker=worker, status='完了')
+        self.client.force_login(worker)
+
+        # 指定がなければ最後に働いた月を表示し、完了した仕事がある前の月へ辿れる
+        response = self.client.get(reverse('work_completed'))
+        self.assertEqual(response.context['month'], last_month)
+        self.assertEqual([app.job_posting for _, _, apps in response.context['completed_grouped'] for app in apps], [recent])
+        self.assertEqual(response.context['prev_month'], old.work_date)
+        self.assertIsNone(response.context['next_month'])
+
+        response = self.client.get(reverse('work_completed'), {'month': old.work_date.strftime('%Y-%m')})
+        self.assertEqual([app.job_posting for _, _, apps in response.context['completed_grouped'] for app in apps], [old])
+        self.assertEqual(response.context['next_month'], recent.work_date)
+
+        with mock.patch('jobs.views.WorkScheduleUpcomingView.MAX_UPCOMING', 2):
+            for _ in range(3):
+                JobApplication.objects.create(job_posting=self.create_posting(), worker=worker, status='確定済み')
+            response = self.client.get(reverse('work_schedule'))
+        self.assertTrue(response.context['has_more_upcoming'])
+        self.assertEqual(sum(len(apps) for _, _, apps in response.context['upcoming_grouped']), 2)
+
+
+class ApplicationServiceTest(JobSearchTestBase):
+
+    def test_apply_reserves_slots_without_overbooking(self):
+        """募集人数を超えて確定せず、確定人数が二重に数えられないこと"""
+        posting = self.create_posting(recruitment_count=1)
+        stale = JobPosting.objects.get(pk=posting.pk)
+        worker1 = User.objects.create_user(username='worker1')
+        worker2 = User.objects.create_user(username='worker2')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            result, application = ApplicationService.apply(posting, worker1)
+        self.assertEqual(result, ApplicationService.APPLIED)
+        self.assertEqual(application.status, '確定済み')
+        self.assertTrue(ChatRoom.objects.filter(store=self.store, worker=worker1).exists())
+        self.assertEqual(JobPosting.objects.get(pk=posting.pk).confirmed_count, 1)
+        self.assertEqual(JobSearchIndex.objects.get(posting=posting).remaining_slots, 0)
+
+        # 読み込み時点では空きがあっても、確保の UPDATE で満員と判定される
+        self.assertFalse(stale.is_full)
+        self.assertFalse(ApplicationService.reserve_slot(stale.pk))
+        self.assertEqual(ApplicationService.apply(stale, worker2), (ApplicationService.FULL, None))
+        self.assertEqual(ApplicationService.apply(posting, worker1), (ApplicationService.ALREADY_APPLIED, application))
+        self.assertEqual(JobPosting.objects.get(pk=posting.pk).confirmed_count, 1)
+
+        # 辞退すると枠が戻る
+        application = JobApplication.objects.get(pk=application.pk)
+        application.status = '辞退'
+        application.save()
+        self.assertEqual(ApplicationService.apply(stale, worker2)[0], ApplicationService.APPLIED)
+        self.assertEqual(JobPosting.objects.get(pk=posting.pk).confirmed_count, 1)
+
+    def test_apply_transaction_does_not_touch_search_index(self):
+        """申し込みのトランザクション中は検索インデックスに触れず、コミット後に残り枠だけ更新すること"""
+        posting = self.create_posting(recruitment_count=2)
+        worker = User.objects.create_user(username='worker')
+        with self.captureOnCommitCallbacks() as callbacks, CaptureQueriesContext(connection) as queries:
+            ApplicationService.apply(posting, worker)
+        self.assertFalse([q['sql'] for q in queries if 'jobs_jobsearch' in q['sql']])
+        self.assertFalse([q['sql'] for q in queries if 'jobs_jobavailabilitycount' in q['sql']])
+
+        # 0 をまたがないので残り枠の UPDATE だけ (募集中件数は数え直さない)
+        with CaptureQueriesContext(connection) as queries:
+            for callback in callbacks:
+                callback()
+        writes = [q['sql'] for q in queries if not q['sql'].startswith('SELECT')]
+        self.assertEqual(len(writes), 1)
+        self.assertIn('remaining_slots', writes[0])
+        self.assertEqual(JobSearchIndex.objects.get(posting=posting).remaining_slots, 1)
+
+    def test_apply_view_reports_full_and_closed(self):
+        full = self.create_posting(recruitment_count=1)
+        closed = self.create_posting(application_deadline=timezone.now() - timedelta(minutes=1))
+        ApplicationService.apply(full, User.objects.create_user(username='worker1'))
+        worker = User.objects.create_user(username='worker2')
+        self.client.force_login(worker)
+
+        response = self.client.post(reverse('apply_step_5_review', args=[full.pk]))
+        self.assertTrue(response.context['is_full'])
+        self.assertContains(response, '定員に達しました')
+        response = self.client.post(reverse('apply_step_5_review', args=[closed.pk]))
+        self.assertTrue(response.context['is_closed'])
+        self.assertFalse(JobApplication.objects.filter(worker=worker).exists())
+
+    def test_apply_rejects_overlapping_shifts(self):
+        """確定済みの勤務と時間が重なる求人には申し込めないこと (日をまたぐ勤務も含む)"""
+        worker = User.objects.create_user(username='worker')
+        night = self.create_posting(start_time=time(22, 0), end_time=time(6, 0))
+        self.assertEqual(ApplicationService.apply(night, worker)[0], ApplicationService.APPLIED)
+
+        next_morning = self.create_posting(work_date=self.tomorrow + timedelta(days=1), start_time=time(5, 0), end_time=time(9, 0))
+        result, conflict = ApplicationService.apply(next_morning, worker)
+        self.assertEqual((result, conflict.job_posting), (ApplicationService.OVERLAP, night))
+        self.assertEqual(JobPosting.objects.get(pk=next_morning.pk).confirmed_count, 0)
+
+        # 終了と同時に始まる勤務・辞退した勤務とは重ならない
+        after = self.create_posting(work_date=self.tomorrow + timedelta(days=1), start_time=time(6, 0), end_time=time(9, 0))
+        self.assertEqual(ApplicationService.apply(after, worker)[0], ApplicationService.APPLIED)
+        JobApplication.objects.filter(job_posting=night).update(status='辞退')
+        self.assertEqual(ApplicationService.apply(next_morning, worker)[0], ApplicationService.OVERLAP)
+        JobApplication.objects.filter(job_posting=after).update(status='辞退')
+        self.assertEqual(ApplicationService.apply(next_morning, worker)[0], ApplicationService.APPLIED)
@@ -4,12 +4,21 @@ from django.views.generic import TemplateView, ListView, DetailView, View, FormV
 from django.utils import timezone
 from datetime import timedelta, datetime, date
 from django.http import JsonResponse
-from django.db.models import Q
+from django.template.loader import render_to_string
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.db.models import Q, Max, Min
 from django.urls import reverse_lazy, reverse
 
 from business.models import JobPosting, JobApplication, Store, AttendanceCorrection, ChatRoom, StoreReview
+from business.checkin import verify_token as verify_checkin_token
 from .models import FavoriteJob, FavoriteStore
 from .constants import PREFECTURES, OCCUPATIONS, REWARDS
+from .services import (
+    JobSearchQuery, AvailabilityCountService, SearchCacheService, JobCardCacheService, ApplicationService,
+    MAP_CLUSTER_MAX_ZOOM, MAP_MIN_ZOOM, MAP_MAX_ZOOM, approximate_location, pin_offset,
+)
 from accounts.models import Badge
 # 循環参照回避のため、メソッド内でインポートするか、必要なモデルだけトップレベルで
 # from accounts.models import WorkerProfile, Badge, WorkerBadge は必要に応じて
@@ -18,8 +27,25 @@ from .forms import PrefectureForm, StoreReviewStep1Form, StoreReviewStep2Form
 
 # --- メイン：さがす画面 ---
 import json
+import hashlib
 from django.core.serializers.json import DjangoJSONEncoder
 
+
+def conditional_json_response(request, etag, updated_at, build):
+    """
+    ETag / Last-Modified が一致すれば304、しなければ build() の内容をJSONで返す。
+    updated_at は求人全体のバージョンの更新日時 (SearchCacheService.version)。
+    """
+    response = get_conditional_response(request, etag=etag, last_modified=int(updated_at.timestamp()))
+    if response is None:
+        response = JsonResponse(build(), encoder=DjangoJSONEncoder)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(updated_at.timestamp())
+    # ワーカーごとに結果が違いうるので共有キャッシュには置かず、毎回再検証させる
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
 class MapSearchView(TemplateView):
     template_name = 'Searchjobs/map_search.html'
 
@@ -33,35 +59,28 @@ class MapSearchView(TemplateView):
             target_prefs = ['東京都', '神奈川県', '千葉県']
         
         # 有効な求人で、かつ緯度経度があるもの (テンプレートまたは店舗)
-        jobs = JobPosting.objects.filter(
-            Q(template__latitude__isnull=False) | Q(template__store__latitude__isnull=False),
-            template__store__prefecture__in=target_prefs,
-            visibility='public'
-        ).select_related('template__store')
+        # 公開範囲はログイン中のワーカーが閲覧できるもの (一般公開 + 対象の限定公開)
+        search_query = JobSearchQuery.from_request(
+            self.request, prefectures=target_prefs, require_location=True
+        )
+        rows = search_query.search().values(
+            'posting_id', 'posting__title', 'store__store_name', 'latitude', 'longitude',
+            'hourly_wage', 'work_date', 'start_at', 'end_at',
+        )
         
-        # マップ表示用データ作成
+        # マップ表示用データ作成 (緯度経度はテンプレート優先、なければ店舗でインデックス済み)
         map_data = []
-        for job in jobs:
-            store = job.template.store
-            # 緯度経度: テンプレート優先、なければ店舗
-            lat = job.template.latitude if job.template.latitude else store.latitude
-            lng = job.template.longitude if job.template.longitude else store.longitude
-
-            # 座標がない場合はスキップ (フィルタで弾いているはずだが念のため)
-            if lat is None or lng is None:
-                continue
-
+        for row in rows:
             map_data.append({
-                'id': job.id,
-                'title': job.title,
-                'store_name': store.store_name,
-                'lat': lat,
-                'lng': lng,
-                'url': reverse('job_detail', kwargs={'pk': job.id}),
-                'url': reverse('job_detail', kwargs={'pk': job.id}),
-                'salary': f"{job.get_reward_mode_display()}: {job.reward_amount}円",
-                'work_date': job.work_date.strftime('%m/%d') if job.work_date else '',
-                'time': f"{job.start_time.strftime('%H:%M')}~{job.end_time.strftime('%H:%M')}"
+                'id': row['posting_id'],
+                'title': row['posting__title'],
+                'store_name': row['store__store_name'],
+                'lat': row['latitude'],
+                'lng': row['longitude'],
+                'url': reverse('job_detail', kwargs={'pk': row['posting_id']}),
+                'salary': f"時給: {row['hourly_wage']}円",
+                'work_date': row['work_date'].strftime('%m/%d'),
+                'time': f"{timezone.localtime(row['start_at']).strftime('%H:%M')}~{timezone.localtime(row['end_at']).strftime('%H:%M')}"
             })
             
         context['map_data_json'] = json.dumps(map_data, cls=DjangoJSONEncoder)
@@ -71,6 +90,10 @@ class IndexView(ListView):
     model = JobPosting
     template_name = 'Searchjobs/index.html'
     context_object_name = 'main_jobs'
+    page_size = 20
+    cursor = None
+    cache_key = None
+    updated_at = None
 
     def get_queryset(self):
         self.today = timezone.localdate()
@@ -99,135 +122,148 @@ class IndexView(ListView):
                 flat_prefs.append(p)
         self.selected_prefs = flat_prefs
 
-        queryset = JobPosting.objects.filter(is_published=True, work_date=self.selected_date).prefetch_related('template__photos')
-        
-        if self.selected_prefs:
-            queryset = queryset.filter(template__store__prefecture__in=self.selected_prefs)
+        # 絞り込み画面の件数 (FacetCountsView) を一覧と同じ日付・都道府県で数えるため、表示中の条件を覚えておく
+        search_scope = {'date': self.selected_date.isoformat(), 'pref': self.selected_prefs}
+        if self.request.session.get('search_scope') != search_scope:
+            self.request.session['search_scope'] = search_scope
+
+        # キーワード検索: 他の絞り込み条件と同様にセッションに保持する (空文字で解除)
+        if 'q' in self.request.GET:
+            filters = self.request.session.get('job_filters', {})
+            filters['keyword'] = self.request.GET['q'].strip()
+            self.request.session['job_filters'] = filters
+
+        # セッションの絞り込み条件を共通の検索クエリで適用 (JobSearchIndex を検索)
+        self.search_query = JobSearchQuery.from_request(self.request, prefectures=self.selected_prefs)
 
-        # セッションから絞り込み条件を取得して適用
-        session_filters = self.request.session.get('job_filters', {})
-        
-        # 職種
-        occupations = session_filters.get('occupations', [])
-        if occupations:
-            queryset = queryset.filter(template__occupation__in=occupations)
-
-        # 報酬
-        rewards = session_filters.get('rewards', [])
-        if rewards:
-            min_wage = 0
-            for r in rewards:
-                import re
-                match = re.search(r'(\d{1,3}(,\d{3})*)', r)
-                if match:
-                    val = int(match.group(1).replace(',', ''))
-                    if min_wage == 0 or val < min_wage:
-                        min_wage = val
-            if min_wage > 0:
-                queryset = queryset.filter(hourly_wage__gte=min_wage)
-
-        # 待遇
-        treatments = session_filters.get('treatments', [])
-        if treatments:
-            treatment_map = {
-                "未経験者歓迎": "has_unexperienced_welcome",
-                "バイク/車通勤可": "has_bike_car_commute",
-                "服装自由": "has_clothing_free",
-                "クーポンGET": "has_coupon_get",
-                "まかないあり": "has_meal",
-                "髪型/カラー自由": "has_hair_color_free",
-                "交通費支給": "has_transportation_allowance"
-            }
-            for t in treatments:
-                field_name = treatment_map.get(t)
-                if field_name:
-                    queryset = queryset.filter(**{f"template__{field_name}": True})
-
-        # 時間帯
-        time_ranges = session_filters.get('time_ranges', [])
-        if time_ranges:
-            time_q = Q()
-            for tr in time_ranges:
-                if tr == "朝 (4:00〜10:00)":
-                    time_q |= Q(start_time__gte="04:00", start_time__lt="10:00")
-                elif tr == "昼 (10:00〜16:00)":
-                    time_q |= Q(start_time__gte="10:00", start_time__lt="16:00")
-                elif tr == "夕方 (16:00〜22:00)":
-                    time_q |= Q(start_time__gte="16:00", start_time__lt="22:00")
-                elif tr == "深夜 (22:00〜4:00)":
-                    time_q |= Q(start_time__gte="22:00") | Q(start_time__lt="04:00")
-            queryset = queryset.filter(time_q)
-
-        # 除外キーワード
-        exclude_keyword = session_filters.get('exclude_keyword', '')
-        if exclude_keyword:
-            keywords = exclude_keyword.replace('　', ' ').split()
-            for k in keywords:
-                if k:
-                    queryset = queryset.exclude(title__icontains=k).exclude(template__work_content__icontains=k)
-        
-        # 募集中の仕事のみ (デフォルトTrue)
-        only_recruiting = session_filters.get('only_recruiting', True)
-        if only_recruiting:
-            # 1. 開始時間を過ぎていないもの (is_expired == False 相当)
-            now = timezone.localtime(timezone.now())
-            # selected_date が過去の場合は空にする
-            if self.selected_date < self.today:
-                queryset = queryset.none()
-            # selected_date が今日の場合のみ、開始時間での比較が必要
-            elif self.selected_date == self.today:
-                queryset = queryset.filter(start_time__gt=now.time())
-            
-            # 2. 募集人数に達していないもの
-            # JobPostingに matched_count property はあるが、DBクエリで直接扱うためにアノテーション等が必要
-            # 今回は簡易的に、応募数との比較を行う (status='確定済み' のものをカウント)
-            from django.db.models import Count, F
-            queryset = queryset.annotate(
-                confirmed_count=Count('applications', filter=Q(applications__status='確定済み'))
-            ).filter(confirmed_count__lt=F('recruitment_count'))
-
-        # 登録した資格が必要な仕事のみ
-        qualification_only = session_filters.get('qualification_only', False)
-        if qualification_only:
-            queryset = queryset.filter(template__requires_qualification=True)
-            
         # ソート処理
-        sort_type = self.request.GET.get('sort', 'deadline') # デフォルトは「締切時刻が近い順」
-        
-        if sort_type == 'deadline':
-            # 締切時刻が近い順 (勤務日 -> 開始時間)
-            queryset = queryset.order_by('work_date', 'start_time')
-        elif sort_type == 'current_location':
-            # 現在地から近い順: 
-            # サーバーサイドで正確にやるにはユーザーの現在地(lat/lng)をクエリパラメータで受け取る必要がある
-            # ここでは簡易的に「保存されている緯度経度がある場合」の距離ソート、あるいはJS側での実装が必要だが
-            # データベース参照とのことなので、一旦何もしないか、あるいはユーザー登録住所からの距離など仮実装
-            # ※ユーザー要望では「データベースを参照して並び替え」
-            pass 
-        elif sort_type == 'specified_location':
-             # 指定した場所から近い順
+        sort_type = self.get_sort_type() # デフォルトは「締切時刻が近い順」 (キーワード検索時は関連度順)
+        self.origin = None
+        
+        if sort_type in ('current_location', 'specified_location'):
+            # 現在地 / 指定した場所から近い順:
+            # 緯度経度 (lat/lng) をクエリパラメータで受け取り、なければユーザーの登録住所を基準にする
+            self.origin = self.get_origin()
+
+        # 同じ条件・同じ閲覧可否のワーカー同士で1ページ分の結果 (求人IDと距離) を共有する
+        self.cache_key, self.updated_at = SearchCacheService.key(
+            'index', self.search_query.cache_signature, sort_type, self.origin,
+            self.selected_date, self.cursor, self.page_size,
+        )
+        posting_ids, distances, self.next_cursor = SearchCacheService.get_or_set(
+            self.cache_key, lambda: self.get_page(sort_type)
+        )
+
+        postings = JobPosting.objects.select_related('template__store', 'template__cover_photo').in_bulk(posting_ids)
+        jobs = [postings[pk] for pk in posting_ids if pk in postings]
+        for job in jobs:
+            job.distance_km = distances.get(job.pk)
+        # 求人カードの断片キャッシュのキー
+        return JobCardCacheService.attach_versions(jobs)
+
+    def get_page(self, sort_type):
+        """1ページ分の (求人IDのリスト, {求人ID: 距離}, 次ページのカーソル)"""
+        if sort_type == 'relevance' and self.search_query.keywords:
+            # キーワードとの関連度 -> ID のキーセットページング
+            posting_ids, next_cursor = self.search_query.page_by_relevance(
+                self.cursor, self.page_size, work_date=self.selected_date
+            )
+            distances = {}
+        elif sort_type == 'payment':
+            # 報酬合計が高い順 -> ID のキーセットページング
+            posting_ids, next_cursor = self.search_query.page_by_payment(
+                self.cursor, self.page_size, work_date=self.selected_date
+            )
+            distances = {}
+        elif self.origin:
+            # 距離 -> ID のキーセットページング
+            rows, next_cursor = self.search_query.page_by_distance(
+                self.origin, self.cursor, self.page_size, work_date=self.selected_date
+            )
+            posting_ids = [pk for pk, _ in rows]
+            distances = dict(rows)
+        else:
+            # 締切時刻が近い順 (勤務日 -> 開始時間 -> ID) のキーセットページングで1ページ分だけ取得
+            posting_ids, next_cursor = self.search_query.page(
+                self.cursor, self.page_size, work_date=self.selected_date
+            )
+            distances = {}
+        return posting_ids, distances, next_cursor
+
+    def get_sort_type(self):
+        default = 'relevance' if self.search_query.keywords else 'deadline'
+        return self.request.GET.get('sort', default)
+
+    def get_origin(self):
+        """距離順の基準地点 (緯度, 経度)。GETパラメータ、なければ登録住所から求める"""
+        try:
+            lat = float(self.request.GET['lat'])
+            lng = float(self.request.GET['lng'])
+            if -90 <= lat <= 90 and -180 <= lng <= 180:
+                return lat, lng
+        except (KeyError, ValueError):
             pass
-            
-        return queryset
+
+        if self.request.user.is_authenticated and hasattr(self.request.user, 'workerprofile'):
+            profile = self.request.user.workerprofile
+            return approximate_location(profile.prefecture, profile.city)
+        return None
+
+    def get_user_fav_job_ids(self, jobs):
+        """表示中の求人のうち、お気に入り登録済みのIDを返す"""
+        if not self.request.user.is_authenticated:
+            return set()
+        return set(FavoriteJob.objects.filter(
+            user=self.request.user, job_posting_id__in=[job.pk for job in jobs]
+        ).values_list('job_posting_id', flat=True))
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        
-        # お気に入り状況取得
-        user_fav_job_ids = []
-        if self.request.user.is_authenticated:
-            user_fav_job_ids = FavoriteJob.objects.filter(user=self.request.user).values_list('job_posting_id', flat=True)
 
+        date_list = [self.today + timedelta(days=i) for i in range(14)]
         context.update({
-            'date_list': [self.today + timedelta(days=i) for i in range(14)],
+            'date_list': date_list,
+            'date_counts': AvailabilityCountService.date_counts(self.selected_prefs, date_list),
             'selected_date': self.selected_date,
             'selected_prefs': self.selected_prefs,
             'today': self.today,
-            'user_fav_job_ids': set(user_fav_job_ids),
-            'current_sort': self.request.GET.get('sort', 'deadline'), # 現在のソート順
+            'user_fav_job_ids': self.get_user_fav_job_ids(self.object_list),
+            'current_sort': self.get_sort_type(), # 現在のソート順
+            'keyword': self.request.session.get('job_filters', {}).get('keyword', ''),
+            'next_cursor': self.next_cursor,
         })
         return context
 
+
+class IndexJobsApiView(IndexView):
+    """さがす画面の無限スクロール用API (カーソル以降の求人カードHTMLと次のカーソルを返す)"""
+
+    def get(self, request, *args, **kwargs):
+        self.cursor = request.GET.get('cursor')
+        try:
+            jobs = self.get_queryset()
+        except ValueError:
+            return JsonResponse({'status': 'error', 'message': '不正なカーソルです'}, status=400)
+
+        # 検索結果 (求人IDとカーソル)・カードの中身 (card_version)・お気に入り状態が同じなら304を返す
+        user_fav_job_ids = self.get_user_fav_job_ids(jobs)
+        etag = '"%s"' % hashlib.md5(repr((
+            self.cache_key, [(job.pk, job.card_version) for job in jobs], sorted(user_fav_job_ids),
+        )).encode()).hexdigest()
+        # 写真・ひな形だけが変わった場合も If-Modified-Since で古いカードを返さないようにする
+        updated_at = max([self.updated_at] + [JobCardCacheService.version_datetime(job.card_version) for job in jobs])
+
+        def build():
+            html = render_to_string('Searchjobs/components/job_cards.html', {
+                'main_jobs': jobs,
+                'selected_date': self.selected_date,
+                'selected_prefs': self.selected_prefs,
+                'user_fav_job_ids': user_fav_job_ids,
+            }, request=request)
+            return {'status': 'success', 'html': html, 'next_cursor': self.next_cursor}
+
+        return conditional_json_response(request, etag, updated_at, build)
+
 # --- 場所フロー ---
 class LocationHomeView(TemplateView):
     template_name = 'Searchjobs/location_home.html'
@@ -246,6 +282,10 @@ class LocationHomeView(TemplateView):
             selected_prefs = params
             
         context['selected_prefs'] = selected_prefs
+        # 今日から14日間の募集中の求人数
+        today = timezone.localdate()
+        pref_counts = AvailabilityCountService.prefecture_counts([today + timedelta(days=i) for i in range(14)])
+        context['open_count'] = sum(pref_counts.get(p, 0) for p in selected_prefs) if selected_prefs else sum(pref_counts.values())
         return context
 
 class PrefSelectView(FormView):
@@ -265,6 +305,9 @@ class PrefSelectView(FormView):
         # テンプレート側でループしやすいようにリストも渡す（フォームフィールドのchoicesでもよいが、既存テンプレのデザインに合わせるならリストが必要かも）
         # 既存テンプレートが `prefectures_list` を使っている場合に合わせておく
         context['prefectures_list'] = PREFECTURES
+        # 都道府県ごとの募集中の求人数 (今日から14日間)
+        today = timezone.localdate()
+        context['pref_counts'] = AvailabilityCountService.prefecture_counts([today + timedelta(days=i) for i in range(14)])
         # 既存テンプレートが `selected_prefs` を使っている
         form = context['form']
         context['selected_prefs'] = form['pref'].value() if form['pref'].value() else []
@@ -285,14 +328,37 @@ class MapView(TemplateView):
     template_name = 'Searchjobs/map_view.html'
 
     def get(self, request, *args, **kwargs):
-        context = self.get_context_data(**kwargs)
         if request.GET.get('ajax') == '1':
-            return JsonResponse({
-                'jobs_data': context['jobs_data'],
-                'date_list': [d.strftime('%Y-%m-%d') for d in context['date_list']],
-                'today_str': context['today_str']
-            }, encoder=DjangoJSONEncoder)
-        return self.render_to_response(context)
+            # 同じ範囲・条件・閲覧可否の応答は求人のバージョンが変わるまで使い回す
+            cache_key, updated_at = SearchCacheService.key(*self.get_cache_parts())
+            etag = '"%s"' % cache_key.split(':', 1)[1]
+            return conditional_json_response(
+                request, etag, updated_at,
+                lambda: SearchCacheService.get_or_set(cache_key, lambda: self.get_ajax_data(**kwargs)),
+            )
+        # マップは14日間・表示範囲で探すので、絞り込み画面の件数は既定の条件 (14日間・希望都道府県) で数える
+        request.session.pop('search_scope', None)
+        return self.render_to_response(self.get_context_data(**kwargs))
+
+    def get_cache_parts(self):
+        """ajax応答が同じになる条件 (GETパラメータ・登録済みの希望都道府県・絞り込み条件・閲覧可否・日付)"""
+        saved_prefs = ''
+        if self.request.user.is_authenticated and hasattr(self.request.user, 'workerprofile'):
+            saved_prefs = self.request.user.workerprofile.target_prefectures or ''
+        return (
+            'map', sorted(self.request.GET.lists()), saved_prefs,
+            JobSearchQuery.from_request(self.request).cache_signature, timezone.localdate(),
+        )
+
+    def get_ajax_data(self, **kwargs):
+        context = self.get_context_data(**kwargs)
+        return {
+            'mode': 'cluster' if context['clusters'] is not None else 'jobs',
+            'jobs_data': context['jobs_data'],
+            'clusters': context['clusters'] or [],
+            'date_list': [d.strftime('%Y-%m-%d') for d in context['date_list']],
+            'today_str': context['today_str']
+        }
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -315,149 +381,66 @@ class MapView(TemplateView):
         if not target_prefs:
             target_prefs = ['東京都', '神奈川県', '千葉県', '埼玉県', '群馬県', '栃木県', '茨城県', '長野県', '山梨県', '静岡県', 'Tokyo', 'Kanagawa', 'Chiba', 'Saitama']
 
-        base_qs = JobPosting.objects.filter(
-            visibility='public',
-            is_published=True
-        ).select_related('template', 'template__store')
-
+        # セッションの絞り込み条件を共通の検索クエリで適用 (IndexViewと同じ条件)
         # 範囲指定があれば優先、なければ都道府県
+        bbox = None
         if south and north and west and east:
             try:
-                base_qs = base_qs.filter(
-                    Q(template__latitude__gte=south, template__latitude__lte=north, template__longitude__gte=west, template__longitude__lte=east) |
-                    Q(template__store__latitude__gte=south, template__store__latitude__lte=north, template__store__longitude__gte=west, template__store__longitude__lte=east)
-                )
+                bbox = (float(south), float(north), float(west), float(east))
             except (ValueError, TypeError):
-                base_qs = base_qs.filter(template__store__prefecture__in=target_prefs)
-        else:
-            base_qs = base_qs.filter(template__store__prefecture__in=target_prefs)
+                bbox = None
 
-        base_qs = base_qs.filter(
-            Q(template__latitude__isnull=False) | Q(template__store__latitude__isnull=False)
+        search_query = JobSearchQuery.from_request(
+            self.request, prefectures=[] if bbox else target_prefs, require_location=True
         )
+        date_filters = dict(work_date__gte=date_list[0], work_date__lte=date_list[-1])
 
-        # セッションから絞り込み条件を取得して適用 (IndexViewと同様のロジック)
-        session_filters = self.request.session.get('job_filters', {})
-        
-        # 職種
-        occupations = session_filters.get('occupations', [])
-        if occupations:
-            base_qs = base_qs.filter(template__occupation__in=occupations)
-
-        # 報酬
-        rewards = session_filters.get('rewards', [])
-        if rewards:
-            min_wage = 0
-            for r in rewards:
-                import re
-                match = re.search(r'(\d{1,3}(,\d{3})*)', r)
-                if match:
-                    val = int(match.group(1).replace(',', ''))
-                    if min_wage == 0 or val < min_wage:
-                        min_wage = val
-            if min_wage > 0:
-                base_qs = base_qs.filter(hourly_wage__gte=min_wage)
-
-        # 待遇
-        treatments = session_filters.get('treatments', [])
-        if treatments:
-            treatment_map = {
-                "未経験者歓迎": "has_unexperienced_welcome",
-                "バイク/車通勤可": "has_bike_car_commute",
-                "服装自由": "has_clothing_free",
-                "クーポンGET": "has_coupon_get",
-                "まかないあり": "has_meal",
-                "髪型/カラー自由": "has_hair_color_free",
-                "交通費支給": "has_transportation_allowance"
-            }
-            for t in treatments:
-                field_name = treatment_map.get(t)
-                if field_name:
-                    base_qs = base_qs.filter(**{f"template__{field_name}": True})
-
-        # 時間帯
-        time_ranges = session_filters.get('time_ranges', [])
-        if time_ranges:
-            time_q = Q()
-            for tr in time_ranges:
-                if tr == "朝 (4:00〜10:00)":
-                    time_q |= Q(start_time__gte="04:00", start_time__lt="10:00")
-                elif tr == "昼 (10:00〜16:00)":
-                    time_q |= Q(start_time__gte="10:00", start_time__lt="16:00")
-                elif tr == "夕方 (16:00〜22:00)":
-                    time_q |= Q(start_time__gte="16:00", start_time__lt="22:00")
-                elif tr == "深夜 (22:00〜4:00)":
-                    time_q |= Q(start_time__gte="22:00") | Q(start_time__lt="04:00")
-            base_qs = base_qs.filter(time_q)
-
-        # 除外キーワード
-        exclude_keyword = session_filters.get('exclude_keyword', '')
-        if exclude_keyword:
-            keywords = exclude_keyword.replace('　', ' ').split()
-            for k in keywords:
-                if k:
-                    base_qs = base_qs.exclude(title__icontains=k).exclude(template__work_content__icontains=k)
-
-        # 募集中の仕事のみ (デフォルトTrue)
-        # GETパラメータがあれば優先、なければセッション、それでもなければTrue
-        only_recruiting_param = self.request.GET.get('only_recruiting')
-        if only_recruiting_param is not None:
-            only_recruiting = only_recruiting_param == '1'
-        else:
-            only_recruiting = session_filters.get('job_filters', {}).get('only_recruiting', True)
+        # 縮尺が小さい (広域表示) 場合は個別のピンではなくグリッド単位の集計を返す
+        # ズームは 0〜22 に収め、数値でなければ指定なし (個別のピン) として扱う
+        try:
+            zoom = min(max(int(float(self.request.GET.get('zoom', ''))), MAP_MIN_ZOOM), MAP_MAX_ZOOM)
+        except (ValueError, OverflowError):
+            zoom = None
+        if bbox and zoom is not None and zoom < MAP_CLUSTER_MAX_ZOOM:
+            context['clusters'] = [
+                dict(cluster, work_date=cluster['work_date'].strftime('%Y-%m-%d'))
+                for cluster in search_query.clusters(zoom, bbox=bbox, **date_filters)
+            ]
+            context['jobs_data'] = []
+            context['date_list'] = date_list
+            context['today_str'] = today.strftime('%Y-%m-%d')
+            return context
+
+        # 日付ごとに最大50件ずつ (求人IDから決まる固定の順番で) 1クエリで取得する
+        day_qs = search_query.sample_per_day(50, bbox=bbox, **date_filters)
 
-        if only_recruiting:
-            from django.db.models import Count, F
-            base_qs = base_qs.annotate(
-                confirmed_count=Count('applications', filter=Q(applications__status='確定済み'))
-            ).filter(confirmed_count__lt=F('recruitment_count'))
-
-        # 登録した資格が必要な仕事のみ
-        qualification_only = session_filters.get('qualification_only', False)
-        if qualification_only:
-            base_qs = base_qs.filter(template__requires_qualification=True)
-        
-        # 日付ごとに最大50件ずつ取得してマージする
         jobs_data = []
-        now = timezone.localtime(timezone.now())
-        for d in date_list:
-            day_qs = base_qs.filter(work_date=d)
-            if only_recruiting:
-                if d == now.date():
-                    day_qs = day_qs.exclude(start_time__lte=now.time())
-            
-            day_qs = day_qs.order_by('?')[:50]
-            
-            for job in day_qs:
-                start_dt = datetime.combine(job.work_date, job.start_time)
-                is_expired = timezone.make_aware(start_dt) < timezone.now()
-                
-                # 緯度経度: テンプレート優先
-                lat = float(job.template.latitude) if job.template.latitude else float(job.template.store.latitude)
-                lng = float(job.template.longitude) if job.template.longitude else float(job.template.store.longitude)
-
-                # ピンの重なり防止
-                import random
-                random.seed(job.id)
-                lat += random.uniform(-0.0012, 0.0012)
-                lng += random.uniform(-0.0012, 0.0012)
-
-                jobs_data.append({
-                    'id': job.id,
-                    'title': job.title,
-                    'work_date': job.work_date.strftime('%Y-%m-%d'),
-                    'start_time': job.start_time.strftime('%H:%M'),
-                    'end_time': job.end_time.strftime('%H:%M'),
-                    'lat': lat,
-                    'lng': lng,
-                    'store_name': job.template.store.store_name,
-                    'hourly_wage': int(job.hourly_wage),
-                    'is_expired': bool(is_expired),
-                    'recruitment_count': int(job.recruitment_count),
-                })
-            
+        now = timezone.now()
+        for row in day_qs.values(
+            'posting_id', 'posting__title', 'work_date', 'start_at', 'end_at', 'deadline_at',
+            'latitude', 'longitude', 'store__store_name', 'hourly_wage', 'recruitment_count',
+        ):
+            # ピンの重なり防止 (求人IDごとに固定のずらし量)
+            lat_offset, lng_offset = pin_offset(row['posting_id'])
+
+            jobs_data.append({
+                'id': row['posting_id'],
+                'title': row['posting__title'],
+                'work_date': row['work_date'].strftime('%Y-%m-%d'),
+                'start_time': timezone.localtime(row['start_at']).strftime('%H:%M'),
+                'end_time': timezone.localtime(row['end_at']).strftime('%H:%M'),
+                'lat': row['latitude'] + lat_offset,
+                'lng': row['longitude'] + lng_offset,
+                'store_name': row['store__store_name'],
+                'hourly_wage': int(row['hourly_wage']),
+                'is_expired': row['deadline_at'] is not None and row['deadline_at'] < now,
+                'recruitment_count': int(row['recruitment_count']),
+            })
+
         context['jobs_data'] = jobs_data
+        context['clusters'] = None
         context['date_list'] = date_list
+        context['date_counts'] = AvailabilityCountService.date_counts(target_prefs, date_list)
         context['today_str'] = today.strftime('%Y-%m-%d')
         return context
 
@@ -538,6 +521,31 @@ class TreatmentSelectView(TemplateView):
         request.session['job_filters'] = filters
         return redirect('refine_home')
 
+class FacetCountsView(View):
+    """
+    絞り込み画面用の選択肢ごとの件数 (JSON)。
+    date / pref がなければ、今日から14日間・ユーザーの希望都道府県を対象にする。
+    同じ条件の結果は短時間キャッシュする。
+    """
+    cache_seconds = 60
+
+    def get(self, request, *args, **kwargs):
+        today = timezone.localdate()
+        try:
+            selected_date = datetime.strptime(request.GET.get('date', ''), '%Y-%m-%d').date()
+            filters = {'work_date': selected_date}
+        except ValueError:
+            filters = {'work_date__gte': today, 'work_date__lte': today + timedelta(days=13)}
+
+        prefs = [p for value in request.GET.getlist('pref') for p in value.split(',') if p]
+        if not prefs and request.user.is_authenticated and hasattr(request.user, 'workerprofile'):
+            prefs = [p for p in (request.user.workerprofile.target_prefectures or '').split(',') if p]
+
+        search_query = JobSearchQuery.from_request(request, prefectures=prefs)
+        cache_key, _ = SearchCacheService.key('facets', search_query.cache_signature, sorted(filters.items()))
+        facets = cache.get_or_set(cache_key, lambda: search_query.facets(**filters), self.cache_seconds)
+        return JsonResponse(facets)
+
 class KeywordExcludeView(TemplateView):
     template_name = 'Searchjobs/keyword_exclude.html'
     
@@ -617,6 +625,7 @@ class JobDetailView(DetailView):
         context['is_applied'] = is_applied
         context['is_favorited'] = is_favorited
         context['is_closed'] = job.is_expired
+        context['is_full'] = job.is_full
         
         # 遷移元情報を取得
         context['from_view'] = self.request.GET.get('from', 'index')
@@ -631,29 +640,29 @@ class FavoriteJobsView(LoginRequiredMixin, TemplateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         # 1. 個別にお気に入りした求人
-        favorite_jobs = FavoriteJob.objects.filter(user=self.request.user).select_related('job_posting', 'job_posting__template__store').order_by('-created_at')
+        favorite_jobs = FavoriteJob.objects.filter(user=self.request.user).select_related('job_posting', 'job_posting__template__store', 'job_posting__template__cover_photo').order_by('-created_at')
         
         # 2. お気に入り店舗の求人
         favorite_store_ids = FavoriteStore.objects.filter(user=self.request.user).values_list('store_id', flat=True)
         store_jobs = JobPosting.objects.filter(
             template__store_id__in=favorite_store_ids,
-            work_date__gte=timezone.now().date(),
+            end_at__gt=timezone.now(),
             is_published=True,
             visibility='public'
-        ).select_related('template__store')
+        ).select_related('template__store', 'template__cover_photo')
 
         # 募集中の仕事のみ表示する場合のフィルタ
         only_recruiting = self.request.GET.get('only_recruiting') == '1'
         if only_recruiting:
-            from django.db.models import Count, F, Q
-            store_jobs = store_jobs.annotate(
-                confirmed_count=Count('applications', filter=Q(applications__status='確定済み'))
-            ).filter(confirmed_count__lt=F('recruitment_count'))
+            from django.db.models import F
+            now = timezone.now()
+            store_jobs = store_jobs.filter(confirmed_count__lt=F('recruitment_count'), deadline_at__gt=now)
 
             # 個別お気に入りの方もフィルタリングが必要
-            favorite_jobs = favorite_jobs.annotate(
-                confirmed_count=Count('job_posting__applications', filter=Q(job_posting__applications__status='確定済み'))
-            ).filter(confirmed_count__lt=F('job_posting__recruitment_count'))
+            favorite_jobs = favorite_jobs.filter(
+                job_posting__confirmed_count__lt=F('job_posting__recruitment_count'),
+                job_posting__deadline_at__gt=now,
+            )
 
         # 既に個別にお気に入りされている求人のIDを取得して重複を避ける
         explicit_fav_job_ids = set(favorite_jobs.values_list('job_posting_id', flat=True))
@@ -671,6 +680,7 @@ class FavoriteJobsView(LoginRequiredMixin, TemplateView):
                         self.is_from_store_fav = True
                 combined_jobs.append(JobWrapper(job))
 
+        JobCardCacheService.attach_versions([fav.job_posting for fav in combined_jobs])
         context['favorite_jobs'] = combined_jobs
         context['tab'] = 'jobs'
         return context
@@ -698,10 +708,10 @@ class StoreProfileView(LoginRequiredMixin, DetailView):
         store = self.object
         
         # この店舗の求人一覧（期限切れでないもの）
-        context['job_postings'] = JobPosting.objects.filter(
+        context['job_postings'] = JobCardCacheService.attach_versions(list(JobPosting.objects.filter(
             template__store=store,
-            work_date__gte=timezone.now().date()
-        ).order_by('work_date', 'start_time')
+            deadline_at__gt=timezone.now()
+        ).select_related('template__cover_photo').order_by('start_at')))
         
         # お気に入り済みかどうか
         context['is_favorited'] = FavoriteStore.objects.filter(user=self.request.user, store=store).exists()
@@ -778,50 +788,70 @@ class WorkScheduleBaseView(LoginRequiredMixin, TemplateView):
 
 class WorkScheduleUpcomingView(WorkScheduleBaseView):
     template_name = 'Work/work_upcoming.html'
+    # 今後の予定の最大表示件数
+    MAX_UPCOMING = 50
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        now = timezone.now()
-        # ユーザーの応募済み求人を全て取得（勤務日の昇順）
-        applications = JobApplication.objects.filter(worker=self.request.user).select_related('job_posting', 'job_posting__template__store').order_by('job_posting__work_date', 'job_posting__start_time')
-        
-        upcoming = []
-        for app in applications:
-            job_end = timezone.make_aware(datetime.combine(app.job_posting.work_date, app.job_posting.end_time))
-            # キャンセルや辞退は表示しない
-            if app.status in ['辞退', 'キャンセル']:
-                continue
-            
-            if not (app.status == '完了' or job_end < now or app.leaving_at):
-                upcoming.append(app)
+        # 終了前・未チェックアウトの応募（開始日時の昇順）。キャンセルや辞退は表示しない
+        upcoming = list(JobApplication.objects.filter(
+            worker=self.request.user,
+            job_posting__end_at__gte=timezone.now(),
+            leaving_at__isnull=True,
+        ).exclude(
+            status__in=['辞退', 'キャンセル', '完了']
+        ).select_related(
+            'job_posting',
+            'job_posting__template__store',
+            'job_posting__template__cover_photo'
+        ).order_by('job_posting__start_at')[:self.MAX_UPCOMING + 1])
 
-        context['upcoming_grouped'] = self.group_by_date(upcoming)
+        context['has_more_upcoming'] = len(upcoming) > self.MAX_UPCOMING
+        context['upcoming_grouped'] = self.group_by_date(upcoming[:self.MAX_UPCOMING])
         context['tab'] = 'upcoming'
         return context
 
 class WorkScheduleCompletedView(WorkScheduleBaseView):
     template_name = 'Work/work_completed.html'
 
+    def get_month(self, completed):
+        """表示する月の1日。?month=YYYY-MM がなければ最後に働いた月 (なければ今月)"""
+        try:
+            return datetime.strptime(self.request.GET.get('month', ''), '%Y-%m').date()
+        except ValueError:
+            pass
+        latest = completed.aggregate(latest=Max('job_posting__work_date'))['latest']
+        return (latest or timezone.localdate()).replace(day=1)
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        now = timezone.now()
-        # ユーザーの応募済み求人を全て取得（勤務日の昇順）
-        applications = JobApplication.objects.filter(
-            worker=self.request.user
+        # 完了・終了済み・チェックアウト済みの応募を月ごとに表示する
+        completed = JobApplication.objects.filter(
+            Q(status='完了') | Q(job_posting__end_at__lt=timezone.now()) | Q(leaving_at__isnull=False),
+            worker=self.request.user,
+        )
+        month = self.get_month(completed)
+        next_month = (month + timedelta(days=31)).replace(day=1)
+
+        apps = completed.filter(
+            job_posting__work_date__gte=month,
+            job_posting__work_date__lt=next_month,
         ).select_related(
             'job_posting', 
-            'job_posting__template__store'
-        ).prefetch_related(
-            'job_posting__template__photos'
-        ).order_by('job_posting__work_date', 'job_posting__start_time')
-        
-        completed = []
-        for app in applications:
-            job_end = timezone.make_aware(datetime.combine(app.job_posting.work_date, app.job_posting.end_time))
-            if app.status == '完了' or job_end < now or app.leaving_at:
-                completed.append(app)
+            'job_posting__template__store',
+            'job_posting__template__cover_photo'
+        ).order_by('job_posting__start_at')
+
+        # 前後の月 (完了した仕事がある月だけ辿れるようにする)
+        neighbors = completed.aggregate(
+            prev=Max('job_posting__work_date', filter=Q(job_posting__work_date__lt=month)),
+            next=Min('job_posting__work_date', filter=Q(job_posting__work_date__gte=next_month)),
+        )
 
-        context['completed_grouped'] = self.group_by_date(completed)
+        context['completed_grouped'] = self.group_by_date(apps)
+        context['month'] = month
+        context['prev_month'] = neighbors['prev']
+        context['next_month'] = neighbors['next']
         context['tab'] = 'completed'
         return context
 
@@ -877,6 +907,8 @@ class ApplyStep1BelongingsView(LoginRequiredMixin, TemplateView):
         # 求人が締切済み/満員の場合
         if job.is_expired:
             return render(request, 'Searchjobs/detail.html', {'job': job, 'is_closed': True})
+        if job.is_full:
+            return render(request, 'Searchjobs/detail.html', {'job': job, 'is_full': True})
             
         return super().get(request, *args, **kwargs)
 
@@ -930,20 +962,15 @@ class ApplyStep5ReviewView(LoginRequiredMixin, TemplateView):
 
     def post(self, request, *args, **kwargs):
         job = get_object_or_404(JobPosting, pk=self.kwargs['pk'])
-        # --- ここで実際の申し込みデータを保存する ---
-        JobApplication.objects.get_or_create(
-            job_posting=job,
-            worker=request.user
-        )
-
-        # マッチングした時点でチャットルームを作成する
-        # 店舗とワーカーの組み合わせで作成
-        store = job.template.store
-        ChatRoom.objects.get_or_create(
-            store=store,
-            worker=request.user
-        )
+        # --- ここで実際の申し込みデータを保存する (枠の確保・チャットルームの作成も含む) ---
+        result, application = ApplicationService.apply(job, request.user)
 
+        if result == ApplicationService.FULL:
+            return render(request, 'Searchjobs/detail.html', {'job': job, 'is_full': True})
+        if result == ApplicationService.CLOSED:
+            return render(request, 'Searchjobs/detail.html', {'job': job, 'is_closed': True})
+        if result == ApplicationService.OVERLAP:
+            return render(request, 'Searchjobs/detail.html', {'job': job, 'overlap': application})
         return render(request, 'Searchjobs/Apply/apply_complete.html', {'job': job})
 
 class JobWorkingDetailView(LoginRequiredMixin, TemplateView):
@@ -1076,41 +1103,46 @@ class JobQRReaderView(LoginRequiredMixin, TemplateView):
 
 
 class QRScanView(LoginRequiredMixin, View):
-    """QRコード読み取り（シミュレーション）"""
+    """店舗のQRコード (署名付きトークン) を読み取ってチェックイン/アウトする"""
     def post(self, request, pk, *args, **kwargs):
         # pk is job_posting_id
-        application = get_object_or_404(JobApplication, job_posting_id=pk, worker=request.user)
-        
+        # トークンは署名で検証するのでDBを見ない (改ざん・期限切れは読み取り画面に戻す)
+        store_id = verify_checkin_token(request.POST.get('token'))
+        if store_id is None:
+            return render(request, 'Work/job_qr_reader.html', {
+                'job': get_object_or_404(JobPosting, pk=pk),
+                'error': 'QRコードの有効期限が切れています。もう一度読み込んでください。',
+            }, status=400)
+
+        # 読み取った店舗の求人への自分の応募だけが対象
+        applications = JobApplication.objects.filter(
+            job_posting_id=pk, worker=request.user, job_posting__template__store_id=store_id
+        )
         now = timezone.now()
-        is_checkin = False
-        
-        if not application.attendance_at:
-            # チェックイン
-            application.attendance_at = now
-            application.save()
-            is_checkin = True
+
+        # チェックイン: 未チェックインのときだけ更新する1回の UPDATE (二重に読み取っても打刻は変わらない)
+        if applications.filter(attendance_at__isnull=True).update(attendance_at=now):
             return render(request, 'Work/qr_success.html', {
-                'app': application, 
-                'is_checkin': is_checkin
+                'job_id': pk,
+                'is_checkin': True
             })
-        elif not application.leaving_at:
-            # チェックアウト
-            application.leaving_at = now
-            # 実績休憩時間の初期値を設定 (勤務時間が休憩時間未満なら0、それ以外は予定時間)
-            duration = (application.leaving_at - application.attendance_at).total_seconds() / 60
-            default_break = application.job_posting.break_duration
-            if duration > default_break:
-                application.actual_break_duration = default_break
-            else:
-                application.actual_break_duration = 0
-            application.save()
-            is_checkin = False
-            # 勤怠修正フローへ
-            return redirect('attendance_step1', application_id=application.id)
-        else:
+
+        application = get_object_or_404(applications.select_related('job_posting'))
+        if application.leaving_at:
             # 既に両方済み
             return redirect('mypage')
 
+        # チェックアウト
+        # 実績休憩時間の初期値を設定 (勤務時間が休憩時間未満なら0、それ以外は予定時間)
+        duration = (now - application.attendance_at).total_seconds() / 60
+        default_break = application.job_posting.break_duration
+        actual_break_duration = default_break if duration > default_break else 0
+        applications.filter(pk=application.pk, leaving_at__isnull=True).update(
+            leaving_at=now, actual_break_duration=actual_break_duration
+        )
+        # 勤怠修正フローへ
+        return redirect('attendance_step1', application_id=application.id)
+
 
 # -----------------------------------------------------------------------------
 # 勤怠修正フロー (Checkout後)
@@ -1165,14 +1197,8 @@ class RewardConfirmView(AttendanceStepBaseView):
         posting = application.job_posting
         
         # 打刻がない場合のフォールバック（予定時間を使用）
-        from datetime import datetime, timedelta
-        scheduled_start = timezone.make_aware(datetime.combine(posting.work_date, posting.start_time))
-        scheduled_end = timezone.make_aware(datetime.combine(posting.work_date, posting.end_time))
-        if scheduled_end <= scheduled_start:
-            scheduled_end += timedelta(days=1)
-
-        att_at = application.attendance_at or scheduled_start
-        leave_at = application.leaving_at or scheduled_end
+        att_at = application.attendance_at or posting.start_at
+        leave_at = application.leaving_at or posting.end_at
 
         # 表示用に内訳を計算
         duration_seconds = (leave_at - att_at).total_seconds()
@@ -1197,15 +1223,10 @@ class RewardConfirmView(AttendanceStepBaseView):
         posting = application.job_posting
         
         if not application.attendance_at or not application.leaving_at:
-            scheduled_start = timezone.make_aware(datetime.combine(posting.work_date, posting.start_time))
-            scheduled_end = timezone.make_aware(datetime.combine(posting.work_date, posting.end_time))
-            if scheduled_end <= scheduled_start:
-                scheduled_end += timedelta(days=1)
-            
             if not application.attendance_at:
-                application.attendance_at = scheduled_start
+                application.attendance_at = posting.start_at
             if not application.leaving_at:
-                application.leaving_at = scheduled_end
+                application.leaving_at = posting.end_at
 
         # 報酬計算
         reward_amount = application.get_calculated_reward()